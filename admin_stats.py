@@ -0,0 +1,243 @@
+"""
+管理後台統計模組 (Admin Stats)
+
+管理後台總覽所需的數字以分片計數器增量維護（admin_stats/shard_{n}），
+使用者加入、選擇計畫、讀經，小組建立、成員加入離開與留言時，與原本的寫入同批次更新：
+    users                   使用者總數
+    plans.{計畫}             各讀經計畫人數（未選擇者記為「未選擇」）
+    progress.{區間}          進度分布
+    progress_sum            current_day 總和（計算平均進度）
+    last_read.{日期}         最後讀經日為該日期的人數（今日／7 天／30 天活躍人數由此加總）
+    groups / group_members / group_messages
+
+後台載入時只讀取 NUM_SHARDS 份文件，與使用者數量無關。
+離線校正（每晚排程）以全表掃描重新計算，修正未經上述路徑的變更（管理工具、手動修改資料）。
+
+執行方式（校正）：python3.11 admin_stats.py
+"""
+import random
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from google.cloud import firestore
+from database import db, USERS_COLLECTION
+
+ADMIN_STATS_COLLECTION = "admin_stats"
+NUM_SHARDS = 10
+
+PLAN_TYPES = ("Canonical", "Balanced")
+NO_PLAN = "未選擇"
+PROGRESS_BUCKETS = ("0-25%", "25-50%", "50-75%", "75-100%", "完成")
+PLAN_DAYS = 365
+ACTIVE_WINDOW_DAYS = 30     # last_read 只需保留這段期間（校正時清除更早的日期）
+
+USER_FIELDS = ["plan_type", "current_day", "last_read_date"]
+
+
+def plan_key(plan_type) -> str:
+    return plan_type if plan_type in PLAN_TYPES else NO_PLAN
+
+
+def progress_key(current_day) -> str:
+    """進度區間（與後台原本的分布相同）"""
+    current_day = current_day or 1
+    if current_day >= PLAN_DAYS:
+        return "完成"
+    percent = current_day / PLAN_DAYS * 100
+    if percent >= 75:
+        return "75-100%"
+    if percent >= 50:
+        return "50-75%"
+    if percent >= 25:
+        return "25-50%"
+    return "0-25%"
+
+
+def last_read_key(value) -> Optional[str]:
+    """最後讀經日轉為 "YYYY-MM-DD"（字串、date 或 datetime），沒有時返回 None"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str) and value:
+        return value[:10]
+    return None
+
+
+def snapshot(user) -> Dict:
+    """記錄使用者目前的統計相關欄位（修改前呼叫）"""
+    return {
+        "plan": plan_key(user.get("plan_type")),
+        "progress": progress_key(user.get("current_day")),
+        "current_day": user.get("current_day") or 1,
+        "last_read": last_read_key(user.get("last_read_date")),
+    }
+
+
+def _shard_ref():
+    return db.collection(ADMIN_STATS_COLLECTION).document(f"shard_{random.randrange(NUM_SHARDS)}")
+
+
+def _move(update: Dict, field: str, old: Optional[str], new: Optional[str]) -> None:
+    if old == new:
+        return
+    counts = update.setdefault(field, {})
+    if old is not None:
+        counts[old] = firestore.Increment(-1)
+    if new is not None:
+        counts[new] = firestore.Increment(1)
+
+
+def apply_changes(before: Optional[Dict], user, writer=None) -> bool:
+    """
+    依使用者欄位變動增量更新計數器
+
+    Args:
+        before: snapshot() 的結果；新使用者傳入 None
+        user: 修改後的使用者物件
+        writer: 可選的 WriteBatch / Transaction，傳入時由呼叫端 commit
+
+    Returns:
+        bool: 是否有變動
+    """
+    after = snapshot(user)
+    update: Dict = {}
+    if before is None:
+        update["users"] = firestore.Increment(1)
+        before = {"plan": None, "progress": None, "current_day": 0, "last_read": None}
+
+    _move(update, "plans", before["plan"], after["plan"])
+    _move(update, "progress", before["progress"], after["progress"])
+    _move(update, "last_read", before["last_read"], after["last_read"])
+    if after["current_day"] != before["current_day"]:
+        update["progress_sum"] = firestore.Increment(after["current_day"] - before["current_day"])
+    if not update:
+        return False
+
+    if writer is not None:
+        writer.set(_shard_ref(), update, merge=True)
+    else:
+        _shard_ref().set(update, merge=True)
+    return True
+
+
+def increment(writer=None, **deltas: int) -> None:
+    """
+    增減小組相關計數（groups、group_members、group_messages）
+
+    Args:
+        writer: 可選的 WriteBatch / Transaction，傳入時由呼叫端 commit
+        **deltas: {計數名稱: 增減量}
+    """
+    update = {field: firestore.Increment(delta) for field, delta in deltas.items() if delta}
+    if not update:
+        return
+    if writer is not None:
+        writer.set(_shard_ref(), update, merge=True)
+    else:
+        _shard_ref().set(update, merge=True)
+
+
+# === 查詢 ===
+
+def get_totals() -> Dict:
+    """彙總所有分片"""
+    totals: Dict = {"users": 0, "progress_sum": 0, "groups": 0, "group_members": 0, "group_messages": 0,
+                    "plans": {}, "progress": {}, "last_read": {}}
+    for doc in db.collection(ADMIN_STATS_COLLECTION).stream():
+        for field, value in (doc.to_dict() or {}).items():
+            if isinstance(value, dict):
+                counts = totals.setdefault(field, {})
+                for key, count in value.items():
+                    counts[key] = counts.get(key, 0) + (count or 0)
+            elif isinstance(value, (int, float)) and field in totals:
+                totals[field] += value
+    return totals
+
+
+def get_overview(today: Optional[date] = None) -> Dict:
+    """
+    管理後台總覽（格式與原本掃描全表的結果相同）
+
+    Args:
+        today: 今天日期
+
+    Returns:
+        Dict: {total_users, active_today, active_week, active_month, plan_distribution, avg_progress, progress_distribution}
+    """
+    today = today or datetime.now().date()
+    totals = get_totals()
+    total_users = totals["users"]
+
+    active = {"today": 0, "week": 0, "month": 0}
+    for day, count in totals["last_read"].items():
+        try:
+            days_diff = (today - date.fromisoformat(day)).days
+        except ValueError:
+            continue
+        if days_diff == 0:
+            active["today"] += count
+        if days_diff <= 7:
+            active["week"] += count
+        if days_diff <= ACTIVE_WINDOW_DAYS:
+            active["month"] += count
+
+    return {
+        "total_users": total_users,
+        "active_today": active["today"],
+        "active_week": active["week"],
+        "active_month": active["month"],
+        "plan_distribution": {key: totals["plans"].get(key, 0) for key in PLAN_TYPES + (NO_PLAN,)},
+        "avg_progress": round(totals["progress_sum"] / total_users, 1) if total_users > 0 else 0,
+        "progress_distribution": {key: totals["progress"].get(key, 0) for key in PROGRESS_BUCKETS},
+    }
+
+
+# === 離線校正 ===
+
+def reconcile(today: Optional[date] = None) -> Dict:
+    """
+    以全表掃描重新計算所有計數，寫入 shard_0 並清空其他分片（同一批次）
+
+    掃描期間的增量更新可能遺失，差異會在下次校正時修正，因此排程在離峰時段執行。
+
+    Returns:
+        Dict: 重新計算的計數
+    """
+    today = today or datetime.now().date()
+    oldest = (today - timedelta(days=ACTIVE_WINDOW_DAYS)).isoformat()
+
+    totals: Dict = {"users": 0, "progress_sum": 0, "plans": {}, "progress": {}, "last_read": {}}
+    for doc in db.collection(USERS_COLLECTION).select(USER_FIELDS).stream():
+        stats = snapshot(doc.to_dict())
+        totals["users"] += 1
+        totals["progress_sum"] += stats["current_day"]
+        totals["plans"][stats["plan"]] = totals["plans"].get(stats["plan"], 0) + 1
+        totals["progress"][stats["progress"]] = totals["progress"].get(stats["progress"], 0) + 1
+        if stats["last_read"] and stats["last_read"] >= oldest:
+            totals["last_read"][stats["last_read"]] = totals["last_read"].get(stats["last_read"], 0) + 1
+
+    totals["groups"] = 0
+    totals["group_members"] = 0
+    for doc in db.collection("groups").select(["member_count"]).stream():
+        totals["groups"] += 1
+        totals["group_members"] += doc.to_dict().get("member_count", 0) or 0
+
+    from group_notification import GROUP_MESSAGES_SUBCOLLECTION
+    totals["group_messages"] = db.collection_group(GROUP_MESSAGES_SUBCOLLECTION).count().get()[0][0].value
+
+    batch = db.batch()
+    stats_ref = db.collection(ADMIN_STATS_COLLECTION)
+    batch.set(stats_ref.document("shard_0"), {**totals, "reconciled_at": firestore.SERVER_TIMESTAMP})
+    for shard in range(1, NUM_SHARDS):
+        batch.delete(stats_ref.document(f"shard_{shard}"))
+    batch.commit()
+    return totals
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("校正管理後台統計...")
+    totals = reconcile()
+    print(f"✓ {totals['users']} 位使用者、{totals['groups']} 個小組、{totals['group_messages']} 則留言")
+    print("=" * 50)
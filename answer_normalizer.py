@@ -0,0 +1,187 @@
+"""
+測驗答案正規化模組 (Answer Normalizer)
+
+取代 process_quiz_answer 中每次呼叫都重新編譯正規表示式的 clean_answer：
+
+- 一張預先建好的 str.translate 對照表，一次完成
+  標點與空白移除、全形轉半形、英文大小寫、異體字（爲 → 為、啓 → 啟）與常見簡體字（爱 → 愛）折疊
+- 折疊後不完全相同時容許小錯字（只用於填空題，選擇題必須完全相同）：
+  2~3 字只容許相鄰兩字對調，4 字以上容許 1 個錯字、多漏一字或相鄰對調；
+  長度差超過 1 時直接判錯，比對在第一個不同處後只檢查剩餘片段
+- 對照表的目標字都是和合本語料中使用的寫法，來源字都不出現在語料中，因此不會把不同的詞折疊在一起
+
+執行方式（效能測試）：python3.11 answer_normalizer.py
+"""
+from typing import Dict, Optional, Tuple
+
+# 比對結果
+MATCH_EXACT = "exact"   # 正規化後完全相同
+MATCH_CLOSE = "close"   # 在編輯距離容許範圍內（小錯字）
+
+# 要移除的標點與空白（半形與全形）
+_STRIP_CHARS = ' \t\r\n　，。！？：；、「」『』（）《》〈〉…—－～·,.!?:;"\'()[]{}<>-~`'
+
+# 異體字（語料不使用的寫法 → 語料的寫法）
+_VARIANTS = {
+    '爲': '為', '啓': '啟', '裏': '裡', '着': '著', '衆': '眾', '説': '說', '羣': '群',
+    '峯': '峰', '綫': '線', '牀': '床', '麪': '麵', '敎': '教', '淸': '清', '靑': '青',
+    '鷄': '雞', '踪': '蹤', '迹': '跡', '祗': '只', '喫': '吃', '纔': '才', '嘆': '歎',
+    '烟': '煙', '汙': '污', '奬': '獎', '况': '況', '册': '冊', '减': '減', '凉': '涼',
+    '犂': '犁', '喩': '喻', '吿': '告', '値': '值', '眞': '真', '争': '爭', '内': '內',
+    '卽': '即', '税': '稅', '悦': '悅', '鋭': '銳', '脱': '脫', '兑': '兌', '黄': '黃',
+    '衞': '衛', '温': '溫', '敍': '敘', '叙': '敘', '熔': '鎔', '洒': '灑', '晒': '曬',
+}
+
+# 常見簡體字（只收一對一、語料中不出現的字）
+_SIMPLIFIED = dict(zip(
+    '们这说爱为与书时会来对个门见华话东长记国让认识过还进样应该没经么亲罗马约杀灵财义万圣听谁从觉讲请'
+    '问现实钱开关买卖头颜红银阳阴岁车军农乐难鱼鸟恩赐荣耀祷祝福罪赎远审判报虽临归欢乐丰产业伤伦传儿兴'
+    '兽养军冈农决净减几凤凭击则刚创删剑劝办务动劳势勋区医华单卖卫却厅压厉参双发变叶号叹吗听启员呜咏哑'
+    '唤啬团园围图圆圣场坏坚块坛坟垒垦备复头夸夺奋奖妇妈姗娄婴宁宝实宠审宫宽宾对寻导寿将尔尘尝层属岁岂'
+    '岛岭峡币师帐带帮广库应庙废开异弃张弥弯强归当录彻径忆忧怀态怜总恳恶恼悬惊惧惩惭惯愤愿戏战户执扩扫'
+    '扬扰抚抛抢护报担拟拥择挂挚挡挣挤挥损捡换据掳掷揽搀摄摆',
+    '們這說愛為與書時會來對個門見華話東長記國讓認識過還進樣應該沒經麼親羅馬約殺靈財義萬聖聽誰從覺講請'
+    '問現實錢開關買賣頭顏紅銀陽陰歲車軍農樂難魚鳥恩賜榮耀禱祝福罪贖遠審判報雖臨歸歡樂豐產業傷倫傳兒興'
+    '獸養軍岡農決淨減幾鳳憑擊則剛創刪劍勸辦務動勞勢勳區醫華單賣衛卻廳壓厲參雙發變葉號嘆嗎聽啟員嗚詠啞'
+    '喚嗇團園圍圖圓聖場壞堅塊壇墳壘墾備復頭誇奪奮獎婦媽姍婁嬰寧寶實寵審宮寬賓對尋導壽將爾塵嘗層屬歲豈'
+    '島嶺峽幣師帳帶幫廣庫應廟廢開異棄張彌彎強歸當錄徹徑憶憂懷態憐總懇惡惱懸驚懼懲慚慣憤願戲戰戶執擴掃'
+    '揚擾撫拋搶護報擔擬擁擇掛摯擋掙擠揮損撿換據擄擲攬攙攝擺'
+))
+
+
+def _build_table() -> Dict[int, Optional[str]]:
+    table: Dict[int, Optional[str]] = {}
+    # 全形 ASCII (U+FF01~U+FF5E) → 半形，英文轉小寫
+    for code in range(0xFF01, 0xFF5F):
+        table[code] = chr(code - 0xFEE0).lower()
+    for code in range(ord('A'), ord('Z') + 1):
+        table[code] = chr(code).lower()
+    for source, target in _SIMPLIFIED.items():
+        if source != target:
+            table[ord(source)] = _VARIANTS.get(target, target)
+    for source, target in _VARIANTS.items():
+        table[ord(source)] = target
+    # 標點與空白最後設定（全形標點在上面轉半形後仍需移除）
+    for char in _STRIP_CHARS:
+        table[ord(char)] = None
+        if 0x21 <= ord(char) <= 0x7E:
+            table[ord(char) + 0xFEE0] = None
+    return table
+
+
+_TABLE = _build_table()
+
+
+def normalize(text: str) -> str:
+    """
+    正規化答案：移除標點與空白、全形轉半形、大小寫與異體字折疊
+
+    Args:
+        text: 原始答案
+
+    Returns:
+        str: 正規化後的答案
+    """
+    return text.translate(_TABLE)
+
+
+# 短於此長度的答案只容許相鄰兩字對調
+MIN_TYPO_LENGTH = 4
+
+
+def transpositions(text: str) -> tuple:
+    """所有相鄰兩字對調的寫法（短答案唯一容許的錯誤，預先算好後以查表比對）"""
+    return tuple(text[:i] + text[i + 1] + text[i] + text[i + 2:] for i in range(len(text) - 1))
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """
+    a 與 b 是否只差一個錯字、多漏一字或一組相鄰兩字對調
+
+    找到第一個不同處後只比對剩餘片段，超過一處差異即返回 False
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if len(a) - len(b) > 1:
+        return False
+    i = 0
+    n = len(b)
+    while i < n and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return (a[i + 1:] == b[i + 1:]
+                or (i + 1 < n and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]))
+    return a[i + 1:] == b[i:]
+
+
+# 正確答案的正規化結果與短答案的對調寫法（同一題的答案只處理一次）
+_EXPECTED_CACHE_SIZE = 4096
+_expected_cache: Dict[str, Tuple[str, Optional[tuple]]] = {}
+
+
+def match_answer(user_answer: str, correct_answer: str, allow_typos: bool = True) -> Optional[str]:
+    """
+    比對使用者答案
+
+    Args:
+        user_answer: 使用者輸入
+        correct_answer: 正確答案
+        allow_typos: 是否容許小錯字（選擇題的選項可能只差一字，應傳入 False）
+
+    Returns:
+        Optional[str]: MATCH_EXACT、MATCH_CLOSE，答錯時為 None
+    """
+    cached = _expected_cache.get(correct_answer)
+    if cached is None:
+        if len(_expected_cache) >= _EXPECTED_CACHE_SIZE:
+            _expected_cache.clear()
+        expected = correct_answer.translate(_TABLE)
+        swaps = transpositions(expected) if len(expected) < MIN_TYPO_LENGTH else None
+        cached = _expected_cache[correct_answer] = (expected, swaps)
+    expected, swaps = cached
+    given = user_answer.translate(_TABLE)
+    if given == expected:
+        return MATCH_EXACT
+    if not allow_typos:
+        return None
+    if swaps is not None:
+        return MATCH_CLOSE if given in swaps else None
+    # 長度差超過 1 不可能只差一個錯字，不必逐字比對
+    if abs(len(given) - len(expected)) > 1:
+        return None
+    return MATCH_CLOSE if within_one_edit(given, expected) else None
+
+
+if __name__ == "__main__":
+    import csv
+    import random
+    import timeit
+
+    from bible_corpus import BIBLE_TEXT_CSV
+    from segmenter import key_terms
+
+    print("建立測試資料...")
+    answers = []
+    with open(BIBLE_TEXT_CSV, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            answers.extend(key_terms(f"{row['book_abbr']}{row['chapter']}:{row['verse']}", row['text']))
+    rng = random.Random(0)
+    answers = rng.sample(answers, 10000)
+
+    def typo(answer: str) -> str:
+        i = rng.randrange(len(answer))
+        return answer[:i] + '的' + answer[i + 1:]
+
+    cases = {
+        "完全相同": [(answer, answer) for answer in answers],
+        "全形標點": [(f"「{answer}」。", answer) for answer in answers],
+        "錯字": [(typo(answer), answer) for answer in answers],
+    }
+    # 扣除迴圈本身的時間，只計算比對
+    loop = min(timeit.repeat(lambda: [(given, expected) for given, expected in cases["完全相同"]],
+                             number=1, repeat=5))
+    for label, pairs in cases.items():
+        seconds = min(timeit.repeat(lambda: [match_answer(given, expected) for given, expected in pairs],
+                                    number=1, repeat=5)) - loop
+        accepted = sum(1 for given, expected in pairs if match_answer(given, expected))
+        print(f"✓ {label}：每筆 {seconds / len(pairs) * 1e9:.0f} ns，接受 {accepted}/{len(pairs)}")
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from database import db, BIBLE_PLANS_COLLECTION, BIBLE_TEXT_COLLECTION
-import re
+from scripture_ref import parse_reference
+import bible_corpus
 import time
 from functools import lru_cache
 
@@ -99,29 +100,35 @@ def get_verse(reference: str):
     cache_key = f"verse_{reference}"
     
     def fetch_verse():
-        # 解析經文參考
-        match = re.match(r'([^0-9]+)(\d+):(\d+)', reference)
-        if not match:
+        # 解析經文參考（與讀經計畫共用同一個解析器）
+        ref = parse_reference(reference)
+        if not ref or not ref.is_single_verse:
             raise HTTPException(status_code=400, detail="Invalid reference format")
         
-        book_abbr = match.group(1)
-        chapter = int(match.group(2))
-        verse = int(match.group(3))
+        book_abbr, chapter, verse = ref.book_abbr, ref.start_chapter, ref.start_verse
         
-        # 從 Firestore 查詢經文
-        verses_ref = db.collection(BIBLE_TEXT_COLLECTION)
-        query = verses_ref.where('book_abbr', '==', book_abbr) \
-                         .where('chapter', '==', chapter) \
-                         .where('verse', '==', verse)
-        docs = list(query.stream())
+        if bible_corpus.is_available():
+            # 從記憶體內的經文語料取得
+            try:
+                text = bible_corpus.get_verses([bible_corpus.compile_reference(ref)])[0]['text']
+            except bible_corpus.PlanCompileError:
+                raise HTTPException(status_code=404, detail="Verse not found")
+        else:
+            # 從 Firestore 查詢經文
+            verses_ref = db.collection(BIBLE_TEXT_COLLECTION)
+            query = verses_ref.where('book_abbr', '==', book_abbr) \
+                             .where('chapter', '==', chapter) \
+                             .where('verse', '==', verse)
+            docs = list(query.stream())
+            
+            if not docs:
+                raise HTTPException(status_code=404, detail="Verse not found")
+            
+            text = docs[0].to_dict().get('text', '')
         
-        if not docs:
-            raise HTTPException(status_code=404, detail="Verse not found")
-        
-        data = docs[0].to_dict()
         return {
             "reference": reference,
-            "text": data.get('text', ''),
+            "text": text,
             "book_abbr": book_abbr,
             "chapter": chapter,
             "verse": verse
@@ -149,6 +156,12 @@ def get_verses_range(book: str, chapter: int, start_verse: int = 1, end_verse: i
             ]
         }
     """
+    # 書卷名稱正規化（支援全名與異體字，例如「啓示錄」→「啟」）
+    ref = parse_reference(f"{book}{chapter}")
+    if not ref:
+        raise HTTPException(status_code=400, detail="Invalid book")
+    book = ref.book_abbr
+    
     cache_key = f"verses_range_{book}_{chapter}_{start_verse}_{end_verse}"
     
     def fetch_verses():
@@ -0,0 +1,137 @@
+"""
+徽章規則引擎 (Badge Engine)
+
+將 scoring.BADGES 的宣告式規則編譯成索引：
+- 門檻型規則依檢查欄位分組並依門檻排序，只評估本次有變動的欄位
+- 事件型規則（例如「重新出發」）依觸發事件分組
+- 每位使用者儲存各欄位「下一個門檻」，未達門檻時一次比較即可略過
+
+規則欄位（BADGES 每一項）：
+    check_field / check_value   門檻型：欄位值 >= 門檻
+    trigger                     事件型：對應事件發生時授予
+    season                      可選，("MM-DD", "MM-DD") 期間限定
+    plan_type                   可選，限定讀經計畫（計畫完成徽章）
+"""
+import hashlib
+import json
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, List, Iterable, Optional, Tuple
+
+
+class BadgeRule:
+    """單一徽章規則"""
+
+    __slots__ = ('badge_id', 'field', 'threshold', 'trigger', 'season', 'plan_type')
+
+    def __init__(self, badge_id: str, info: Dict):
+        self.badge_id = badge_id
+        self.field = info.get('check_field')
+        self.threshold = info.get('check_value')
+        self.trigger = info.get('trigger')
+        self.season = info.get('season')
+        self.plan_type = info.get('plan_type')
+
+    def is_eligible(self, user, today: str) -> bool:
+        """檢查門檻以外的附加條件（期間、計畫類型）"""
+        if self.plan_type and user.get('plan_type') != self.plan_type:
+            return False
+        if self.season:
+            start, end = self.season
+            month_day = today[5:]
+            if start <= end:
+                return start <= month_day <= end
+            return month_day >= start or month_day <= end  # 跨年期間
+        return True
+
+
+class BadgeEngine:
+    """編譯後的徽章規則索引"""
+
+    def __init__(self, badges: Dict[str, Dict]):
+        self.badges = badges
+        self.rules: List[BadgeRule] = [BadgeRule(badge_id, info) for badge_id, info in badges.items()]
+
+        # 門檻型：{欄位: ([門檻...], [規則...])}，門檻遞增
+        self.threshold_index: Dict[str, Tuple[List[int], List[BadgeRule]]] = {}
+        grouped: Dict[str, List[BadgeRule]] = {}
+        for rule in self.rules:
+            if rule.field and rule.threshold:
+                grouped.setdefault(rule.field, []).append(rule)
+        for field, rules in grouped.items():
+            rules.sort(key=lambda r: r.threshold)
+            self.threshold_index[field] = ([r.threshold for r in rules], rules)
+
+        # 事件型：{事件: [規則...]}
+        self.event_index: Dict[str, List[BadgeRule]] = {}
+        for rule in self.rules:
+            if rule.trigger:
+                self.event_index.setdefault(rule.trigger, []).append(rule)
+
+        # 規則版本：規則變動時讓使用者儲存的門檻快取失效
+        digest_source = json.dumps(
+            [(r.badge_id, r.field, r.threshold, r.trigger, r.season, r.plan_type) for r in self.rules],
+            default=str
+        )
+        self.version = hashlib.sha1(digest_source.encode('utf-8')).hexdigest()[:8]
+
+    @property
+    def fields(self) -> List[str]:
+        """所有門檻型規則依賴的欄位"""
+        return list(self.threshold_index.keys())
+
+    def evaluate(self, user, changed_fields: Optional[Iterable[str]] = None,
+                 events: Iterable[str] = (), today: Optional[str] = None) -> List[str]:
+        """
+        評估使用者新達成的徽章，並更新使用者的下一個門檻快取
+
+        Args:
+            user: 使用者物件
+            changed_fields: 本次變動的欄位，None 表示全部重新評估
+            events: 本次發生的事件（例如 "restart"）
+            today: 評估日期 "YYYY-MM-DD"，預設為今天
+
+        Returns:
+            List[str]: 新達成的徽章 ID（依規則定義順序）
+        """
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        earned = user.get('milestone_achieved') or {}
+
+        # 舊資料以 inf 表示沒有待達成的門檻，統一改為 None（inf 無法序列化為 JSON）
+        cache = {key: (None if value == float('inf') else value)
+                 for key, value in (user.get('next_badge_thresholds') or {}).items()}
+        if cache.get('_v') != self.version:
+            cache = {'_v': self.version}
+            changed_fields = None
+
+        fields = self.fields if changed_fields is None else [f for f in changed_fields if f in self.threshold_index]
+        new_ids = set()
+
+        for field in fields:
+            value = user.get(field) or 0
+            # 值為 None 表示該欄位已沒有待達成的門檻；沒有此鍵表示尚未評估
+            if field in cache and (cache[field] is None or value < cache[field]):
+                continue
+
+            thresholds, rules = self.threshold_index[field]
+            reached = bisect_right(thresholds, value)
+            pending = None
+            for rule in rules[:reached]:
+                if rule.badge_id in earned or rule.badge_id in new_ids:
+                    continue
+                if rule.is_eligible(user, today):
+                    new_ids.add(rule.badge_id)
+                elif pending is None:
+                    pending = rule.threshold  # 已達門檻但條件未符合，下次仍需評估
+
+            if pending is None:
+                pending = next((r.threshold for r in rules[reached:] if r.badge_id not in earned), None)
+            cache[field] = pending
+
+        for event in events:
+            for rule in self.event_index.get(event, []):
+                if rule.badge_id not in earned and rule.is_eligible(user, today):
+                    new_ids.add(rule.badge_id)
+
+        user.next_badge_thresholds = cache
+        return [rule.badge_id for rule in self.rules if rule.badge_id in new_ids]
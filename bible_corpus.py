@@ -0,0 +1,251 @@
+"""
+經文語料與讀經計畫編譯模組 (Bible Corpus)
+
+將 data/bible_text.csv 依書卷順序載入記憶體，每節經文對應一個連續的位置 (offset)。
+讀經計畫中的每個範圍字串（例如 "創1:1-3:24;太1"）只需編譯一次，轉成
+[(start_offset, end_offset), ...] 的區間列表；取得某天的經文只需做幾次切片，
+不必再查詢 Firestore。
+
+編譯時會驗證所有範圍（書卷、章、節是否存在、起訖順序），無法解析的範圍
+在建置時就會被找出，而不是在測驗途中才出現「No verses found」。
+
+執行方式（驗證所有讀經計畫）：python3.11 bible_corpus.py
+"""
+import csv
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from scripture_ref import ScriptureRef, parse_reference, parse_references
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+BIBLE_TEXT_CSV = os.path.join(DATA_DIR, 'bible_text.csv')
+BIBLE_PLANS_CSV = os.path.join(DATA_DIR, 'bible_plans.csv')
+
+# 休息日/補讀等沒有經文的計畫日
+REST_DAY_MARKERS = ('休息日', '補讀')
+
+Span = Tuple[int, int]  # [start, end) 區間
+
+
+class PlanCompileError(ValueError):
+    """無法解析的經文範圍"""
+
+
+class _Corpus:
+    """記憶體內的經文語料（依 CSV 順序排列）"""
+
+    def __init__(self, path: str):
+        self.book_abbr: List[str] = []
+        self.chapter: List[int] = []
+        self.verse: List[int] = []
+        self.text: List[str] = []
+        # (書卷, 章) → (start, end)
+        self.chapters: Dict[Tuple[str, int], Span] = {}
+        # 書卷 → 最後一章
+        self.last_chapter: Dict[str, int] = {}
+
+        with open(path, encoding='utf-8', newline='') as f:
+            for i, row in enumerate(csv.DictReader(f)):
+                book, chap = row['book_abbr'], int(row['chapter'])
+                self.book_abbr.append(book)
+                self.chapter.append(chap)
+                self.verse.append(int(row['verse']))
+                self.text.append(row['text'])
+
+                start, _ = self.chapters.get((book, chap), (i, i))
+                self.chapters[(book, chap)] = (start, i + 1)
+                self.last_chapter[book] = max(self.last_chapter.get(book, 0), chap)
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def verse_offset(self, book: str, chap: int, verse: int) -> int:
+        """某節經文的位置，不存在時拋出 PlanCompileError"""
+        start, end = self.chapters[(book, chap)]
+        # 章內節數大多連續，先直接推算，再退回線性搜尋（處理缺節）
+        guess = start + verse - self.verse[start]
+        if start <= guess < end and self.verse[guess] == verse:
+            return guess
+        for i in range(start, end):
+            if self.verse[i] == verse:
+                return i
+        raise PlanCompileError(f"{book}{chap}:{verse} 不存在")
+
+
+_corpus: Optional[_Corpus] = None
+_compiled_plans: Optional[Dict[Tuple[str, int], Dict]] = None
+
+
+def get_corpus() -> _Corpus:
+    """取得（必要時載入）經文語料"""
+    global _corpus
+    if _corpus is None:
+        _corpus = _Corpus(BIBLE_TEXT_CSV)
+        print(f"✓ 已載入經文語料：{len(_corpus)} 節")
+    return _corpus
+
+
+def is_available() -> bool:
+    """經文 CSV 是否存在（不存在時呼叫端應退回 Firestore 查詢）"""
+    return _corpus is not None or os.path.exists(BIBLE_TEXT_CSV)
+
+
+# === 解析與編譯 ===
+
+def is_rest_day(readings: str) -> bool:
+    """是否為沒有經文的休息日/補讀日"""
+    return any(marker in (readings or '') for marker in REST_DAY_MARKERS)
+
+
+def compile_reference(ref) -> Span:
+    """
+    將單一範圍編譯為語料區間
+
+    Args:
+        ref: 經文範圍字串（例如 "創1-3"、"太5:1-12"）或已解析的 ScriptureRef
+
+    Returns:
+        Span: [start, end) 區間
+
+    Raises:
+        PlanCompileError: 範圍無法解析或不存在
+    """
+    corpus = get_corpus()
+    parsed = ref if isinstance(ref, ScriptureRef) else parse_reference(ref)
+    if not parsed:
+        raise PlanCompileError(f"無法解析「{ref}」")
+
+    book, start_chap, start_verse, end_chap, end_verse = parsed
+    if book not in corpus.last_chapter:
+        raise PlanCompileError(f"「{ref}」的書卷「{book}」不存在")
+    for chap in (start_chap, end_chap):
+        if (book, chap) not in corpus.chapters:
+            raise PlanCompileError(f"「{ref}」的 {book}{chap} 章不存在")
+
+    if start_verse:
+        start = corpus.verse_offset(book, start_chap, start_verse)
+    else:
+        start = corpus.chapters[(book, start_chap)][0]
+    if end_verse:
+        end = corpus.verse_offset(book, end_chap, end_verse) + 1
+    else:
+        end = corpus.chapters[(book, end_chap)][1]
+
+    if end <= start:
+        raise PlanCompileError(f"「{ref}」的起訖順序錯誤")
+    return start, end
+
+
+def compile_readings(readings: str) -> Tuple[List[Span], List[str]]:
+    """
+    編譯一天的讀經範圍字串（以 ; 分隔）
+
+    Args:
+        readings: 例如 "亞11;亞12;可2;詩37"
+
+    Returns:
+        Tuple[List[Span], List[str]]: (區間列表, 錯誤訊息列表)
+    """
+    spans: List[Span] = []
+    errors: List[str] = []
+    if is_rest_day(readings):
+        return spans, errors
+
+    for part, ref in parse_references(readings or ''):
+        if ref is None:
+            errors.append(f"無法解析「{part}」")
+            continue
+        try:
+            span = compile_reference(ref)
+        except PlanCompileError as e:
+            errors.append(str(e))
+            continue
+        # 相鄰區間合併，減少切片次數
+        if spans and spans[-1][1] == span[0]:
+            spans[-1] = (spans[-1][0], span[1])
+        else:
+            spans.append(span)
+
+    if not spans and not errors:
+        errors.append(f"「{readings}」沒有任何經文")
+    return spans, errors
+
+
+def compile_plans(path: str = BIBLE_PLANS_CSV) -> Tuple[Dict[Tuple[str, int], Dict], List[str]]:
+    """
+    編譯所有讀經計畫
+
+    Returns:
+        Tuple[Dict, List[str]]: ({(plan_type, day_number): {readings, spans}}, 錯誤訊息列表)
+    """
+    plans: Dict[Tuple[str, int], Dict] = {}
+    errors: List[str] = []
+
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            key = (row['plan_type'], int(row['day_number']))
+            spans, row_errors = compile_readings(row['readings'])
+            plans[key] = {'readings': row['readings'], 'spans': spans}
+            errors.extend(f"{key[0]} 第 {key[1]} 天：{e}" for e in row_errors)
+
+    return plans, errors
+
+
+def get_plan(plan_type: str, day_number: int) -> Optional[Dict]:
+    """取得某計畫某天的編譯結果 {readings, spans}（第一次呼叫時編譯全部計畫）"""
+    global _compiled_plans
+    if _compiled_plans is None:
+        _compiled_plans, errors = compile_plans()
+        for error in errors:
+            print(f"⚠️ 讀經計畫錯誤：{error}")
+    return _compiled_plans.get((plan_type, day_number))
+
+
+# === 取用經文 ===
+
+def get_verses(spans: List[Span]) -> List[Dict]:
+    """
+    以區間切片取出經文
+
+    Returns:
+        List[Dict]: {book_abbr, chapter, verse, text} 列表（與 BibleText 相同格式）
+    """
+    corpus = get_corpus()
+    verses = []
+    for start, end in spans:
+        for i in range(start, end):
+            verses.append({
+                'book_abbr': corpus.book_abbr[i],
+                'chapter': corpus.chapter[i],
+                'verse': corpus.verse[i],
+                'text': corpus.text[i],
+            })
+    return verses
+
+
+def get_verses_for_readings(readings: str) -> List[Dict]:
+    """解析讀經範圍字串並取出經文（無法解析的範圍會被略過）"""
+    spans, errors = compile_readings(readings)
+    for error in errors:
+        print(f"⚠️ {error}")
+    return get_verses(spans)
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("驗證讀經計畫...")
+    plans, errors = compile_plans()
+    rest_days = sum(1 for plan in plans.values() if is_rest_day(plan['readings']))
+    total_verses = sum(end - start for plan in plans.values() for start, end in plan['spans'])
+    print(f"✓ 編譯 {len(plans)} 天（休息日 {rest_days} 天），共 {total_verses} 節")
+
+    if errors:
+        print(f"❌ {len(errors)} 個無法解析的範圍：")
+        for error in errors:
+            print(f"   {error}")
+        print("=" * 50)
+        sys.exit(1)
+
+    print("✓ 所有範圍皆有效")
+    print("=" * 50)
@@ -5,7 +5,7 @@
 """
 
 from database import User
-import json
+from quiz_generator import get_quiz, reset_quiz
 from datetime import date
 
 def check_user_state(line_user_id: str):
@@ -27,21 +27,19 @@ def check_user_state(line_user_id: str):
     print(f"測驗狀態: {user.quiz_state}")
     print(f"聯繫狀態: {user.contact_state}")
     
-    # 解析 quiz_data
+    # 解析測驗狀態
     try:
-        quiz_data = json.loads(user.quiz_data)
-        if quiz_data:
+        quiz = get_quiz(user)
+        if quiz:
             print(f"\n測驗資料:")
-            print(f"  當前題目索引: {quiz_data.get('current_question_index', 'N/A')}")
-            print(f"  總題數: {len(quiz_data.get('questions', []))}")
-            if 'questions' in quiz_data and quiz_data['questions']:
-                current_idx = quiz_data.get('current_question_index', 0)
-                if current_idx < len(quiz_data['questions']):
-                    current_q = quiz_data['questions'][current_idx]
-                    print(f"  當前題目: {current_q.get('ref', 'N/A')}")
-                    print(f"  答題次數: {current_q.get('attempts', 0)}")
+            print(f"  當前題目索引: {quiz.get('i', 'N/A')}")
+            print(f"  總題數: {len(quiz.get('ids', []))}")
+            current_idx = quiz.get('i', 0)
+            if current_idx < len(quiz.get('ids', [])):
+                print(f"  當前題目: {quiz['ids'][current_idx]}")
+                print(f"  答題次數: {quiz.get('att', [0] * len(quiz['ids']))[current_idx]}")
     except:
-        print(f"測驗資料: (無效的 JSON)")
+        print(f"測驗資料: (無效的格式)")
     
     print(f"{'='*60}\n")
     
@@ -57,9 +55,7 @@ def reset_user_quiz_state(line_user_id: str):
     
     print(f"正在重置使用者 {line_user_id} 的測驗狀態...")
     
-    user.quiz_state = "IDLE"
-    user.quiz_data = "{}"
-    user.save()
+    reset_quiz(user)
     
     print(f"✅ 測驗狀態已重置")
     return True
@@ -77,7 +73,7 @@ def reset_user_reading_progress(line_user_id: str):
     user.current_day = 1
     user.last_read_date = None
     user.quiz_state = "IDLE"
-    user.quiz_data = "{}"
+    user.quiz = {}
     user.save()
     
     print(f"✅ 讀經進度已重置到第 1 天")
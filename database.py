@@ -6,6 +6,7 @@ import pandas as pd
 from google.cloud import firestore
 from datetime import date, datetime
 import json
+import unicodedata
 from typing import Optional, List, Dict, Any
 
 # 初始化 Firestore 客戶端
@@ -16,6 +17,40 @@ USERS_COLLECTION = "users"
 BIBLE_PLANS_COLLECTION = "bible_plans"
 BIBLE_TEXT_COLLECTION = "bible_text"
 
+# 搜尋用的顯示名稱欄位（管理後台以前綴範圍查詢）
+DISPLAY_NAME_SEARCH_FIELD = "display_name_lower"
+
+
+def normalize_display_name(name) -> Optional[str]:
+    """搜尋用的顯示名稱：NFKC 正規化（全形轉半形）、去除前後空白並轉小寫"""
+    if not name:
+        return None
+    return unicodedata.normalize('NFKC', str(name)).strip().casefold() or None
+
+
+# 單次 BatchGetDocuments 請求的文件數上限
+GET_ALL_BATCH_SIZE = 300
+
+
+def get_documents(refs, field_paths: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    以 db.get_all 批次讀取多份文件（每 GET_ALL_BATCH_SIZE 份一次往返）
+
+    Args:
+        refs: DocumentReference 列表（重複的會合併）
+        field_paths: 可選的欄位投影
+
+    Returns:
+        Dict[str, DocumentSnapshot]: {文件路徑: 快照}，只包含存在的文件
+    """
+    unique_refs = list({ref.path: ref for ref in refs}.values())
+    snapshots = {}
+    for i in range(0, len(unique_refs), GET_ALL_BATCH_SIZE):
+        for snapshot in db.get_all(unique_refs[i:i + GET_ALL_BATCH_SIZE], field_paths=field_paths):
+            if snapshot.exists:
+                snapshots[snapshot.reference.path] = snapshot
+    return snapshots
+
 # --- User 類別 (Firestore 版本) ---
 
 class UserObject:
@@ -51,17 +86,58 @@ class UserObject:
         """返回字典格式的使用者資料"""
         return self._data.copy()
     
-    def save(self):
-        """儲存變更到 Firestore"""
+    def save(self, writer=None):
+        """
+        儲存變更到 Firestore
+        
+        Args:
+            writer: 可選的 WriteBatch / Transaction，傳入時只加入寫入，由呼叫端 commit
+        """
         if not self._id:
             raise ValueError("Cannot save user without _id")
         
         users_ref = db.collection(USERS_COLLECTION)
         doc_ref = users_ref.document(self._id)
         
+        # 搜尋欄位隨顯示名稱一起更新
+        if 'display_name' in self._data:
+            self._data[DISPLAY_NAME_SEARCH_FIELD] = normalize_display_name(self._data['display_name'])
+        
         # 不儲存 _id 和 _data
         save_data = {k: v for k, v in self._data.items() if not k.startswith('_')}
-        doc_ref.update(save_data)
+        if writer is not None:
+            writer.update(doc_ref, save_data)
+        else:
+            doc_ref.update(save_data)
+
+    def update_fields(self, updates: Dict[str, Any], writer=None):
+        """
+        只寫入指定欄位（支援 "quiz.i" 這類巢狀路徑），同時更新本地資料
+
+        Args:
+            updates: {欄位路徑: 值}，值為 firestore.DELETE_FIELD 時刪除該欄位
+            writer: 可選的 WriteBatch / Transaction，傳入時只加入寫入，由呼叫端 commit
+        """
+        if not self._id:
+            raise ValueError("Cannot save user without _id")
+        if not updates:
+            return
+
+        for path, value in updates.items():
+            *parents, leaf = path.split('.')
+            node = self._data
+            for key in parents:
+                node = node.setdefault(key, {})
+            if value is firestore.DELETE_FIELD:
+                node.pop(leaf, None)
+            else:
+                node[leaf] = value
+
+        doc_ref = db.collection(USERS_COLLECTION).document(self._id)
+        if writer is not None:
+            writer.update(doc_ref, updates)
+        else:
+            doc_ref.update(updates)
 
 class User:
     """使用者類別 - Firestore 版本"""
@@ -99,8 +175,10 @@ class User:
             'current_day': 1,
             'last_read_date': None,
             'quiz_state': 'IDLE',
-            'quiz_data': '{}',
+            'quiz': {},
+            'quiz_mode': 'fill',
             'display_name': None,
+            DISPLAY_NAME_SEARCH_FIELD: None,
             'contact_state': 'IDLE',
             'contact_email': '',
             
@@ -115,6 +193,7 @@ class User:
             'quiz_perfect_count': 0,
             'quiz_total_count': 0,
             'week_reading_days': 0,
+            'reading_history': {},
             'badges': [],
             'milestone_achieved': {},
             'show_in_leaderboard': True,
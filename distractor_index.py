@@ -0,0 +1,96 @@
+"""
+選擇題干擾選項索引 (Distractor Index)
+
+離線從 data/bible_text.csv 統計每卷書中各長度最常出現的關鍵詞（與挖空答案使用相同的分詞），存成
+data/distractor_index.json：{書卷: {長度: [詞, ...]}}。
+出選擇題時從「同一卷書、同樣長度」的高頻詞中挑選干擾選項，看起來合理又不會和答案混淆。
+
+執行方式（重建索引）：python3.11 distractor_index.py
+"""
+import csv
+import json
+import os
+import random
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from bible_corpus import BIBLE_TEXT_CSV, DATA_DIR
+from segmenter import key_terms
+
+DISTRACTOR_INDEX_JSON = os.path.join(DATA_DIR, 'distractor_index.json')
+
+TERMS_PER_BUCKET = 20   # 每個 (書卷, 長度) 保留的高頻詞數
+
+_index: Optional[Dict[str, Dict[str, List[str]]]] = None
+
+
+def build_index(path: str = BIBLE_TEXT_CSV) -> Dict[str, Dict[str, List[str]]]:
+    """統計每卷書各長度的高頻關鍵詞"""
+    counts = defaultdict(Counter)
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            verse_id = f"{row['book_abbr']}{row['chapter']}:{row['verse']}"
+            for term in key_terms(verse_id, row['text']):
+                counts[(row['book_abbr'], len(term))][term] += 1
+
+    index: Dict[str, Dict[str, List[str]]] = {}
+    for (book, length), counter in counts.items():
+        terms = [term for term, _ in counter.most_common(TERMS_PER_BUCKET)]
+        index.setdefault(book, {})[str(length)] = terms
+    return index
+
+
+def get_index() -> Dict[str, Dict[str, List[str]]]:
+    """取得（必要時載入）干擾選項索引"""
+    global _index
+    if _index is None:
+        if os.path.exists(DISTRACTOR_INDEX_JSON):
+            with open(DISTRACTOR_INDEX_JSON, encoding='utf-8') as f:
+                _index = json.load(f)
+        else:
+            _index = build_index()
+    return _index
+
+
+def get_distractors(book_abbr: str, answer: str, verse_text: str = "",
+                    count: int = 3, rng: Optional[random.Random] = None) -> List[str]:
+    """
+    為答案挑選干擾選項
+
+    Args:
+        book_abbr: 經文所在書卷
+        answer: 正確答案
+        verse_text: 經文全文（出現在經文中的詞不會被選為干擾選項）
+        count: 干擾選項數
+        rng: 亂數產生器（傳入固定種子可讓同一題每次顯示相同選項）
+
+    Returns:
+        List[str]: 干擾選項（可能少於 count）
+    """
+    rng = rng or random
+    index = get_index()
+    length = str(len(answer))
+
+    # 同書卷同長度 → 其他書卷同長度
+    pools = [index.get(book_abbr, {}).get(length, [])]
+    pools.append([term for book, buckets in index.items() if book != book_abbr
+                  for term in buckets.get(length, [])[:3]])
+
+    distractors: List[str] = []
+    for pool in pools:
+        candidates = [term for term in pool
+                      if term != answer and term not in verse_text and term not in distractors]
+        rng.shuffle(candidates)
+        distractors.extend(candidates[:count - len(distractors)])
+        if len(distractors) >= count:
+            break
+    return distractors
+
+
+if __name__ == "__main__":
+    print("建立選擇題干擾選項索引...")
+    index = build_index()
+    with open(DISTRACTOR_INDEX_JSON, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    buckets = sum(len(b) for b in index.values())
+    print(f"✓ {len(index)} 卷書、{buckets} 組長度，已寫入 {DISTRACTOR_INDEX_JSON}")
@@ -0,0 +1,243 @@
+"""
+小組排行模組 (Group Leaderboard)
+
+小組文件上維護增量彙總欄位，成員分數變動時在使用者資料寫入後另外更新（盡力而為）：
+- week_scores.{週次}: 本週小組總分
+- daily_reads.{日期}: 當日完成讀經的成員數
+- streak_sum: 成員連續天數總和（平均 = streak_sum / member_count）
+- member_state.{user_id}.last_read / streak: 各成員最後讀經日與連續天數（見 group_manager.py）
+
+小組排行與小組今日進度因此只需讀取小組文件，不必逐一讀取成員。
+
+小組可能已解散，彙總更新失敗不能讓使用者的計分一併失敗，因此不與使用者資料同批次寫入；
+遺漏的更新由 reconcile_group_aggregates() 以使用者資料與積分帳本重算修正
+（隨 /trigger/reconcile-admin-stats 每晚執行）。
+
+執行方式（校正）：python3.11 group_leaderboard.py
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from google.cloud import firestore
+from database import db, USERS_COLLECTION
+from group_manager import MEMBER_STATE_FIELD
+
+GROUPS_COLLECTION = "groups"
+
+
+def week_key(day: Optional[date] = None) -> str:
+    """ISO 週次鍵值，例如 "2026-W42" """
+    iso = (day or datetime.now().date()).isocalendar()
+    return f"{iso[0]}-W{iso[1]:02d}"
+
+
+def week_score_path(day: Optional[date] = None) -> str:
+    """
+    本週小組總分的欄位路徑
+
+    週次鍵值以數字開頭且含 "-"，order_by 只接受以反引號括住的路徑，寫入與排序都使用此路徑
+    """
+    return firestore.FieldPath("week_scores", week_key(day)).to_api_repr()
+
+
+def day_key(day: Optional[date] = None) -> str:
+    """日期鍵值，例如 "2026-10-19" """
+    return (day or datetime.now().date()).isoformat()
+
+
+def apply_score_change(group_id: str, points: int, streak_delta: int,
+                       read_today: bool, writer=None, user_id: Optional[str] = None,
+                       streak: Optional[int] = None) -> None:
+    """
+    增量更新小組彙總
+
+    Args:
+        group_id: 小組 ID
+        points: 本次成員獲得的分數（含徽章獎勵）
+        streak_delta: 成員連續天數的變化量
+        read_today: 是否為該成員今天第一次完成讀經
+        writer: 可選的 WriteBatch / Transaction，傳入時由呼叫端 commit
+        user_id: 成員 LINE ID，提供時一併更新該成員的 member_state
+        streak: 成員目前的連續天數
+    """
+    update = {}
+    if user_id:
+        state_path = f"{MEMBER_STATE_FIELD}.{user_id}"
+        if read_today:
+            update[f"{state_path}.last_read"] = day_key()
+        if streak is not None:
+            update[f"{state_path}.streak"] = streak
+    if points:
+        update[week_score_path()] = firestore.Increment(points)
+    if read_today:
+        update[f"daily_reads.{day_key()}"] = firestore.Increment(1)
+    if streak_delta:
+        update["streak_sum"] = firestore.Increment(streak_delta)
+    if not update:
+        return
+
+    group_ref = db.collection(GROUPS_COLLECTION).document(group_id)
+    if writer is not None:
+        writer.update(group_ref, update)
+    else:
+        group_ref.update(update)
+
+
+def get_group_progress(group_data: Dict) -> Dict:
+    """
+    從小組文件計算彙總數字
+
+    Args:
+        group_data: 小組文件資料
+
+    Returns:
+        Dict: {week_score, read_today, member_count, avg_streak}
+    """
+    member_count = group_data.get("member_count", len(group_data.get("members", [])))
+    states = group_data.get(MEMBER_STATE_FIELD)
+    if states:
+        # 只計算目前的成員（已離開成員今天的讀經不算）
+        today = day_key()
+        member_ids = {member.get("user_id") for member in group_data.get("members") or []}
+        read_today = sum(1 for user_id, state in states.items()
+                         if user_id in member_ids and state.get("last_read") == today)
+    else:
+        read_today = (group_data.get("daily_reads") or {}).get(day_key(), 0)
+    streak_sum = group_data.get("streak_sum", 0) or 0
+
+    return {
+        "week_score": (group_data.get("week_scores") or {}).get(week_key(), 0),
+        "read_today": min(read_today, member_count),
+        "member_count": member_count,
+        "avg_streak": round(streak_sum / member_count, 1) if member_count else 0,
+    }
+
+
+def get_group_leaderboard(limit: int = 10) -> List[Dict]:
+    """
+    獲取本週小組排行
+
+    Args:
+        limit: 返回的排名數量
+
+    Returns:
+        List[Dict]: 排行榜列表
+    """
+    query = (db.collection(GROUPS_COLLECTION)
+             .order_by(week_score_path(), direction=firestore.Query.DESCENDING)
+             .limit(limit))
+
+    leaderboard = []
+    for i, doc in enumerate(query.stream(), 1):
+        group_data = doc.to_dict()
+        progress = get_group_progress(group_data)
+        leaderboard.append({
+            "rank": i,
+            "group_id": group_data.get("group_id", doc.id),
+            "group_name": group_data.get("group_name", "未命名小組"),
+            **progress,
+        })
+
+    return leaderboard
+
+
+def format_group_leaderboard_message(leaderboard: List[Dict], my_group_id: Optional[str] = None) -> str:
+    """
+    格式化小組排行訊息
+
+    Args:
+        leaderboard: get_group_leaderboard 的結果
+        my_group_id: 使用者所在的小組（標示用）
+
+    Returns:
+        str: 格式化的訊息
+    """
+    lines = ["👥 本週小組排行", ""]
+
+    if not leaderboard:
+        lines.append("本週還沒有小組上榜，和組員一起加油！💪")
+        return "\n".join(lines)
+
+    rank_icons = {1: "🥇", 2: "🥈", 3: "🥉"}
+    for entry in leaderboard:
+        rank_icon = rank_icons.get(entry["rank"], f"{entry['rank']}.")
+        mine = " 👈" if entry["group_id"] == my_group_id else ""
+        lines.append(f"{rank_icon} {entry['group_name']} {entry['week_score']}分{mine}")
+        lines.append(f"   今日 {entry['read_today']}/{entry['member_count']} | 平均連續 {entry['avg_streak']} 天")
+        lines.append("")
+
+    return "\n".join(lines).rstrip()
+
+
+def reconcile_group_aggregates(today: Optional[date] = None) -> int:
+    """
+    以使用者資料與積分帳本重新計算所有小組的彙總欄位
+
+    - 本週總分：目前成員本週帳本事件的分數總和
+    - 今日完成人數、連續天數總和與 member_state：取自成員的使用者資料
+
+    Returns:
+        int: 校正的小組數
+    """
+    from score_ledger import SCORE_EVENTS_COLLECTION
+
+    today = today or datetime.now().date()
+    week_start = (today - timedelta(days=today.weekday())).isoformat()
+
+    users = {}
+    for doc in db.collection(USERS_COLLECTION).select(
+            ["line_user_id", "current_streak", "last_read_date"]).stream():
+        data = doc.to_dict()
+        if data.get("line_user_id"):
+            users[data["line_user_id"]] = (doc.id, data)
+
+    week_points: Dict[str, int] = {}
+    events = db.collection(SCORE_EVENTS_COLLECTION).where(
+        filter=firestore.FieldFilter("date", ">=", week_start)
+    ).select(["user_id", "date", "points"]).stream()
+    for doc in events:
+        event = doc.to_dict()
+        if event.get("date", "") <= today.isoformat():
+            week_points[event["user_id"]] = week_points.get(event["user_id"], 0) + (event.get("points") or 0)
+
+    today_key = day_key(today)
+    batch = db.batch()
+    pending = 0
+    reconciled = 0
+    for doc in db.collection(GROUPS_COLLECTION).select(["members"]).stream():
+        update = {}
+        week_score = streak_sum = read_today = 0
+        for member in doc.to_dict().get("members") or []:
+            user_id = member.get("user_id")
+            if user_id not in users:
+                continue
+            doc_id, data = users[user_id]
+            streak = data.get("current_streak") or 0
+            last_read = str(data.get("last_read_date") or "")[:10] or None
+            week_score += week_points.get(doc_id, 0)
+            streak_sum += streak
+            read_today += last_read == today_key
+            update[f"{MEMBER_STATE_FIELD}.{user_id}.streak"] = streak
+            update[f"{MEMBER_STATE_FIELD}.{user_id}.last_read"] = last_read
+        update[week_score_path(today)] = week_score
+        update[f"daily_reads.{today_key}"] = read_today
+        update["streak_sum"] = streak_sum
+
+        batch.update(doc.reference, update)
+        pending += 1
+        reconciled += 1
+        if pending >= 500:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    if pending > 0:
+        batch.commit()
+    return reconciled
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("校正小組彙總...")
+    print(f"✓ 校正 {reconcile_group_aggregates()} 個小組")
+    print("=" * 50)
@@ -2,16 +2,33 @@
 小組管理模組 (Group Manager)
 
 負責處理小組的創建、加入、離開、隨機分配等功能
+
+小組文件的 member_state.{user_id} 保存每位成員的小型狀態（通知開關、最後讀經日、連續天數），
+成員完成讀經或切換通知時只以欄位路徑更新自己的項目；小組資訊與小組排行只需讀取小組文件。
 """
 
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from google.cloud import firestore
 from database import db
+import admin_stats
 import random
 import string
 
 # 小組設定
 MAX_GROUP_MEMBERS = 6  # 每組最多 6 人
+CANDIDATE_GROUPS = 5   # 加入時依序嘗試的未滿小組數
+
+# 分配器文件（_metadata/group_allocator）：記錄目前開放的小組，讓同時建立新小組的請求互斥；
+# 也保存小組名稱序號 name_seq 與舊名稱保留位元圖 names_reserved
+GROUP_ALLOCATOR_DOC = "group_allocator"
+
+# 成員狀態欄位：member_state.{user_id} = {notification_enabled, last_read, streak}
+MEMBER_STATE_FIELD = "member_state"
+
+# 小組名稱字彙
+GROUP_NAME_ADJECTIVES = ["信實", "喜樂", "和平", "恩典", "溫柔", "良善", "聖潔", "光明", "得勝", "蒙福", "讚美", "永恆", "盼望", "仁愛"]
+GROUP_NAME_NOUNS = ["溪水旁", "磐石", "燈塔", "橄欖樹", "葡萄樹", "芥菜種", "羊圈", "聖殿", "迦南", "錫安", "活水泉", "避難所"]
 
 
 def generate_group_id() -> str:
@@ -21,38 +38,94 @@ def generate_group_id() -> str:
     return f"group_{timestamp}_{random_suffix}"
 
 
-def generate_group_name() -> str:
-    """生成一個有聖經意涵的小組名稱"""
-    adjectives = ["信實", "喜樂", "和平", "恩典", "溫柔", "良善", "聖潔", "光明", "得勝", "蒙福", "讚美", "永恆", "盼望", "仁愛"]
-    nouns = ["溪水旁", "磐石", "燈塔", "橄欖樹", "葡萄樹", "芥菜種", "羊圈", "聖殿", "迦南", "錫安", "活水泉", "避難所"]
+def _build_name_pool() -> List[str]:
+    """
+    預先排列所有名稱組合：先用單詞（「磐石小組」），再用形容詞 + 名詞（「信實磐石小組」），
+    各自以固定種子洗牌，讓連續建立的小組名稱看起來是隨機的
+    """
+    rng = random.Random("group-names")
+    singles = [f"{word}小組" for word in GROUP_NAME_NOUNS + GROUP_NAME_ADJECTIVES]
+    combos = [f"{adjective}{noun}小組" for adjective in GROUP_NAME_ADJECTIVES for noun in GROUP_NAME_NOUNS]
+    rng.shuffle(singles)
+    rng.shuffle(combos)
+    return singles + combos
+
+
+_NAME_POOL = _build_name_pool()
+_NAME_INDEX = {name: index for index, name in enumerate(_NAME_POOL)}
+
+
+def group_name_for(seq: int) -> str:
+    """
+    第 seq 個小組名稱；名稱用完後加上輪次編號（「磐石小組2」），序號不同名稱必不同
     
-    # 40% 的機率是 "形容詞 + 小組", 60% 的機率是 "名詞 + 小組"
-    if random.random() < 0.4:
-        name = f"{random.choice(adjectives)}小組"
-    else:
-        name = f"{random.choice(nouns)}小組"
-        
-    # 檢查名稱是否重複 (簡易版)
-    groups_ref = db.collection("groups")
-    query = groups_ref.where("group_name", "==", name).limit(1)
-    if len(list(query.stream())) > 0:
-        # 如果重複，加上一個數字後綴再試
-        return f"{name}{random.randint(2, 9)}"
-        
-    return name
+    Args:
+        seq: 名稱序號（從 0 開始）
+    
+    Returns:
+        str: 小組名稱
+    """
+    rounds, index = divmod(seq, len(_NAME_POOL))
+    return _NAME_POOL[index] if rounds == 0 else f"{_NAME_POOL[index]}{rounds + 1}"
 
 
-def create_group() -> str:
+def group_name_seq(name: str) -> Optional[int]:
     """
-    創建新小組
+    group_name_for 的反函數（舊的隨機名稱也都在名稱空間內）
+    
+    Args:
+        name: 小組名稱
     
     Returns:
-        str: 新創建的小組 ID
+        Optional[int]: 名稱序號，不是名稱池中的名稱時返回 None
     """
-    group_id = generate_group_id()
-    group_name = generate_group_name()
+    base = name.rstrip(string.digits)
+    suffix = name[len(base):]
+    if base not in _NAME_INDEX:
+        return None
+    if not suffix:
+        return _NAME_INDEX[base]
+    rounds = int(suffix) - 1
+    if rounds < 1 or suffix.startswith("0"):
+        return None
+    return rounds * len(_NAME_POOL) + _NAME_INDEX[base]
+
+
+def _next_group_name(allocator: Dict) -> Tuple[str, Dict]:
+    """
+    從分配器資料取出下一個名稱（略過舊小組已使用的名稱）
+    
+    Returns:
+        Tuple[str, Dict]: (名稱, 要寫回分配器的欄位)
+    """
+    seq = allocator.get("name_seq", 0)
+    reserved = int.from_bytes(bytes(allocator.get("names_reserved") or b""), 'little')
+    while (reserved >> seq) & 1:
+        seq += 1
+    return group_name_for(seq), {"name_seq": seq + 1}
+
+
+@firestore.transactional
+def _allocate_group_name(transaction, allocator_ref) -> str:
+    allocator = allocator_ref.get(transaction=transaction).to_dict() or {}
+    name, updates = _next_group_name(allocator)
+    transaction.set(allocator_ref, updates, merge=True)
+    return name
+
+
+def generate_group_name() -> str:
+    """
+    生成一個有聖經意涵且不重複的小組名稱
     
-    group_data = {
+    名稱依分配器的序號依次發出（一次讀寫分配器文件），不需查詢既有小組
+    """
+    allocator_ref = db.collection("_metadata").document(GROUP_ALLOCATOR_DOC)
+    return _allocate_group_name(db.transaction(), allocator_ref)
+
+
+def _new_group_data(group_id: str, group_name: str) -> Dict:
+    """新小組的初始資料"""
+    return {
         "group_id": group_id,
         "group_name": group_name,
         "created_at": datetime.now().isoformat(),
@@ -61,36 +134,209 @@ def create_group() -> str:
         "is_full": False,
         "members": []
     }
+
+
+def create_group() -> str:
+    """
+    創建新小組
+    
+    Returns:
+        str: 新創建的小組 ID
+    """
+    group_id = generate_group_id()
+    group_name = generate_group_name()
     
     # 儲存到 Firestore
-    db.collection("groups").document(group_id).set(group_data)
+    batch = db.batch()
+    batch.set(db.collection("groups").document(group_id), _new_group_data(group_id, group_name))
+    admin_stats.increment(writer=batch, groups=1)
+    batch.commit()
     
     print(f"✅ 創建新小組: {group_name} ({group_id})")
     return group_id
 
 
+def find_available_groups(limit: int = CANDIDATE_GROUPS) -> List[str]:
+    """
+    尋找未滿的小組（人數最多的優先，先把現有小組補滿）
+    
+    查詢結果只是候選名單，實際是否還有空位由加入時的交易確認
+    
+    Args:
+        limit: 最多返回幾個候選小組
+    
+    Returns:
+        List[str]: 小組 ID（依人數由多到少）
+    """
+    groups_ref = db.collection("groups")
+    query = (groups_ref
+             .where(filter=firestore.FieldFilter("is_full", "==", False))
+             .order_by("member_count", direction=firestore.Query.DESCENDING)
+             .limit(limit))
+    candidates = [(doc.to_dict().get("member_count") or 0, random.random(), doc.id) for doc in query.stream()]
+    # 人數相同的小組隨機排序，分散同時加入的請求
+    return [group_id for count, _, group_id in sorted(candidates, reverse=True) if count < MAX_GROUP_MEMBERS]
+
+
 def find_available_group() -> Optional[str]:
     """
     尋找未滿的小組
     
     Returns:
-        Optional[str]: 可加入的小組 ID，如果沒有則返回 None
+        Optional[str]: 可加入的小組 ID（人數最多者），如果沒有則返回 None
     """
-    # 查詢未滿的小組
-    groups_ref = db.collection("groups")
-    query = groups_ref.where("is_full", "==", False).limit(10)
+    candidates = find_available_groups(limit=1)
+    return candidates[0] if candidates else None
+
+
+def _new_member(user_id: str, display_name: str, user_doc_id: Optional[str] = None) -> Dict:
+    member = {
+        "user_id": user_id,
+        "display_name": display_name,
+        "joined_at": datetime.now().isoformat(),
+        "notification_enabled": True
+    }
+    # 使用者文件 ID（文件 ID 為自動產生，記錄後可直接以 get_all 批次讀取成員資料）
+    if user_doc_id:
+        member["user_doc_id"] = user_doc_id
+    return member
+
+
+def _new_member_state(streak: int) -> Dict:
+    return {"notification_enabled": True, "streak": streak}
+
+
+def _append_member(transaction, group_ref, group_data: Dict, member: Dict, streak: int) -> None:
+    """在交易中把成員寫入小組（呼叫端已確認有空位）"""
+    members = list(group_data.get("members") or []) + [member]
+    transaction.update(group_ref, {
+        "members": members,
+        "member_count": len(members),
+        "is_full": len(members) >= MAX_GROUP_MEMBERS,
+        "streak_sum": (group_data.get("streak_sum") or 0) + streak,
+        f"{MEMBER_STATE_FIELD}.{member['user_id']}": _new_member_state(streak),
+    })
+    admin_stats.increment(writer=transaction, group_members=1)
+
+
+def _mark_user_joined(transaction, user_ref, group_id: str) -> None:
+    """在同一交易中更新使用者的小組欄位"""
+    if user_ref is not None:
+        transaction.update(user_ref, {
+            "group_id": group_id,
+            "group_notification_enabled": True,
+            "joined_group_at": datetime.now().isoformat(),
+        })
+
+
+@firestore.transactional
+def _join_existing_group(transaction, group_ref, member: Dict, streak: int, user_ref) -> bool:
+    """
+    在交易中加入指定小組：重新讀取小組，確認仍有空位且使用者不在其中才寫入
     
-    available_groups = []
-    for doc in query.stream():
-        group_data = doc.to_dict()
-        if group_data["member_count"] < MAX_GROUP_MEMBERS:
-            available_groups.append(group_data["group_id"])
+    Returns:
+        bool: 是否成功加入
+    """
+    snapshot = group_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return False
     
-    if available_groups:
-        # 隨機選擇一個小組
-        return random.choice(available_groups)
+    group_data = snapshot.to_dict()
+    members = group_data.get("members") or []
+    if len(members) >= MAX_GROUP_MEMBERS:
+        return False
+    if any(m["user_id"] == member["user_id"] for m in members):
+        print(f"⚠️ 使用者已在小組中: {member['user_id']}")
+        return False
     
-    return None
+    _append_member(transaction, group_ref, group_data, member, streak)
+    _mark_user_joined(transaction, user_ref, group_ref.id)
+    return True
+
+
+@firestore.transactional
+def _join_open_group(transaction, member: Dict, streak: int, user_ref,
+                     new_group_id: str) -> Tuple[str, Optional[str]]:
+    """
+    在交易中加入分配器目前開放的小組；開放小組已滿時建立新小組並設為開放小組
+    
+    所有建立新小組的請求都會讀寫同一份分配器文件，同時湧入時只有一個交易能建立新小組，
+    其餘交易重試後會加入這個新小組，不會多建出半空的小組；新小組的名稱也在同一交易中依序發出
+    
+    Returns:
+        Tuple[str, Optional[str]]: (加入的小組 ID, 新建小組的名稱，加入既有小組時為 None)
+    """
+    allocator_ref = db.collection("_metadata").document(GROUP_ALLOCATOR_DOC)
+    allocator = allocator_ref.get(transaction=transaction).to_dict() or {}
+    
+    open_group_id = allocator.get("open_group_id")
+    if open_group_id:
+        group_ref = db.collection("groups").document(open_group_id)
+        snapshot = group_ref.get(transaction=transaction)
+        group_data = snapshot.to_dict() if snapshot.exists else None
+        if group_data and len(group_data.get("members") or []) < MAX_GROUP_MEMBERS:
+            _append_member(transaction, group_ref, group_data, member, streak)
+            _mark_user_joined(transaction, user_ref, open_group_id)
+            return open_group_id, None
+    
+    new_group_name, name_updates = _next_group_name(allocator)
+    group_ref = db.collection("groups").document(new_group_id)
+    group_data = _new_group_data(new_group_id, new_group_name)
+    group_data["members"] = [member]
+    group_data["member_count"] = 1
+    group_data["is_full"] = MAX_GROUP_MEMBERS <= 1
+    group_data["streak_sum"] = streak
+    group_data[MEMBER_STATE_FIELD] = {member["user_id"]: _new_member_state(streak)}
+    transaction.set(group_ref, group_data)
+    transaction.set(allocator_ref, {
+        "open_group_id": new_group_id,
+        "groups_created": firestore.Increment(1),
+        "updated_at": datetime.now().isoformat(),
+        **name_updates,
+    }, merge=True)
+    admin_stats.increment(writer=transaction, groups=1, group_members=1)
+    _mark_user_joined(transaction, user_ref, new_group_id)
+    return new_group_id, new_group_name
+
+
+def allocate_group(user_id: str, display_name: str, streak: int = 0, user_doc_id: Optional[str] = None) -> Optional[Dict]:
+    """
+    為使用者分配小組座位（先補滿現有小組，沒有空位才建立新小組）
+    
+    每次加入都在交易中重新確認人數，不會因同時加入而遺失成員或超額；
+    使用者資料的小組欄位與小組成員在同一交易寫入
+    
+    Args:
+        user_id: 使用者 LINE ID
+        display_name: 使用者顯示名稱
+        streak: 使用者目前連續天數（計入小組彙總）
+        user_doc_id: 使用者文件 ID，提供時一併更新使用者的小組欄位
+    
+    Returns:
+        Optional[Dict]: {group_id, is_new_group}，失敗時返回 None
+    """
+    member = _new_member(user_id, display_name, user_doc_id)
+    user_ref = db.collection("users").document(user_doc_id) if user_doc_id else None
+    
+    # 1. 依人數由多到少嘗試候選小組
+    for group_id in find_available_groups():
+        group_ref = db.collection("groups").document(group_id)
+        try:
+            joined = _join_existing_group(db.transaction(), group_ref, member, streak, user_ref)
+        except Exception as e:
+            # 交易多次衝突（同時有很多人加入同一組）時改試下一個小組
+            print(f"⚠️ 加入小組 {group_id} 時交易衝突: {e}")
+            continue
+        if joined:
+            print(f"✅ 使用者 {display_name} 加入小組 {group_id}")
+            return {"group_id": group_id, "is_new_group": False}
+    
+    # 2. 候選小組都已額滿：經由分配器加入開放小組或建立新小組
+    group_id, new_group_name = _join_open_group(db.transaction(), member, streak, user_ref, generate_group_id())
+    if new_group_name:
+        print(f"✅ 創建新小組: {new_group_name} ({group_id})")
+    print(f"✅ 使用者 {display_name} 加入小組 {group_id}")
+    return {"group_id": group_id, "is_new_group": new_group_name is not None}
 
 
 def add_member_to_group(group_id: str, user_id: str, display_name: str) -> bool:
@@ -105,50 +351,57 @@ def add_member_to_group(group_id: str, user_id: str, display_name: str) -> bool:
     Returns:
         bool: 是否成功加入
     """
-    group_ref = db.collection("groups").document(group_id)
-    group_doc = group_ref.get()
+    from database import User
+    member_user = User.get_by_line_id(user_id)
+    streak = (member_user.current_streak or 0) if member_user else 0
+    user_ref = db.collection("users").document(member_user._id) if member_user else None
     
-    if not group_doc.exists:
-        print(f"❌ 小組不存在: {group_id}")
+    group_ref = db.collection("groups").document(group_id)
+    member = _new_member(user_id, display_name, member_user._id if member_user else None)
+    if not _join_existing_group(db.transaction(), group_ref, member, streak, user_ref):
+        print(f"❌ 無法加入小組（不存在、已滿或已是成員）: {group_id}")
         return False
     
-    group_data = group_doc.to_dict()
+    print(f"✅ 使用者 {display_name} 加入小組 {group_id}")
+    return True
+
+
+@firestore.transactional
+def _remove_member(transaction, group_ref, user_ref, user_id: str, streak: int) -> bool:
+    """
+    在交易中將成員移出小組（最後一位成員離開時刪除小組），並清除使用者的小組欄位
     
-    # 檢查是否已滿
-    if group_data["member_count"] >= MAX_GROUP_MEMBERS:
-        print(f"❌ 小組已滿: {group_id}")
+    Returns:
+        bool: 小組是否存在
+    """
+    snapshot = group_ref.get(transaction=transaction)
+    if not snapshot.exists:
         return False
     
-    # 檢查是否已在小組中
-    for member in group_data["members"]:
-        if member["user_id"] == user_id:
-            print(f"⚠️ 使用者已在小組中: {user_id}")
-            return False
+    group_data = snapshot.to_dict()
+    members = [m for m in group_data.get("members") or [] if m["user_id"] != user_id]
+    removed = len(group_data.get("members") or []) - len(members)
     
-    # 新增成員
-    new_member = {
-        "user_id": user_id,
-        "display_name": display_name,
-        "joined_at": datetime.now().isoformat(),
-        "notification_enabled": True
-    }
-    
-    group_data["members"].append(new_member)
-    group_data["member_count"] = len(group_data["members"])
-    group_data["is_full"] = group_data["member_count"] >= MAX_GROUP_MEMBERS
-    
-    # 更新 Firestore
-    group_ref.set(group_data)
-    
-    # 更新使用者資料
-    from database import User
-    User.update(user_id,
-        group_id=group_id,
-        group_notification_enabled=True,
-        joined_group_at=datetime.now().isoformat()
-    )
-    
-    print(f"✅ 使用者 {display_name} 加入小組 {group_id}")
+    # 如果小組沒有成員了，刪除小組
+    if not members:
+        transaction.delete(group_ref)
+        admin_stats.increment(writer=transaction, groups=-1, group_members=-removed)
+        print(f"🗑️ 刪除空小組: {group_ref.id}")
+    else:
+        admin_stats.increment(writer=transaction, group_members=-removed)
+        transaction.update(group_ref, {
+            "members": members,
+            "member_count": len(members),
+            "is_full": len(members) >= MAX_GROUP_MEMBERS,
+            "streak_sum": max(0, (group_data.get("streak_sum") or 0) - streak),
+            f"{MEMBER_STATE_FIELD}.{user_id}": firestore.DELETE_FIELD,
+        })
+    
+    transaction.update(user_ref, {
+        "group_id": None,
+        "group_notification_enabled": False,
+        "joined_group_at": None,
+    })
     return True
 
 
@@ -172,33 +425,13 @@ def remove_member_from_group(user_id: str) -> bool:
     
     group_id = user["group_id"]
     group_ref = db.collection("groups").document(group_id)
-    group_doc = group_ref.get()
+    user_ref = db.collection("users").document(user_obj._id)
     
-    if not group_doc.exists:
+    # 小組成員與使用者資料在同一交易更新，不會覆蓋同時加入的成員
+    if not _remove_member(db.transaction(), group_ref, user_ref, user_id, user.get("current_streak") or 0):
         print(f"❌ 小組不存在: {group_id}")
         return False
     
-    group_data = group_doc.to_dict()
-    
-    # 移除成員
-    group_data["members"] = [m for m in group_data["members"] if m["user_id"] != user_id]
-    group_data["member_count"] = len(group_data["members"])
-    group_data["is_full"] = False
-    
-    # 如果小組沒有成員了，刪除小組
-    if group_data["member_count"] == 0:
-        group_ref.delete()
-        print(f"🗑️ 刪除空小組: {group_id}")
-    else:
-        group_ref.set(group_data)
-    
-    # 更新使用者資料
-    User.update(user_id,
-        group_id=None,
-        group_notification_enabled=False,
-        joined_group_at=None
-    )
-    
     print(f"✅ 使用者 {user_id} 離開小組 {group_id}")
     return True
 
@@ -227,23 +460,22 @@ def join_random_group(user_id: str, display_name: str) -> Dict:
             "group_id": user.get("group_id")
         }
     
-    # 尋找可用小組
-    group_id = find_available_group()
-    is_new_group = False
-    
-    if not group_id:
-        # 沒有可用小組，創建新的
-        group_id = create_group()
-        is_new_group = True
-    
-    # 加入小組
-    success = add_member_to_group(group_id, user_id, display_name)
-    
-    if success:
+    # 分配小組座位（交易確認空位，必要時建立新小組）
+    try:
+        allocation = allocate_group(
+            user_id, display_name,
+            streak=(user_obj.current_streak or 0) if user_obj else 0,
+            user_doc_id=user_obj._id if user_obj else None
+        )
+    except Exception as e:
+        print(f"❌ 分配小組失敗: {e}")
+        allocation = None
+    
+    if allocation:
         return {
             "success": True,
-            "group_id": group_id,
-            "is_new_group": is_new_group
+            "group_id": allocation["group_id"],
+            "is_new_group": allocation["is_new_group"]
         }
     else:
         return {
@@ -289,6 +521,20 @@ def get_group_info(group_id: str) -> Optional[Dict]:
     return group_doc.to_dict()
 
 
+def group_members(group_data: Dict) -> List[Dict]:
+    """
+    小組成員列表，並合併 member_state 中的狀態（notification_enabled、last_read、streak）
+    
+    Args:
+        group_data: 小組文件資料
+    
+    Returns:
+        List[Dict]: 成員列表
+    """
+    states = group_data.get(MEMBER_STATE_FIELD) or {}
+    return [{**member, **states.get(member.get("user_id"), {})} for member in group_data.get("members") or []]
+
+
 def get_group_members(group_id: str) -> List[Dict]:
     """
     取得小組成員列表
@@ -304,7 +550,7 @@ def get_group_members(group_id: str) -> List[Dict]:
     if not group_info:
         return []
     
-    return group_info.get("members", [])
+    return group_members(group_info)
 
 
 def toggle_notification(user_id: str, enabled: bool) -> bool:
@@ -328,24 +574,16 @@ def toggle_notification(user_id: str, enabled: bool) -> bool:
     
     group_id = user["group_id"]
     
-    # 更新使用者的通知設定
-    User.update(user_id,
-        group_notification_enabled=enabled
-    )
-    
-    # 更新小組中的成員資料
-    group_ref = db.collection("groups").document(group_id)
-    group_doc = group_ref.get()
-    
-    if group_doc.exists:
-        group_data = group_doc.to_dict()
-        
-        for member in group_data["members"]:
-            if member["user_id"] == user_id:
-                member["notification_enabled"] = enabled
-                break
-        
-        group_ref.set(group_data)
+    # 使用者的通知設定與小組中該成員的狀態一起寫入，只更新這位成員的項目
+    batch = db.batch()
+    user_obj.update_fields({"group_notification_enabled": enabled}, writer=batch)
+    batch.update(db.collection("groups").document(group_id),
+                 {f"{MEMBER_STATE_FIELD}.{user_id}.notification_enabled": enabled})
+    try:
+        batch.commit()
+    except Exception as e:
+        print(f"❌ 更新小組通知設定失敗 {group_id}: {e}")
+        return False
     
     print(f"✅ 使用者 {user_id} 通知設定: {enabled}")
     return True
@@ -366,21 +604,30 @@ def format_group_info_message(group_id: str) -> str:
     if not group_info:
         return "❌ 找不到小組資訊"
     
-    members = group_info.get("members", [])
+    members = group_members(group_info)
     member_count = len(members)
     max_members = group_info.get("max_members", MAX_GROUP_MEMBERS)
     
+    from group_leaderboard import get_group_progress
+    progress = get_group_progress(group_info)
+    
     message = f"👥 小組資訊\n\n"
-    message += f"📊 人數：{member_count}/{max_members}\n\n"
+    message += f"📊 人數：{member_count}/{max_members}\n"
+    message += f"📖 小組今日進度 {progress['read_today']}/{member_count}\n"
+    message += f"🏆 本週小組積分：{progress['week_score']} 分｜平均連續 {progress['avg_streak']} 天\n\n"
     message += f"👤 成員列表：\n"
     
+    today = datetime.now().strftime("%Y-%m-%d")
     for i, member in enumerate(members, 1):
         name = member.get("display_name", "未知")
         notification = "🔔" if member.get("notification_enabled", True) else "🔕"
-        message += f"{i}. {name} {notification}\n"
+        read_mark = " ✅" if member.get("last_read") == today else ""
+        streak = f" 🔥{member['streak']}" if member.get("streak") else ""
+        message += f"{i}. {name}{read_mark}{streak} {notification}\n"
     
     message += f"\n💡 提示：\n"
     message += f"• 發送「小組留言」進入留言模式\n"
+    message += f"• 發送「小組排行」查看本週小組排行\n"
     message += f"• 發送「換組」可以隨機換到新小組\n"
     message += f"• 發送「小組通知關閉」可關閉通知"
     
@@ -2,13 +2,104 @@
 小組通知模組 (Group Notification)
 
 負責處理小組成員完成讀經後的通知功能
+
+每個小組可選擇通知模式（groups/{id}.notification_mode）：
+- instant：每位成員完成讀經時立即通知其他成員（預設）
+- digest：完成事件先暫存在小組文件的 digest_pending，由排程呼叫 flush_group_digests
+  在時間窗結束後合併成一則摘要（「小明、小華 完成了今日讀經」）
+
+小組訊息存放在 groups/{group_id}/messages，created_at 為伺服器時間戳記；
+查詢以游標 (start_after) 分頁，讀取成本只與頁面大小有關。
 """
 
-from datetime import datetime
-from typing import List, Dict
-from database import User
-from group_manager import get_group_members
-from linebot.v3.messaging import MessagingApi, PushMessageRequest, TextMessage
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+from google.cloud import firestore
+from database import User, db
+import admin_stats
+from group_manager import get_group_members, get_group_info, group_members
+from linebot.v3.messaging import MessagingApi, MulticastRequest, TextMessage
+
+# 小組通知模式
+NOTIFICATION_MODE_INSTANT = "instant"
+NOTIFICATION_MODE_DIGEST = "digest"
+
+# 摘要時間窗（分鐘），可由環境變數或小組文件的 digest_window_minutes 覆寫
+DEFAULT_DIGEST_WINDOW_MINUTES = int(os.environ.get("GROUP_DIGEST_WINDOW_MINUTES", "60"))
+
+# 小組訊息子集合
+GROUP_MESSAGES_SUBCOLLECTION = "messages"
+MESSAGE_PAGE_SIZE = 10
+
+# LINE multicast 每次最多 500 位收件者
+MULTICAST_LIMIT = 500
+
+# 小組通知在背景執行緒發送，不延遲發送者收到的回覆
+FANOUT_WORKERS = 4
+_fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="group-fanout")
+
+
+def get_notification_recipients(members: List[Dict], sender_id: str) -> List[str]:
+    """
+    小組通知的收件者：排除發送者本人與關閉通知的成員
+    
+    Args:
+        members: 小組成員列表
+        sender_id: 發送者 LINE ID
+    
+    Returns:
+        List[str]: 收件者 LINE ID
+    """
+    recipients = []
+    for member in members:
+        member_user_id = member.get("user_id")
+        if not member_user_id or member_user_id == sender_id:
+            continue
+        if not member.get("notification_enabled", True):
+            print(f"⏭️ 跳過 {member.get('display_name')} (通知已關閉)")
+            continue
+        recipients.append(member_user_id)
+    return recipients
+
+
+def multicast_text(messaging_api: MessagingApi, recipients: List[str], text: str) -> int:
+    """
+    以 multicast 發送相同文字給多位收件者（每 500 人一次呼叫）
+    
+    Returns:
+        int: 成功送出的收件者數
+    """
+    sent = 0
+    for i in range(0, len(recipients), MULTICAST_LIMIT):
+        chunk = recipients[i:i + MULTICAST_LIMIT]
+        try:
+            messaging_api.multicast(MulticastRequest(to=chunk, messages=[TextMessage(text=text)]))
+            sent += len(chunk)
+        except Exception as e:
+            print(f"❌ 小組通知發送失敗 ({len(chunk)} 人): {e}")
+    return sent
+
+
+def dispatch_multicast(messaging_api: MessagingApi, recipients: List[str], text: str) -> Future:
+    """
+    在背景執行緒發送小組通知，立即返回
+    
+    Args:
+        messaging_api: LINE Messaging API 實例
+        recipients: 收件者 LINE ID
+        text: 通知文字
+    
+    Returns:
+        Future: 完成時結果為成功送出的收件者數
+    """
+    def send() -> int:
+        sent = multicast_text(messaging_api, recipients, text)
+        print(f"📊 小組通知統計: 成功 {sent}/{len(recipients)}")
+        return sent
+    
+    return _fanout_executor.submit(send)
 
 
 def notify_group_members(user_id: str, group_id: str, display_name: str, messaging_api: MessagingApi) -> int:
@@ -22,46 +113,26 @@ def notify_group_members(user_id: str, group_id: str, display_name: str, messagi
         messaging_api: LINE Messaging API 實例
     
     Returns:
-        int: 成功發送通知的數量
+        int: 排入發送的通知數量
     """
     # 取得小組成員
-    members = get_group_members(group_id)
+    group_info = get_group_info(group_id) or {}
+    members = group_members(group_info)
     
     if not members:
         print(f"⚠️ 小組 {group_id} 沒有成員")
         return 0
     
-    # 準備通知訊息
-    notification_text = f"🎉 小組通知\n\n{display_name} 剛剛完成了今日讀經！\n\n一起為他加油鼓勵吧！💪"
-    
-    # 發送通知給其他成員
-    success_count = 0
-    
-    for member in members:
-        member_user_id = member.get("user_id")
-        notification_enabled = member.get("notification_enabled", True)
-        
-        # 跳過自己
-        if member_user_id == user_id:
-            continue
-        
-        # 跳過關閉通知的成員
-        if not notification_enabled:
-            print(f"⏭️ 跳過 {member.get('display_name')} (通知已關閉)")
-            continue
-        
-        try:
-            # 發送 Push Message
-            messaging_api.push_message(
-                PushMessageRequest(
-                    to=member_user_id,
-                    messages=[TextMessage(text=notification_text)]
-                )
-            )
-            success_count += 1
-            print(f"✅ 已通知 {member.get('display_name')}")
-        except Exception as e:
-            print(f"❌ 通知 {member.get('display_name')} 失敗: {e}")
+    if group_info.get("notification_mode") == NOTIFICATION_MODE_DIGEST:
+        # 摘要模式：先暫存，由排程合併發送
+        queue_digest_event(group_id, user_id, display_name, first_event=not group_info.get("digest_pending"))
+        recipients = []
+    else:
+        # 準備通知訊息，一次 multicast 給所有開啟通知的成員
+        notification_text = f"🎉 小組通知\n\n{display_name} 剛剛完成了今日讀經！\n\n一起為他加油鼓勵吧！💪"
+        recipients = get_notification_recipients(members, user_id)
+        if recipients:
+            dispatch_multicast(messaging_api, recipients, notification_text)
     
     # 記錄到小組訊息
     save_group_message(
@@ -72,8 +143,154 @@ def notify_group_members(user_id: str, group_id: str, display_name: str, messagi
         content=f"{display_name} 完成了今日讀經"
     )
     
-    print(f"📊 小組通知統計: 成功 {success_count}/{len(members)-1}")
-    return success_count
+    return len(recipients)
+
+
+def send_group_text_message(user_id: str, group_id: str, display_name: str, text: str,
+                            messaging_api: MessagingApi) -> int:
+    """
+    儲存小組留言並通知其他成員
+    
+    Args:
+        user_id: 留言者 LINE ID
+        group_id: 小組 ID
+        display_name: 留言者顯示名稱
+        text: 留言內容
+        messaging_api: LINE Messaging API 實例
+    
+    Returns:
+        int: 排入發送的通知數量
+    """
+    save_group_message(
+        group_id=group_id,
+        user_id=user_id,
+        display_name=display_name,
+        message_type="text",
+        content=text
+    )
+    
+    recipients = get_notification_recipients(get_group_members(group_id), user_id)
+    if recipients:
+        dispatch_multicast(messaging_api, recipients, f"💬 小組留言\n\n{display_name}：\n{text}")
+    return len(recipients)
+
+
+# === 摘要模式 ===
+
+def set_notification_mode(group_id: str, mode: str) -> bool:
+    """
+    設定小組的通知模式
+
+    Args:
+        group_id: 小組 ID
+        mode: NOTIFICATION_MODE_INSTANT 或 NOTIFICATION_MODE_DIGEST
+
+    Returns:
+        bool: 是否成功設定
+    """
+    group_ref = db.collection("groups").document(group_id)
+    updates = {"notification_mode": mode}
+    if mode == NOTIFICATION_MODE_INSTANT:
+        updates["digest_pending"] = firestore.DELETE_FIELD
+        updates["digest_since"] = firestore.DELETE_FIELD
+    try:
+        group_ref.update(updates)
+    except Exception as e:
+        print(f"❌ 設定小組通知模式失敗 {group_id}: {e}")
+        return False
+    print(f"✅ 小組 {group_id} 通知模式: {mode}")
+    return True
+
+
+def queue_digest_event(group_id: str, user_id: str, display_name: str, first_event: bool = False) -> None:
+    """
+    暫存一筆完成讀經事件（同一成員在時間窗內只記一次）
+
+    Args:
+        group_id: 小組 ID
+        user_id: 完成讀經的使用者 LINE ID
+        display_name: 使用者顯示名稱
+        first_event: 是否為時間窗內的第一筆事件（開始計時）
+    """
+    updates = {f"digest_pending.{user_id}": display_name}
+    if first_event:
+        updates["digest_since"] = datetime.now().isoformat()
+    db.collection("groups").document(group_id).update(updates)
+
+
+@firestore.transactional
+def _take_digest(transaction, group_ref, now: datetime) -> Optional[Dict]:
+    """在交易中取出已到期的暫存事件並清空，避免重複發送"""
+    snapshot = group_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    group = snapshot.to_dict()
+    pending = group.get("digest_pending") or {}
+    since = group.get("digest_since")
+    if not pending:
+        return None
+
+    window = timedelta(minutes=group.get("digest_window_minutes") or DEFAULT_DIGEST_WINDOW_MINUTES)
+    if since and datetime.fromisoformat(since) + window > now:
+        return None
+
+    transaction.update(group_ref, {
+        "digest_pending": firestore.DELETE_FIELD,
+        "digest_since": firestore.DELETE_FIELD,
+    })
+    return {"members": group_members(group), "pending": pending}
+
+
+def format_digest_text(names: List[str]) -> str:
+    """摘要通知文字"""
+    return f"📬 小組動態\n\n{'、'.join(names)} 完成了今日讀經！\n\n一起為他們加油鼓勵吧！💪"
+
+
+def flush_group_digests(messaging_api: MessagingApi, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    發送所有時間窗已結束的小組摘要（由排程定期呼叫）
+
+    Args:
+        messaging_api: LINE Messaging API 實例
+        now: 目前時間
+
+    Returns:
+        Dict[str, int]: {groups, recipients}
+    """
+    now = now or datetime.now()
+    result = {"groups": 0, "recipients": 0}
+
+    query = db.collection("groups").where(
+        filter=firestore.FieldFilter("notification_mode", "==", NOTIFICATION_MODE_DIGEST)
+    )
+    for doc in query.stream():
+        if not (doc.to_dict().get("digest_pending")):
+            continue
+        digest = _take_digest(db.transaction(), doc.reference, now)
+        if not digest:
+            continue
+
+        pending = digest["pending"]
+        recipients = get_notification_recipients(digest["members"], None)
+        # 未完成的成員收到完整名單；完成者的名單不含自己，只有自己時不通知
+        others = [user_id for user_id in recipients if user_id not in pending]
+        if others:
+            result["recipients"] += multicast_text(messaging_api, others, format_digest_text(list(pending.values())))
+        for user_id in recipients:
+            if user_id not in pending:
+                continue
+            names = [name for completer_id, name in pending.items() if completer_id != user_id]
+            if names:
+                result["recipients"] += multicast_text(messaging_api, [user_id], format_digest_text(names))
+        result["groups"] += 1
+
+    print(f"📬 小組摘要: {result['groups']} 個小組，{result['recipients']} 位收件者")
+    return result
+
+
+def group_messages_ref(group_id: str):
+    """小組訊息子集合 groups/{group_id}/messages"""
+    return db.collection("groups").document(group_id).collection(GROUP_MESSAGES_SUBCOLLECTION)
 
 
 def save_group_message(group_id: str, user_id: str, display_name: str, message_type: str, content: str):
@@ -87,50 +304,97 @@ def save_group_message(group_id: str, user_id: str, display_name: str, message_t
         message_type: 訊息類型 (text, reading_completed, prayer_request, encouragement)
         content: 訊息內容
     """
-    from database import db
-    
     message_data = {
         "group_id": group_id,
         "user_id": user_id,
         "display_name": display_name,
         "message_type": message_type,
         "content": content,
-        "created_at": datetime.now().isoformat()
+        "created_at": firestore.SERVER_TIMESTAMP
     }
     
-    # 儲存到 Firestore
-    db.collection("group_messages").add(message_data)
+    # 訊息與後台留言數同一批次寫入
+    batch = db.batch()
+    batch.set(group_messages_ref(group_id).document(), message_data)
+    admin_stats.increment(writer=batch, group_messages=1)
+    batch.commit()
     print(f"💾 已儲存小組訊息: {message_type}")
 
 
-def get_group_messages(group_id: str, limit: int = 20) -> List[Dict]:
+def get_group_messages_page(group_id: str, limit: int = MESSAGE_PAGE_SIZE,
+                            before: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
     """
-    取得小組訊息歷史
+    以游標分頁取得小組訊息（由新到舊翻頁）
     
     Args:
         group_id: 小組 ID
-        limit: 取得訊息數量限制
+        limit: 每頁訊息數量
+        before: 游標（上一頁回傳的 next_cursor，即該頁最舊一則訊息的 ID）
     
     Returns:
-        List[Dict]: 訊息列表
+        Tuple[List[Dict], Optional[str]]: (訊息列表（最舊的在前）, 下一頁游標，沒有更早的訊息時為 None)
     """
-    from database import db
+    messages_ref = group_messages_ref(group_id)
+    # 多取一則，判斷是否還有更早的訊息
+    query = messages_ref.order_by("created_at", direction=firestore.Query.DESCENDING).limit(limit + 1)
+    if before:
+        cursor = messages_ref.document(before).get()
+        if not cursor.exists:
+            return [], None
+        query = query.start_after(cursor)
     
-    # 查詢小組訊息
-    messages_ref = db.collection("group_messages")
-    query = messages_ref.where("group_id", "==", group_id).order_by("created_at", direction="DESCENDING").limit(limit)
+    docs = list(query.stream())
+    next_cursor = docs[limit - 1].id if len(docs) > limit else None
     
     messages = []
-    for doc in query.stream():
+    for doc in docs[:limit]:
         message_data = doc.to_dict()
+        message_data["id"] = doc.id
         messages.append(message_data)
     
     # 反轉順序 (最舊的在前)
     messages.reverse()
     
+    return messages, next_cursor
+
+
+def get_group_messages(group_id: str, limit: int = 20) -> List[Dict]:
+    """
+    取得小組最近的訊息
+    
+    Args:
+        group_id: 小組 ID
+        limit: 取得訊息數量限制
+    
+    Returns:
+        List[Dict]: 訊息列表（最舊的在前）
+    """
+    messages, _ = get_group_messages_page(group_id, limit=limit)
     return messages
 
 
+def message_time(created_at) -> Optional[datetime]:
+    """
+    將訊息的 created_at 轉為伺服器當地時間（伺服器時間戳記或舊資料的 ISO 字串）
+    
+    Args:
+        created_at: Firestore 時間戳記或 ISO 字串
+    
+    Returns:
+        Optional[datetime]: 無法解析時返回 None
+    """
+    if isinstance(created_at, str):
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            return None
+    if not isinstance(created_at, datetime):
+        return None
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone().replace(tzinfo=None)
+    return created_at
+
+
 def format_group_messages(messages: List[Dict]) -> str:
     """
     格式化小組訊息為可讀的文字
@@ -150,14 +414,10 @@ def format_group_messages(messages: List[Dict]) -> str:
         display_name = msg.get("display_name", "未知")
         content = msg.get("content", "")
         message_type = msg.get("message_type", "text")
-        created_at = msg.get("created_at", "")
         
         # 格式化時間
-        try:
-            dt = datetime.fromisoformat(created_at)
-            time_str = dt.strftime("%m/%d %H:%M")
-        except:
-            time_str = ""
+        dt = message_time(msg.get("created_at"))
+        time_str = dt.strftime("%m/%d %H:%M") if dt else ""
         
         # 根據訊息類型選擇圖示
         if message_type == "reading_completed":
@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 from google.cloud import firestore
 from database import db, USERS_COLLECTION
 from scoring import get_star_level
+import reading_history
 
 
 def get_weekly_leaderboard(limit: int = 10) -> List[Dict]:
@@ -323,6 +324,7 @@ def get_user_stats(user) -> Dict:
         'longest_streak': user.longest_streak or 0,
         'total_reading_days': user.total_reading_days or 0,
         'week_reading_days': user.week_reading_days or 0,
+        'month_reading_days': reading_history.days_in_month(user.reading_history),
         'quiz_perfect_count': quiz_perfect,
         'quiz_total_count': quiz_total,
         'quiz_accuracy': accuracy,
@@ -1,9 +1,8 @@
 import os
 import json
-import re
 from datetime import date, datetime, timedelta
 from typing import Annotated
-from urllib.parse import quote
+from urllib.parse import quote, parse_qs
 
 from fastapi import FastAPI, Request, HTTPException, Depends
 from linebot.v3 import WebhookHandler
@@ -14,7 +13,7 @@ from linebot.v3.messaging import (
     ImageMessage,  # 圖片訊息
     # --- (FlexMessage 相關模組) ---
     FlexContainer, FlexBubble, FlexBox, FlexText, FlexButton, URIAction, 
-    FlexSeparator
+    FlexSeparator, PostbackAction
 )
 from linebot.v3.webhooks import MessageEvent, TextMessageContent, FollowEvent, PostbackEvent
 
@@ -23,12 +22,18 @@ from admin_routes import router as admin_router
 from admin_auth import router as admin_auth_router
 from preview_routes import router as preview_router
 
-from database import init_db, User, BiblePlan, BibleText
-from quiz_generator import generate_quiz_for_user, process_quiz_answer, get_daily_reading_text
-from scoring import add_reading_score, format_score_message
+from database import init_db, db, User, BiblePlan, BibleText
+import bible_corpus
+from scripture_ref import BIBLE_BOOK_MAP, parse_references
+from quiz_generator import generate_quiz_for_user, generate_makeup_quiz, process_quiz_answer, get_daily_reading_text, get_quiz, resolve_question, reset_quiz, QUIZ_FIELD, build_question_message, set_quiz_mode, QUIZ_MODE_CHOICE, QUIZ_MODE_FILL
+from scoring import add_reading_score, add_makeup_scores, format_score_message, MAX_MAKEUP_DAYS
+from review_queue import REVIEW_FIELD
+import reading_history
+import quiz_item_stats
+import admin_stats
 from leaderboard import get_weekly_leaderboard, get_streak_leaderboard, get_newcomer_leaderboard, get_total_leaderboard, format_leaderboard_message, get_user_stats
 from group_manager import join_random_group, switch_group, remove_member_from_group, get_group_info, format_group_info_message, toggle_notification
-from group_notification import notify_group_members, save_group_message, get_group_messages, format_group_messages
+from group_notification import notify_group_members, send_group_text_message, save_group_message, get_group_messages_page, format_group_messages, set_notification_mode, flush_group_digests, NOTIFICATION_MODE_DIGEST, NOTIFICATION_MODE_INSTANT, DEFAULT_DIGEST_WINDOW_MINUTES
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
@@ -72,136 +77,76 @@ async def startup_event():
     # 建議先使用 import_data_to_firestore.py 手動匯入資料
     init_db()
 
-# --- 聖經書卷對照表 ---
-BIBLE_BOOK_MAP = {
-    # 舊約 (Old Testament)
-    "創": {"full": "創世記", "code": "GEN", "wd_code": "gen"},
-    "出": {"full": "出埃及記", "code": "EXO", "wd_code": "exo"},
-    "利": {"full": "利未記", "code": "LEV", "wd_code": "lev"},
-    "民": {"full": "民數記", "code": "NUM", "wd_code": "num"},
-    "申": {"full": "申命記", "code": "DEU", "wd_code": "deu"},
-    "書": {"full": "約書亞記", "code": "JOS", "wd_code": "jos"},
-    "士": {"full": "士師記", "code": "JDG", "wd_code": "jdg"},
-    "得": {"full": "路得記", "code": "RUT", "wd_code": "rut"},
-    "撒上": {"full": "撒母耳記上", "code": "1SA", "wd_code": "1sa"},
-    "撒下": {"full": "撒母耳記下", "code": "2SA", "wd_code": "2sa"},
-    "王上": {"full": "列王紀上", "code": "1KI", "wd_code": "1ki"},
-    "王下": {"full": "列王紀下", "code": "2KI", "wd_code": "2ki"},
-    "代上": {"full": "歷代志上", "code": "1CH", "wd_code": "1ch"},
-    "代下": {"full": "歷代志下", "code": "2CH", "wd_code": "2ch"},
-    "拉": {"full": "以斯拉記", "code": "EZR", "wd_code": "ezr"},
-    "尼": {"full": "尼希米記", "code": "NEH", "wd_code": "neh"},
-    "斯": {"full": "以斯帖記", "code": "EST", "wd_code": "est"},
-    "伯": {"full": "約伯記", "code": "JOB", "wd_code": "job"},
-    "詩": {"full": "詩篇", "code": "PSA", "wd_code": "psa"},
-    "箴": {"full": "箴言", "code": "PRO", "wd_code": "pro"},
-    "傳": {"full": "傳道書", "code": "ECC", "wd_code": "ecc"},
-    "歌": {"full": "雅歌", "code": "SNG", "wd_code": "sng"},
-    "賽": {"full": "以賽亞書", "code": "ISA", "wd_code": "isa"},
-    "耶": {"full": "耶利米書", "code": "JER", "wd_code": "jer"},
-    "哀": {"full": "耶利米哀歌", "code": "LAM", "wd_code": "lam"},
-    "結": {"full": "以西結書", "code": "EZK", "wd_code": "ezk"},
-    "但": {"full": "但以理書", "code": "DAN", "wd_code": "dan"},
-    "何": {"full": "何西阿書", "code": "HOS", "wd_code": "hos"},
-    "珥": {"full": "約珥書", "code": "JOL", "wd_code": "jol"},
-    "摩": {"full": "阿摩司書", "code": "AMO", "wd_code": "amo"},
-    "俄": {"full": "俄巴底亞書", "code": "OBA", "wd_code": "oba"},
-    "拿": {"full": "約拿書", "code": "JON", "wd_code": "jon"},
-    "彌": {"full": "彌迦書", "code": "MIC", "wd_code": "mic"},
-    "鴻": {"full": "那鴻書", "code": "NAM", "wd_code": "nam"},
-    "哈": {"full": "哈巴谷書", "code": "HAB", "wd_code": "hab"},
-    "番": {"full": "西番雅書", "code": "ZEP", "wd_code": "zep"},
-    "該": {"full": "哈該書", "code": "HAG", "wd_code": "hag"},
-    "亞": {"full": "撒迦利亞書", "code": "ZEC", "wd_code": "zec"},
-    "瑪": {"full": "瑪拉基書", "code": "MAL", "wd_code": "mal"},
-    # 新約 (New Testament)
-    "太": {"full": "馬太福音", "code": "MAT", "wd_code": "mat"},
-    "可": {"full": "馬可福音", "code": "MRK", "wd_code": "mrk"},
-    "路": {"full": "路加福音", "code": "LUK", "wd_code": "luk"},
-    "約": {"full": "約翰福音", "code": "JHN", "wd_code": "jhn"},
-    "徒": {"full": "使徒行傳", "code": "ACT", "wd_code": "act"},
-    "羅": {"full": "羅馬書", "code": "ROM", "wd_code": "rom"},
-    "林前": {"full": "哥林多前書", "code": "1CO", "wd_code": "1co"},
-    "林後": {"full": "哥林多後書", "code": "2CO", "wd_code": "2co"},
-    "加": {"full": "加拉太書", "code": "GAL", "wd_code": "gal"},
-    "弗": {"full": "以弗所書", "code": "EPH", "wd_code": "eph"},
-    "腓": {"full": "腓立比書", "code": "PHP", "wd_code": "php"},
-    "西": {"full": "歌羅西書", "code": "COL", "wd_code": "col"},
-    "帖前": {"full": "帖撒羅尼迦前書", "code": "1TH", "wd_code": "1th"},
-    "帖後": {"full": "帖撒羅尼迦後書", "code": "2TH", "wd_code": "2th"},
-    "提前": {"full": "提摩太前書", "code": "1TI", "wd_code": "1ti"},
-    "提後": {"full": "提摩太後書", "code": "2TI", "wd_code": "2ti"},
-    "多": {"full": "提多書", "code": "TIT", "wd_code": "tit"},
-    "門": {"full": "腓利門書", "code": "PHM", "wd_code": "phm"},
-    "來": {"full": "希伯來書", "code": "HEB", "wd_code": "heb"},
-    "雅": {"full": "雅各書", "code": "JAS", "wd_code": "jas"},
-    "彼前": {"full": "彼得前書", "code": "1PE", "wd_code": "1pe"},
-    "彼後": {"full": "彼得後書", "code": "2PE", "wd_code": "2pe"},
-    "約一": {"full": "約翰壹書", "code": "1JN", "wd_code": "1jn"},
-    "約二": {"full": "約翰貳書", "code": "2JN", "wd_code": "2jn"},
-    "約三": {"full": "約翰參書", "code": "3JN", "wd_code": "3jn"},
-    "猶": {"full": "猶大書", "code": "JUD", "wd_code": "jud"},
-    "啓": {"full": "啓示錄", "code": "REV", "wd_code": "rev"}
-}
 
 # --- 經文解析器 ---
-sorted_book_abbrevs = sorted(BIBLE_BOOK_MAP.keys(), key=len, reverse=True)
-book_pattern = re.compile(f"({'|'.join(re.escape(abbrev) for abbrev in sorted_book_abbrevs)})")
-
 def parse_readings(readings_str: str) -> list[dict]:
     """
     將 '斯1;斯2;弗1;詩1' 或 '創1-3' 這類的字串，
     解析為包含全名和網址的字典列表。
     """
     parsed_list = []
-    parts = readings_str.split(';') # 用分號拆分
-    
-    current_book_abbrev = None
-    current_book_info = None
-
-    for part in parts:
-        if not part:
-            continue
-            
-        match = book_pattern.match(part)
-        chapter_str = ""
-        
-        if match:
-            current_book_abbrev = match.group(1)
-            current_book_info = BIBLE_BOOK_MAP.get(current_book_abbrev)
-            chapter_str = part[len(current_book_abbrev):].strip()
-        else:
-            chapter_str = part.strip()
 
-        if not current_book_info:
+    for part, ref in parse_references(readings_str):
+        if ref is None:
             parsed_list.append({"full_name": part, "chapter_display": "", "url": None})
             continue
 
-        if not chapter_str:
-            continue
-            
-        chapter_for_url_match = re.match(r"(\d+)", chapter_str)
-        chapter_for_url = "1" 
-        if chapter_for_url_match:
-            chapter_for_url = chapter_for_url_match.group(1)
+        book_info = BIBLE_BOOK_MAP[ref.book_abbr]
             
         # 使用微讀聖經 (wd.bible) 連結
         # 格式：https://wd.bible/tw/bible/{wd_code}.{chapter}.cuvmpt
-        wd_code = current_book_info.get('wd_code', '')
+        wd_code = book_info.get('wd_code', '')
         if wd_code:
-            url = f"https://wd.bible/tw/bible/{wd_code}.{chapter_for_url}.cuvmpt"
+            url = f"https://wd.bible/tw/bible/{wd_code}.{ref.start_chapter}.cuvmpt"
         else:
             # 如果沒有 wd_code，使用 None
             url = None
         
         parsed_list.append({
-            "full_name": current_book_info["full"],
-            "chapter_display": chapter_str, 
+            "full_name": book_info["full"],
+            "chapter_display": ref.chapter_display, 
             "url": url
         })
 
     return parsed_list
 
+def parse_makeup_command(text: str):
+    """
+    解析補讀指令：「補讀」、「補讀3天」、「補讀測驗」、「補讀3天測驗」。
+    返回 (天數或 None, 是否搭配測驗)，不是補讀指令時返回 None。
+    """
+    if not text.startswith("補讀"):
+        return None
+    rest = text[2:].strip()
+    with_quiz = rest.endswith("測驗")
+    if with_quiz:
+        rest = rest[:-2].strip()
+    rest = rest.removesuffix("天").strip()
+    if not rest:
+        return None, with_quiz
+    if not rest.isdigit() or int(rest) <= 0:
+        return None
+    return int(rest), with_quiz
+
+def build_group_messages_reply(group_id: str, before: str = None) -> TextMessage:
+    """
+    小組留言歷史的回覆訊息，還有更早的留言時附上「更早的留言」按鈕（以游標分頁）
+    """
+    messages, next_cursor = get_group_messages_page(group_id, before=before)
+    if before and not messages:
+        return TextMessage(text="💬 沒有更早的留言了")
+    
+    message = TextMessage(text=format_group_messages(messages))
+    if next_cursor:
+        message.quick_reply = QuickReply(items=[
+            QuickReplyItem(action=PostbackAction(
+                label="更早的留言",
+                data=f"action=group_messages&before={next_cursor}",
+                display_text="更早的留言"
+            ))
+        ])
+    return message
+
 # --- 依賴項 ---
 def get_messaging_api():
     with ApiClient(configuration) as api_client:
@@ -240,7 +185,10 @@ def get_all_users_with_plan():
 
 def get_current_reading_plan(user: User) -> str:
     """獲取使用者當天的讀經計畫內容 (原始字串)"""
-    plan = BiblePlan.get_by_day(user.plan_type, user.current_day)
+    if bible_corpus.is_available():
+        plan = bible_corpus.get_plan(user.plan_type, user.current_day)
+    else:
+        plan = BiblePlan.get_by_day(user.plan_type, user.current_day)
     
     if plan:
         # 確保只回傳讀經範圍字串
@@ -405,6 +353,7 @@ def handle_follow(event):
         if not user:
             print(f"[DEBUG] Creating new user: {line_user_id}")
             new_user = User.create(line_user_id=line_user_id, plan_type=None)
+            admin_stats.apply_changes(None, new_user)
             if display_name:
                 new_user.display_name = display_name
                 new_user.save()
@@ -534,6 +483,7 @@ def handle_message(event):
 🏆 最長連續：{stats['longest_streak']} 天
 📚 總讀經天數：{stats['total_reading_days']} 天
 ✅ 本週完成：{stats['week_reading_days']} 天
+📅 本月完成：{stats['month_reading_days']} 天
 
 🎯 測驗正確率：{stats['quiz_accuracy']:.1f}%
 ⭐ 全對次數：{stats['quiz_perfect_count']} / {stats['quiz_total_count']}
@@ -541,6 +491,14 @@ def handle_message(event):
         if stats['badges']:
             message_text += f"\n🏅 已獲得徽章：{''.join(stats['badges'])}"
         
+        try:
+            from score_histogram import describe_rank
+            rank_parts = [part for part in (describe_rank(user, "weekly", "本週"), describe_rank(user, "total", "總榜")) if part]
+            if rank_parts:
+                message_text += f"\n🎯 排名：{' | '.join(rank_parts)}"
+        except Exception as e:
+            print(f"Error getting user rank: {e}")
+        
         messaging_api.reply_message(
             ReplyMessageRequest(
                 reply_token=event.reply_token,
@@ -549,6 +507,97 @@ def handle_message(event):
         )
         return
     
+    # 讀經日曆
+    elif text in ["讀經日曆", "📅 讀經日曆", "日曆"]:
+        from reading_history import format_month_calendar
+        messaging_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=event.reply_token,
+                messages=[TextMessage(text=format_month_calendar(user.reading_history))]
+            )
+        )
+        return
+    
+    # 測驗模式切換（下一次測驗生效）
+    elif text in ["選擇題模式", "🔘 選擇題模式"]:
+        messaging_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=event.reply_token,
+                messages=[TextMessage(text=set_quiz_mode(user, QUIZ_MODE_CHOICE))]
+            )
+        )
+        return
+    
+    elif text in ["填空題模式", "✏️ 填空題模式"]:
+        messaging_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=event.reply_token,
+                messages=[TextMessage(text=set_quiz_mode(user, QUIZ_MODE_FILL))]
+            )
+        )
+        return
+    
+    # 補讀：一次回報最近未讀經的多天（可選擇合併測驗）
+    elif parse_makeup_command(text) is not None:
+        requested_days, with_quiz = parse_makeup_command(text)
+        missed = reading_history.missed_days(
+            user.reading_history, user.joined_date or user.start_date or datetime.now(), limit=MAX_MAKEUP_DAYS,
+            read_through=(user.last_read_date, user.last_streak_date)
+        )
+        reading_dates = [day.isoformat() for day in missed[:requested_days or len(missed)]]
+        
+        if not reading_dates:
+            messages = [TextMessage(text=f"🎉 最近 {MAX_MAKEUP_DAYS} 天都有讀經，沒有需要補讀的日子！")]
+        elif user.quiz_state == "WAITING_ANSWER":
+            messages = [TextMessage(text="📝 您還有未完成的測驗，請先完成測驗再回報補讀。")]
+        elif requested_days is None and not with_quiz:
+            # 只顯示可補讀的日子，讓使用者選擇是否搭配測驗
+            count = len(reading_dates)
+            messages = [TextMessage(
+                text=(
+                    f"📅 最近 {MAX_MAKEUP_DAYS} 天中有 {count} 天尚未讀經：\n"
+                    + "\n".join(f"• {day}" for day in reading_dates)
+                    + f"\n\n讀完後可以一次回報，讀經計畫會前進 {count} 天。\n"
+                    "📝 選擇「補讀測驗」會從每一天各出一題，完成後一併計分。"
+                ),
+                quick_reply=QuickReply(items=[
+                    QuickReplyItem(action=MessageAction(label=f"補讀{count}天", text=f"補讀{count}天")),
+                    QuickReplyItem(action=MessageAction(label=f"補讀{count}天測驗", text=f"補讀{count}天測驗")),
+                ])
+            )]
+        elif with_quiz:
+            try:
+                quiz, first_question_message = generate_makeup_quiz(user, reading_dates)
+                user.update_fields({"quiz_state": "WAITING_ANSWER", QUIZ_FIELD: quiz})
+                messages = [
+                    TextMessage(text=f"📚 補讀 {len(reading_dates)} 天的合併測驗開始！完成後會一次計算所有補讀日的分數。"),
+                    first_question_message
+                ]
+            except ValueError as e:
+                print(f"ValueError generating makeup quiz: {e}")
+                messages = [TextMessage(text=f"抱歉，無法產生補讀測驗，請改用「補讀{len(reading_dates)}天」直接回報。")]
+        else:
+            try:
+                scoring_result = add_makeup_scores(user, reading_dates)
+                print(f"[DEBUG] Makeup scoring result: {scoring_result}")
+                if scoring_result['makeup_days']:
+                    messages = [TextMessage(text=format_score_message(scoring_result, user))]
+                else:
+                    messages = [TextMessage(text="✅ 這些日子都已經回報過了，不需要再補讀。")]
+            except Exception as e:
+                print(f"Error recording makeup reading: {e}")
+                import traceback
+                traceback.print_exc()
+                messages = [TextMessage(text="抱歉，補讀回報時發生錯誤，請稍後再試一次。")]
+        
+        messaging_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=event.reply_token,
+                messages=messages
+            )
+        )
+        return
+    
     # 排行榜 (Leaderboard)
     elif text in ["Leaderboard", "排行榜"]:
         # 發送排行榜網頁連結
@@ -603,6 +652,24 @@ def handle_message(event):
         )
         return
     
+    # 小組功能：小組排行
+    elif text in ["小組排行", "👥 小組排行", "小組排行榜"]:
+        from group_leaderboard import get_group_leaderboard, format_group_leaderboard_message
+        try:
+            leaderboard = get_group_leaderboard(limit=10)
+            message_text = format_group_leaderboard_message(leaderboard, user.group_id)
+        except Exception as e:
+            print(f"[ERROR] Failed to get group leaderboard: {e}")
+            message_text = f"查詢小組排行時發生錯誤：{str(e)}"
+        
+        messaging_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=event.reply_token,
+                messages=[TextMessage(text=message_text)]
+            )
+        )
+        return
+    
     # 小組功能：換組
     elif text in ["換組", "🔄 換組", "隨機換組"]:
         display_name = user.display_name if user and user.display_name else '未知'
@@ -671,6 +738,31 @@ def handle_message(event):
         )
         return
     
+    # 小組通知模式：即時通知或合併摘要（整個小組生效）
+    elif text in ["小組通知摘要", "小組摘要模式", "小組通知即時", "小組即時模式"]:
+        group_id = user.group_id if user else None
+        digest = text in ["小組通知摘要", "小組摘要模式"]
+        
+        if not group_id:
+            message_text = "您目前不在任何小組中"
+        elif not set_notification_mode(group_id, NOTIFICATION_MODE_DIGEST if digest else NOTIFICATION_MODE_INSTANT):
+            message_text = "❌ 設定失敗，請稍後再試"
+        elif digest:
+            message_text = (
+                f"📬 小組已切換為摘要通知\n\n組員完成讀經後，每 {DEFAULT_DIGEST_WINDOW_MINUTES} 分鐘合併成一則通知發送。\n\n"
+                "想改回即時通知，請發送「小組通知即時」"
+            )
+        else:
+            message_text = "🔔 小組已切換為即時通知\n\n組員完成讀經時會立即通知。\n\n想改用摘要通知，請發送「小組通知摘要」"
+        
+        messaging_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=event.reply_token,
+                messages=[TextMessage(text=message_text)]
+            )
+        )
+        return
+    
     # 小組功能：小組留言（查看歷史訊息）
     elif text in ["小組留言", "💬 小組留言", "留言板"]:
         group_id = user.group_id if user else None
@@ -695,15 +787,14 @@ def handle_message(event):
         group_id = user.group_id if user else None
         
         if not group_id:
-            message_text = "您還沒有加入小組！"
+            reply = TextMessage(text="您還沒有加入小組！")
         else:
-            messages = get_group_messages(group_id, limit=10)
-            message_text = format_group_messages(messages)
+            reply = build_group_messages_reply(group_id)
         
         messaging_api.reply_message(
             ReplyMessageRequest(
                 reply_token=event.reply_token,
-                messages=[TextMessage(text=message_text)]
+                messages=[reply]
             )
         )
         return
@@ -721,12 +812,17 @@ def handle_message(event):
             "• 🌅 荒漠甘泉 - 每日靈修分享\n"
             "• ✅ 回報讀經 - 開始讀經測驗\n"
             "• 📊 我的積分 - 查看個人統計\n"
+            "• 📅 讀經日曆 - 查看本月讀經紀錄\n"
+            "• 🔘 選擇題模式 / 填空題模式 - 切換測驗方式\n"
+            "• 📚 補讀 - 一次回報最近漏讀的日子\n"
             "• 🏆 排行榜 - 查看各類排行榜\n\n"
             "👥 小組功能：\n"
             "• 加入小組 - 隨機加入讀經小組\n"
             "• 小組資訊 - 查看小組成員\n"
             "• 小組留言 - 與組員互動\n"
-            "• 換組 - 隨機換到新小組\n\n"
+            "• 小組排行 - 查看本週小組排行\n"
+            "• 換組 - 隨機換到新小組\n"
+            "• 小組通知摘要 / 小組通知即時 - 切換小組通知方式\n\n"
             "⚙️ 其他功能：\n"
             "• 📖 荒漠甘泉圖片 - 生成靈修分享圖\n"
             "• 🔒 隱私設定 - 設定排行榜顯示\n"
@@ -772,36 +868,8 @@ def handle_message(event):
         
         display_name = user.get('display_name', '未知')
         
-        # 儲存留言
-        save_group_message(
-            group_id=group_id,
-            user_id=line_user_id,
-            display_name=display_name,
-            message_type="text",
-            content=text
-        )
-        
-        # 通知其他小組成員
-        from group_manager import get_group_members
-        members = get_group_members(group_id)
-        notification_text = f"💬 小組留言\n\n{display_name}：\n{text}"
-        
-        sent_count = 0
-        for member in members:
-            member_user_id = member.get("user_id")
-            if member_user_id == line_user_id:
-                continue
-            
-            try:
-                messaging_api.push_message(
-                    PushMessageRequest(
-                        to=member_user_id,
-                        messages=[TextMessage(text=notification_text)]
-                    )
-                )
-                sent_count += 1
-            except Exception as e:
-                print(f"❗ 發送留言通知失敗: {e}")
+        # 儲存留言並以 multicast 在背景通知其他小組成員
+        sent_count = send_group_text_message(line_user_id, group_id, display_name, text, messaging_api)
         
         # 清除狀態
         User.update(line_user_id, group_message_state='IDLE')
@@ -888,10 +956,14 @@ def handle_message(event):
             plan_name = "平衡讀經計畫"
         
         if selected_plan:
+            stats_before = admin_stats.snapshot(user)
             user.plan_type = selected_plan
             user.start_date = datetime.now()
             user.current_day = 1
-            user.save()
+            batch = db.batch()
+            user.save(writer=batch)
+            admin_stats.apply_changes(stats_before, user, writer=batch)
+            batch.commit()
             
             reply_text = f"太棒了！您已選擇「{plan_name}」。\n\n我們將從今天 (第 1 天) 開始！"
             
@@ -1004,6 +1076,7 @@ def handle_message(event):
 🏆 最長連續：{stats['longest_streak']} 天
 📚 總讀經天數：{stats['total_reading_days']} 天
 ✅ 本週完成：{stats['week_reading_days']} 天
+📅 本月完成：{stats['month_reading_days']} 天
 
 🎯 測驗正確率：{stats['quiz_accuracy']:.1f}%
 ⭐ 全對次數：{stats['quiz_perfect_count']} / {stats['quiz_total_count']}
@@ -1140,25 +1213,25 @@ def handle_message(event):
             
         # 檢查是否有未完成的測驗
         if user.quiz_state == "WAITING_ANSWER":
-            quiz_data = json.loads(user.quiz_data)
-            current_question_index = quiz_data.get("current_question_index", 0)
-            current_question = quiz_data["questions"][current_question_index]
+            quiz = get_quiz(user)
+            ids = quiz.get("ids") or []
+            current_question = resolve_question(ids[quiz.get("i", 0)]) if quiz.get("i", 0) < len(ids) else None
             
-            messaging_api.reply_message(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text=f"📝 您還有未完成的測驗！\n\n{current_question['quiz_text']}\n\n💡 請輸入您的答案，繼續加油！")]
+            # 測驗狀態無法還原時直接重新出題
+            if current_question:
+                messaging_api.reply_message(
+                    ReplyMessageRequest(
+                        reply_token=event.reply_token,
+                        messages=[build_question_message(quiz, current_question, prefix="📝 您還有未完成的測驗！繼續加油！\n\n")]
+                    )
                 )
-            )
-            return
+                return
             
         # 開始生成測驗
         try:
-            quiz_data, first_question_message = generate_quiz_for_user(user)
+            quiz, first_question_message = generate_quiz_for_user(user)
             
-            user.quiz_state = "WAITING_ANSWER"
-            user.quiz_data = json.dumps(quiz_data)
-            user.save()
+            user.update_fields({"quiz_state": "WAITING_ANSWER", QUIZ_FIELD: quiz})
             
             messaging_api.reply_message(
                 ReplyMessageRequest(
@@ -1192,46 +1265,74 @@ def handle_message(event):
     # --- 處理測驗答案 ---
     if user.quiz_state == "WAITING_ANSWER":
         reply_messages, user, quiz_result = process_quiz_answer(user, text)
+        if quiz_result == "error":
+            reset_quiz(user)
         
         # 檢查是否完成測驗
         if user.quiz_state == "QUIZ_COMPLETED":
             print(f"[DEBUG] Quiz completed for user {line_user_id}")
             
-            # 計分系統：添加讀經分數
-            today_str = datetime.now().date().isoformat()
-            scoring_result = add_reading_score(
-                user=user,
-                reading_date=today_str,
-                is_makeup=False,
-                days_ago=0,
-                quiz_result=quiz_result  # "perfect" 或 "partial"
-            )
-            print(f"[DEBUG] Scoring result: {scoring_result}")
-            
-            # 更新讀經狀態
-            user.last_read_date = today_str
-            user.current_day += 1 
-            print(f"[DEBUG] Updated current_day to {user.current_day}")
-            user.quiz_state = "IDLE"
-            user.quiz_data = "{}"
-            user.save()
-            print(f"[DEBUG] User data saved")
+            completed_quiz = user.get(QUIZ_FIELD) or {}
             
-            # 將計分結果加入回覆訊息（包含總積分和排名）
-            score_message = format_score_message(scoring_result, user)
-            reply_messages.append(TextMessage(text=score_message))
-            
-            # 小組通知：如果使用者在小組中，通知其他成員
-            group_id = user.get('group_id')
-            if group_id:
-                display_name = user.get('display_name', '未知')
+            if completed_quiz.get("mk"):
+                # 補讀合併測驗：所有補讀日的計分、計畫進度與測驗狀態在同一個交易寫入
                 try:
-                    notify_count = notify_group_members(line_user_id, group_id, display_name, messaging_api)
-                    print(f"[DEBUG] 已通知 {notify_count} 位小組成員")
+                    scoring_result = add_makeup_scores(
+                        user, completed_quiz["mk"], quiz_result,
+                        extra_fields={
+                            "quiz_state": "IDLE",
+                            QUIZ_FIELD: {},
+                            REVIEW_FIELD: user.get(REVIEW_FIELD) or [],
+                        }
+                    )
+                    quiz_item_stats.record_quiz(completed_quiz)
+                    print(f"[DEBUG] Makeup scoring result: {scoring_result}")
+                    reply_messages.append(TextMessage(text=format_score_message(scoring_result, user)))
                 except Exception as e:
-                    print(f"[ERROR] 小組通知失敗: {e}")
-        else:
-            user.save() 
+                    print(f"Error recording makeup quiz: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    reply_messages.append(TextMessage(text="抱歉，補讀計分時發生錯誤，請再回答最後一題一次。"))
+            else:
+                # 計分系統：添加讀經分數
+                today_str = datetime.now().date().isoformat()
+                stats_before = admin_stats.snapshot(user)
+                scoring_result = add_reading_score(
+                    user=user,
+                    reading_date=today_str,
+                    is_makeup=False,
+                    days_ago=0,
+                    quiz_result=quiz_result  # "perfect" 或 "partial"
+                )
+                print(f"[DEBUG] Scoring result: {scoring_result}")
+            
+                # 更新讀經狀態
+                user.last_read_date = today_str
+                user.current_day += 1 
+                print(f"[DEBUG] Updated current_day to {user.current_day}")
+                user.quiz_state = "IDLE"
+                user[QUIZ_FIELD] = {}
+                # 使用者資料、題庫題目作答統計與後台統計同一批次寫入
+                batch = db.batch()
+                user.save(writer=batch)
+                quiz_item_stats.record_quiz(completed_quiz, writer=batch)
+                admin_stats.apply_changes(stats_before, user, writer=batch)
+                batch.commit()
+                print(f"[DEBUG] User data saved")
+            
+                # 將計分結果加入回覆訊息（包含總積分和排名）
+                score_message = format_score_message(scoring_result, user)
+                reply_messages.append(TextMessage(text=score_message))
+            
+                # 小組通知：如果使用者在小組中，通知其他成員
+                group_id = user.get('group_id')
+                if group_id:
+                    display_name = user.get('display_name', '未知')
+                    try:
+                        notify_count = notify_group_members(line_user_id, group_id, display_name, messaging_api)
+                        print(f"[DEBUG] 已通知 {notify_count} 位小組成員")
+                    except Exception as e:
+                        print(f"[ERROR] 小組通知失敗: {e}")
             
         # 先發送 reply_message（確保使用者收到測驗結果）
         messaging_api.reply_message(
@@ -1308,12 +1409,17 @@ def handle_message(event):
             "• 🌅 荒漠甘泉 - 每日靈修分享\n"
             "• ✅ 回報讀經 - 開始讀經測驗\n"
             "• 📊 我的積分 - 查看個人統計\n"
+            "• 📅 讀經日曆 - 查看本月讀經紀錄\n"
+            "• 🔘 選擇題模式 / 填空題模式 - 切換測驗方式\n"
+            "• 📚 補讀 - 一次回報最近漏讀的日子\n"
             "• 🏆 排行榜 - 查看各類排行榜\n\n"
             "👥 小組功能：\n"
             "• 加入小組 - 隨機加入讀經小組\n"
             "• 小組資訊 - 查看小組成員\n"
             "• 小組留言 - 與組員互動\n"
-            "• 換組 - 隨機換到新小組\n\n"
+            "• 小組排行 - 查看本週小組排行\n"
+            "• 換組 - 隨機換到新小組\n"
+            "• 小組通知摘要 / 小組通知即時 - 切換小組通知方式\n\n"
             "⚙️ 其他功能：\n"
             "• 📖 荒漠甘泉圖片 - 生成靈修分享圖\n"
             "• 🔒 隱私設定 - 設定排行榜顯示\n"
@@ -1646,6 +1752,22 @@ def handle_postback(event):
         )
         return
     
+    # 小組留言歷史：載入更早的留言
+    if action == "group_messages":
+        before = parse_qs(data).get("before", [None])[0]
+        if not user.group_id:
+            reply = TextMessage(text="您還沒有加入小組！")
+        else:
+            reply = build_group_messages_reply(user.group_id, before=before)
+        
+        messaging_api.reply_message(
+            ReplyMessageRequest(
+                reply_token=event.reply_token,
+                messages=[reply]
+            )
+        )
+        return
+    
     # 預設回覆
     messaging_api.reply_message(
         ReplyMessageRequest(
@@ -1655,6 +1777,47 @@ def handle_postback(event):
     )
 
 
+# ============================================================
+# 小組摘要通知觸發端點
+# ============================================================
+
+@app.post("/trigger/flush-group-digests")
+async def trigger_flush_group_digests():
+    """
+    發送時間窗已結束的小組摘要通知
+    由 Cloud Scheduler 定期調用（例如每 15 分鐘）
+    """
+    try:
+        messaging_api: MessagingApi = next(get_messaging_api())
+        result = flush_group_digests(messaging_api)
+        return {"status": "completed", **result}
+    except Exception as e:
+        print(f"❌ 小組摘要發送失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ============================================================
+# 管理後台統計校正觸發端點
+# ============================================================
+
+@app.post("/trigger/reconcile-admin-stats")
+async def trigger_reconcile_admin_stats():
+    """
+    以全表掃描校正管理後台的增量統計計數器與小組彙總
+    由 Cloud Scheduler 每晚調用
+    """
+    try:
+        totals = admin_stats.reconcile()
+        print(f"✅ 後台統計校正完成: {totals['users']} 位使用者、{totals['groups']} 個小組")
+        # 小組彙總（本週總分、今日進度、連續天數）不與使用者資料同批寫入，一併校正
+        from group_leaderboard import reconcile_group_aggregates
+        reconciled_groups = reconcile_group_aggregates()
+        print(f"✅ 小組彙總校正完成: {reconciled_groups} 個小組")
+        return {"status": "completed", "users": totals["users"], "groups": totals["groups"],
+                "group_messages": totals["group_messages"], "reconciled_groups": reconciled_groups}
+    except Exception as e:
+        print(f"❌ 後台統計校正失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ============================================================
 # 每日自動發送荒漠甘泉圖片觸發端點
 # ============================================================
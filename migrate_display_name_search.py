@@ -0,0 +1,44 @@
+"""
+資料遷移腳本：為現有使用者補上搜尋用的 display_name_lower 欄位
+
+管理後台的使用者搜尋以正規化顯示名稱做前綴範圍查詢，缺少此欄位的使用者搜尋不到；
+之後 UserObject.save() 會隨顯示名稱一併更新。可重複執行（只寫入不一致的文件）。
+
+執行方式：python3.11 migrate_display_name_search.py
+"""
+from database import db, USERS_COLLECTION, DISPLAY_NAME_SEARCH_FIELD, normalize_display_name
+
+
+def backfill_display_name_search() -> int:
+    """補上或修正 display_name_lower，返回更新的使用者數"""
+    batch = db.batch()
+    batch_count = 0
+    updated = 0
+
+    for doc in db.collection(USERS_COLLECTION).select(['display_name', DISPLAY_NAME_SEARCH_FIELD]).stream():
+        data = doc.to_dict()
+        expected = normalize_display_name(data.get('display_name'))
+        if DISPLAY_NAME_SEARCH_FIELD in data and data[DISPLAY_NAME_SEARCH_FIELD] == expected:
+            continue
+
+        batch.update(doc.reference, {DISPLAY_NAME_SEARCH_FIELD: expected})
+        batch_count += 1
+        updated += 1
+        if batch_count >= 500:
+            batch.commit()
+            print(f"Committed {batch_count} users to Firestore.")
+            batch = db.batch()
+            batch_count = 0
+
+    if batch_count > 0:
+        batch.commit()
+        print(f"Committed final {batch_count} users to Firestore.")
+
+    return updated
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("補上使用者搜尋欄位...")
+    print(f"✓ 更新 {backfill_display_name_search()} 位使用者")
+    print("=" * 50)
@@ -0,0 +1,74 @@
+"""
+資料遷移腳本：為小組成員補上使用者文件 ID（user_doc_id）
+
+使用者文件 ID 為自動產生，無法由 LINE ID 直接得到；記錄在成員資料後，
+管理後台可以用一次 get_all 批次讀取所有成員，不必以 LINE ID 分批查詢。
+之後加入的成員會在加入時記錄。可重複執行（只更新缺少或不一致的成員）。
+
+執行方式：
+    python3.11 migrate_group_member_doc_ids.py              # 補上 user_doc_id
+    python3.11 migrate_group_member_doc_ids.py --dry-run    # 只統計，不寫入
+"""
+import sys
+from typing import Dict
+
+from google.cloud import firestore
+from database import db, USERS_COLLECTION
+
+
+@firestore.transactional
+def _fill_member_doc_ids(transaction, group_ref, doc_ids: Dict[str, str]) -> int:
+    """在交易中重新讀取成員並補上文件 ID（與同時加入、離開的請求互斥）"""
+    snapshot = group_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return 0
+    members = snapshot.to_dict().get("members") or []
+    filled = 0
+    for member in members:
+        doc_id = doc_ids.get(member.get("user_id"))
+        if doc_id and member.get("user_doc_id") != doc_id:
+            member["user_doc_id"] = doc_id
+            filled += 1
+    if filled:
+        transaction.update(group_ref, {"members": members})
+    return filled
+
+
+def migrate_group_member_doc_ids(dry_run: bool = False) -> Dict[str, int]:
+    """
+    為所有小組成員補上 user_doc_id
+
+    Returns:
+        Dict[str, int]: {groups, members, missing}（missing 為找不到使用者文件的成員）
+    """
+    doc_ids = {}
+    for doc in db.collection(USERS_COLLECTION).select(["line_user_id"]).stream():
+        line_user_id = doc.to_dict().get("line_user_id")
+        if line_user_id:
+            doc_ids[line_user_id] = doc.id
+
+    result = {"groups": 0, "members": 0, "missing": 0}
+    for doc in db.collection("groups").select(["members"]).stream():
+        members = doc.to_dict().get("members") or []
+        result["missing"] += sum(1 for member in members if member.get("user_id") not in doc_ids)
+        stale = sum(1 for member in members
+                    if member.get("user_id") in doc_ids and member.get("user_doc_id") != doc_ids[member["user_id"]])
+        if not stale:
+            continue
+        result["groups"] += 1
+        result["members"] += stale if dry_run else _fill_member_doc_ids(db.transaction(), doc.reference, doc_ids)
+
+    return result
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("為小組成員補上使用者文件 ID...")
+    dry_run = '--dry-run' in sys.argv
+    result = migrate_group_member_doc_ids(dry_run=dry_run)
+    print(f"✓ {result['groups']} 個小組、{result['members']} 位成員已補上 user_doc_id")
+    if result['missing']:
+        print(f"⚠️ {result['missing']} 位成員找不到使用者資料")
+    if dry_run:
+        print("⚠️ --dry-run：未寫入 Firestore")
+    print("=" * 50)
@@ -0,0 +1,88 @@
+"""
+資料遷移腳本：將全域 group_messages 集合的留言搬到 groups/{group_id}/messages 子集合
+
+- 保留原本的文件 ID，重複執行不會產生重複留言
+- 舊資料的 created_at 是伺服器以 datetime.now() 寫入的 ISO 字串（Cloud Run 為 UTC），
+  遷移時轉為 UTC 時間戳記，與新留言的伺服器時間戳記可一起排序
+
+執行方式：
+    python3.11 migrate_group_messages.py              # 複製到子集合
+    python3.11 migrate_group_messages.py --dry-run    # 只統計，不寫入
+    python3.11 migrate_group_messages.py --delete     # 複製後刪除舊集合的文件
+"""
+import sys
+from datetime import datetime, timezone
+
+from database import db
+from group_notification import group_messages_ref
+
+LEGACY_COLLECTION = "group_messages"
+
+
+def legacy_timestamp(created_at):
+    """舊資料的 created_at 轉為 UTC 時間戳記，無法解析時原樣返回"""
+    if isinstance(created_at, str):
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            return created_at
+    if isinstance(created_at, datetime) and created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at
+
+
+def migrate_group_messages(dry_run: bool = False, delete: bool = False) -> dict:
+    """
+    複製舊留言到各小組的子集合
+
+    Args:
+        dry_run: 只統計，不寫入
+        delete: 複製後刪除舊文件（與複製在同一批次）
+
+    Returns:
+        dict: {migrated, skipped}
+    """
+    result = {"migrated": 0, "skipped": 0}
+    batch = db.batch()
+    batch_count = 0
+
+    for doc in db.collection(LEGACY_COLLECTION).stream():
+        message_data = doc.to_dict()
+        group_id = message_data.get("group_id")
+        if not group_id:
+            result["skipped"] += 1
+            continue
+
+        message_data["created_at"] = legacy_timestamp(message_data.get("created_at"))
+        result["migrated"] += 1
+        if dry_run:
+            continue
+
+        batch.set(group_messages_ref(group_id).document(doc.id), message_data)
+        batch_count += 1
+        if delete:
+            batch.delete(doc.reference)
+            batch_count += 1
+
+        if batch_count >= 498:
+            batch.commit()
+            print(f"Committed {batch_count} writes to Firestore.")
+            batch = db.batch()
+            batch_count = 0
+
+    if batch_count > 0:
+        batch.commit()
+        print(f"Committed final {batch_count} writes to Firestore.")
+
+    return result
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print(f"遷移 {LEGACY_COLLECTION} → groups/{{group_id}}/messages ...")
+    dry_run = '--dry-run' in sys.argv
+    result = migrate_group_messages(dry_run=dry_run, delete='--delete' in sys.argv)
+    print(f"✓ 遷移 {result['migrated']} 則留言，略過 {result['skipped']} 則（缺少 group_id）")
+    if dry_run:
+        print("⚠️ --dry-run：未寫入 Firestore")
+    print("=" * 50)
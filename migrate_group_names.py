@@ -0,0 +1,82 @@
+"""
+資料遷移腳本：讓既有小組名稱納入名稱分配器
+
+舊版以隨機方式產生名稱，可能重複。此腳本：
+1. 將既有小組使用中的名稱序號寫入 _metadata/group_allocator.names_reserved 位元圖，
+   之後依序發出名稱時會略過這些名稱
+2. 重複的名稱只保留最早建立的小組，其餘小組改用新發出的名稱
+
+可重複執行。執行方式：
+    python3.11 migrate_group_names.py              # 保留舊名稱並修正重複
+    python3.11 migrate_group_names.py --dry-run    # 只統計，不寫入
+"""
+import sys
+from typing import Dict
+
+from google.cloud import firestore
+from database import db
+from group_manager import GROUP_ALLOCATOR_DOC, generate_group_name, group_name_seq
+
+
+@firestore.transactional
+def _reserve_names(transaction, allocator_ref, reserved: int) -> None:
+    """在交易中合併保留位元圖（與同時發出名稱的請求互斥）"""
+    allocator = allocator_ref.get(transaction=transaction).to_dict() or {}
+    reserved |= int.from_bytes(bytes(allocator.get("names_reserved") or b""), 'little')
+    transaction.set(allocator_ref, {
+        "names_reserved": reserved.to_bytes((reserved.bit_length() + 7) // 8, 'little'),
+    }, merge=True)
+
+
+def migrate_group_names(dry_run: bool = False) -> Dict[str, int]:
+    """
+    保留既有名稱並修正重複名稱
+
+    Returns:
+        Dict[str, int]: {groups, reserved, renamed}
+    """
+    groups = [doc for doc in db.collection("groups").stream()]
+    groups.sort(key=lambda doc: str(doc.to_dict().get("created_at") or ""))
+
+    seen = set()
+    duplicates = []
+    reserved = 0
+    for doc in groups:
+        name = doc.to_dict().get("group_name")
+        if not name:
+            continue
+        if name in seen:
+            duplicates.append(doc)
+            continue
+        seen.add(name)
+        seq = group_name_seq(name)
+        if seq is not None:
+            reserved |= 1 << seq
+
+    result = {"groups": len(groups), "reserved": bin(reserved).count("1"), "renamed": len(duplicates)}
+    if dry_run:
+        for doc in duplicates:
+            print(f"  重複名稱：{doc.to_dict()['group_name']} ({doc.id})")
+        return result
+
+    allocator_ref = db.collection("_metadata").document(GROUP_ALLOCATOR_DOC)
+    _reserve_names(db.transaction(), allocator_ref, reserved)
+
+    for doc in duplicates:
+        old_name = doc.to_dict()["group_name"]
+        new_name = generate_group_name()
+        doc.reference.update({"group_name": new_name})
+        print(f"  {old_name} → {new_name} ({doc.id})")
+
+    return result
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("將既有小組名稱納入名稱分配器...")
+    dry_run = '--dry-run' in sys.argv
+    result = migrate_group_names(dry_run=dry_run)
+    print(f"✓ {result['groups']} 個小組：保留 {result['reserved']} 個名稱，重新命名 {result['renamed']} 個重複的小組")
+    if dry_run:
+        print("⚠️ --dry-run：未寫入 Firestore")
+    print("=" * 50)
@@ -0,0 +1,239 @@
+"""
+測驗題庫模組 (Quiz Bank)
+
+同一個讀經計畫、同一天的所有使用者共用相同的經文，因此離線預先為每個
+(plan_type, day_number) 產生一批已驗證的填充題，存放於 quiz_bank/{plan_type}_{day_number}。
+開始測驗時只需讀取一份題庫文件並抽樣，不必讀取任何經文。
+題目的作答統計與停用／權重調整見 quiz_item_stats.py；重新上傳題庫後題目位置會改變，需清除統計。
+
+執行方式：
+    python3.11 quiz_bank.py              # 產生並上傳全部題庫
+    python3.11 quiz_bank.py --dry-run    # 只產生並顯示統計
+"""
+import random
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from google.cloud import firestore
+from database import db
+import bible_corpus
+from distractor_index import get_distractors
+
+QUIZ_BANK_COLLECTION = "quiz_bank"
+QUIZ_BANK_VERSION = 2
+
+POOL_SIZE = 20          # 每天預先產生的題目數
+MIN_ANSWER_LENGTH = 2   # 答案長度限制（字）
+MAX_ANSWER_LENGTH = 12
+
+# 題庫文件快取（每個實例最多保留的天數）。題庫產生、題目停用或權重調整時只有寫入的實例
+# 會呼叫 clear_cache()，因此設有效期限讓其他實例定期重新讀取
+BANK_CACHE_SIZE = 64
+BANK_CACHE_TTL = 300  # 秒
+_bank_cache: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+
+
+def bank_key(plan_type: str, day_number: int) -> str:
+    """題庫文件 ID"""
+    return f"{plan_type}_{day_number}"
+
+
+# === 查詢 ===
+
+def get_bank(plan_type: str, day_number: int) -> Optional[Dict]:
+    """
+    取得某天的題庫（含實例內 LRU 快取，BANK_CACHE_TTL 秒後重新讀取）
+
+    不存在的題庫不快取，產生後即可使用
+
+    Args:
+        plan_type: 讀經計畫類型
+        day_number: 第幾天
+
+    Returns:
+        Optional[Dict]: 題庫資料，不存在時返回 None
+    """
+    key = bank_key(plan_type, day_number)
+    now = time.time()
+    cached = _bank_cache.get(key)
+    if cached and now - cached[1] < BANK_CACHE_TTL:
+        _bank_cache.move_to_end(key)
+        return cached[0]
+
+    doc = db.collection(QUIZ_BANK_COLLECTION).document(key).get()
+    bank = doc.to_dict() if doc.exists else None
+    # 舊版題庫仍可使用（缺少的 choices 會在出題時即時產生），只略過較新格式
+    if bank is not None and bank.get('version', 0) > QUIZ_BANK_VERSION:
+        bank = None
+
+    if bank is None:
+        _bank_cache.pop(key, None)
+        return None
+
+    _bank_cache[key] = (bank, now)
+    _bank_cache.move_to_end(key)
+    if len(_bank_cache) > BANK_CACHE_SIZE:
+        _bank_cache.popitem(last=False)
+    return bank
+
+
+def sample_indices(bank: Dict, count: int = 3) -> List[int]:
+    """
+    從題庫中隨機抽出不重複的題目
+
+    略過已停用 (retired) 的題目，並依 weight 加權抽樣（見 quiz_item_stats.py）
+
+    Args:
+        bank: 題庫資料
+        count: 題數
+
+    Returns:
+        List[int]: 題目在 items 中的位置（可能少於 count）
+    """
+    # 加權不重複抽樣：每題取 u^(1/weight)，保留最大的 count 題
+    keyed = sorted(
+        ((random.random() ** (1 / item.get('weight', 1)), index)
+         for index, item in enumerate(bank.get('items') or []) if not item.get('retired')),
+        reverse=True
+    )
+    return [index for _, index in keyed[:count]]
+
+
+def clear_cache() -> None:
+    """清除實例內的題庫快取（題庫更新後呼叫）"""
+    _bank_cache.clear()
+
+
+def item_id(plan_type: str, day_number: int, index: int) -> str:
+    """題目 ID，例如 "Canonical_12#3" """
+    return f"{bank_key(plan_type, day_number)}#{index}"
+
+
+def get_item(qid: str) -> Optional[Dict]:
+    """
+    以題目 ID 取得題庫項目
+
+    Args:
+        qid: item_id() 產生的 ID
+
+    Returns:
+        Optional[Dict]: {ref, text, answer, pos, choices}，找不到時返回 None
+    """
+    key, _, index = qid.rpartition('#')
+    plan_type, _, day_number = key.rpartition('_')
+    if not plan_type or not day_number.isdigit() or not index.isdigit():
+        return None
+    bank = get_bank(plan_type, int(day_number))
+    items = (bank or {}).get('items') or []
+    return items[int(index)] if int(index) < len(items) else None
+
+
+# === 離線建置 ===
+
+def build_items(verses: List[Dict], rng: random.Random, pool_size: int = POOL_SIZE) -> List[Dict]:
+    """
+    為一天的經文產生已驗證的題目
+
+    Args:
+        verses: 經文列表
+        rng: 亂數產生器（固定種子，讓題庫可重現）
+        pool_size: 題目數上限
+
+    Returns:
+        List[Dict]: 題庫項目 {ref, text, answer, pos, choices}
+    """
+    from quiz_generator import create_fill_in_the_blank_quiz
+
+    candidates = list(verses)
+    rng.shuffle(candidates)
+
+    items = []
+    state = random.getstate()
+    random.seed(rng.random())
+    try:
+        for verse in candidates:
+            if len(items) >= pool_size:
+                break
+            quiz_text, answer = create_fill_in_the_blank_quiz(verse)
+            if answer == "無答案" or not MIN_ANSWER_LENGTH <= len(answer) <= MAX_ANSWER_LENGTH:
+                continue
+            pos = verse['text'].find(answer)
+            if pos < 0 or quiz_text == verse['text']:
+                continue
+            items.append({
+                'ref': f"{verse['book_abbr']}{verse['chapter']}:{verse['verse']}",
+                'text': verse['text'],
+                'answer': answer,
+                'pos': pos,
+                'choices': get_distractors(verse['book_abbr'], answer, verse['text'], rng=rng),
+            })
+    finally:
+        random.setstate(state)
+
+    return items
+
+
+def build_all_banks() -> List[Dict]:
+    """為所有讀經計畫的每一天產生題庫"""
+    plans, errors = bible_corpus.compile_plans()
+    for error in errors:
+        print(f"⚠️ 讀經計畫錯誤：{error}")
+
+    banks = []
+    for (plan_type, day_number), plan in plans.items():
+        key = bank_key(plan_type, day_number)
+        verses = bible_corpus.get_verses(plan['spans'])
+        items = build_items(verses, random.Random(key))
+        banks.append({
+            'plan_type': plan_type,
+            'day_number': day_number,
+            'readings': plan['readings'],
+            'verse_count': len(verses),
+            'items': items,
+            'version': QUIZ_BANK_VERSION,
+        })
+    return banks
+
+
+def upload_banks(banks: List[Dict]) -> int:
+    """批次上傳題庫到 Firestore"""
+    bank_ref = db.collection(QUIZ_BANK_COLLECTION)
+    batch = db.batch()
+    batch_count = 0
+
+    for bank in banks:
+        data = dict(bank)
+        data['built_at'] = firestore.SERVER_TIMESTAMP
+        batch.set(bank_ref.document(bank_key(bank['plan_type'], bank['day_number'])), data)
+        batch_count += 1
+        if batch_count >= 500:
+            batch.commit()
+            print(f"Committed {batch_count} quiz banks to Firestore.")
+            batch = db.batch()
+            batch_count = 0
+
+    if batch_count > 0:
+        batch.commit()
+        print(f"Committed final {batch_count} quiz banks to Firestore.")
+
+    clear_cache()
+    return len(banks)
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("產生測驗題庫...")
+    banks = build_all_banks()
+
+    empty = [bank_key(b['plan_type'], b['day_number']) for b in banks if not b['items']]
+    total_items = sum(len(b['items']) for b in banks)
+    print(f"✓ 產生 {len(banks)} 天題庫，共 {total_items} 題")
+    if empty:
+        print(f"⚠️ {len(empty)} 天沒有題目：{', '.join(empty[:20])}")
+
+    if '--dry-run' not in sys.argv:
+        upload_banks(banks)
+        print("✓ 已上傳至 Firestore")
+    print("=" * 50)
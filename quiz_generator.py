@@ -1,10 +1,30 @@
 import re
 import random
 import json
-from typing import Tuple, List, Dict, Any
-from linebot.v3.messaging import TextMessage
+from typing import Tuple, List, Dict, Any, Optional
+from google.cloud import firestore
+from linebot.v3.messaging import TextMessage, QuickReply, QuickReplyItem, MessageAction
 
 from database import User, BiblePlan, BibleText
+import bible_corpus
+from scripture_ref import parse_reference, parse_references
+from quiz_bank import get_bank, get_item, item_id, sample_indices, bank_key
+from distractor_index import get_distractors
+from segmenter import key_terms
+from answer_normalizer import match_answer, MATCH_CLOSE
+import review_queue
+
+# 使用者文件中的測驗狀態欄位：
+# {ids: [題目 ID], i: 目前題號, att: [各題作答次數], mode: 選擇題時為 "choice", rv: 排在最後的複習題數,
+#  mk: 補讀合併測驗所涵蓋的日期}
+QUIZ_FIELD = 'quiz'
+
+# 測驗模式（使用者欄位 quiz_mode）
+QUIZ_MODE_FILL = 'fill'
+QUIZ_MODE_CHOICE = 'choice'
+
+# 補讀合併測驗最多的題數
+MAKEUP_QUIZ_QUESTIONS = 5
 
 # 鼓勵用的聖經金句範圍 (詩篇、箴言、新約書信等)
 ENCOURAGING_REFERENCES = [
@@ -49,40 +69,22 @@ def get_verses_for_reading(reading_ref: str) -> List[Dict[str, Any]]:
     根據經文範圍字串 (例如: '創1:1-3:24;太1:1-2:23') 獲取所有經文。
     返回一個包含 {book_abbr, chapter, verse, text} 的列表。
     """
+    # 優先使用記憶體內的經文語料（切片，不需查詢 Firestore）
+    if bible_corpus.is_available():
+        return bible_corpus.get_verses_for_readings(reading_ref)
+
     all_verses = []
     
     print(f"[DEBUG] get_verses_for_reading called with: {reading_ref}")
     
-    # 處理多個閱讀範圍
-    refs = reading_ref.split(';')
-    print(f"[DEBUG] Split refs: {refs}")
-    
-    for ref in refs:
-        ref = ref.strip()
-        if not ref:
-            continue
-        
-        print(f"[DEBUG] Processing ref: {ref}")
-            
-        # 匹配書卷縮寫和章節範圍 (例如: 創1-3, 太1:1-2:23)
-        match = re.match(r'([^\d]+)(\d+)(?::(\d+))?(?:-(\d+)(?::(\d+))?)?', ref)
-        print(f"[DEBUG] Match result: {match.groups() if match else None}")
+    # 處理多個閱讀範圍 (例如: 創1-3, 太1:1-2:23)
+    for ref, parsed in parse_references(reading_ref):
+        print(f"[DEBUG] Processing ref: {ref} -> {parsed}")
         
-        if not match:
-            # 處理只有章節的情況 (例如: 創1)
-            match_chap = re.match(r'([^\d]+)(\d+)', ref)
-            if match_chap:
-                book_abbr, chap = match_chap.groups()
-                verses = BibleText.get_verses_by_reference(book_abbr, int(chap))
-                all_verses.extend(verses)
+        if not parsed:
             continue
             
-        book_abbr, start_chap_str, start_verse_str, end_chap_str, end_verse_str = match.groups()
-        
-        start_chap = int(start_chap_str)
-        end_chap = int(end_chap_str) if end_chap_str else start_chap
-        start_verse = int(start_verse_str) if start_verse_str else None
-        end_verse = int(end_verse_str) if end_verse_str else None
+        book_abbr, start_chap, start_verse, end_chap, end_verse = parsed
         
         # 使用 Firestore 查詢獲取經文範圍
         if start_chap == end_chap and not start_verse:
@@ -102,16 +104,18 @@ def get_verses_for_reading(reading_ref: str) -> List[Dict[str, Any]]:
 def create_fill_in_the_blank_quiz(verse_data: Dict[str, Any]) -> Tuple[str, str]:
     """
     根據經文數據生成一個填充題。
-    選擇經文中一個關鍵詞或短語進行挖空。
+    選擇經文中一個關鍵詞進行挖空。
     """
     text = verse_data['text']
     
-    # 移除標點符號，方便分詞
-    clean_text = re.sub(r'[，。！？：「」；、]', ' ', text)
-    words = clean_text.split()
+    # 以和合本詞庫分詞，挑出 2~4 字的關鍵詞（同一節經文只分詞一次）
+    verse_id = f"{verse_data.get('book_abbr', '')}{verse_data.get('chapter', '')}:{verse_data.get('verse', '')}"
+    meaningful_words = list(key_terms(verse_id, text))
     
-    # 過濾掉太短的詞 (例如: 的, 了, 是)
-    meaningful_words = [w for w in words if len(w) > 1 and w not in ['的', '了', '是', '在', '我', '你', '他', '她', '它', '這', '那', '與', '和', '都', '就', '又', '從', '到', '為', '因', '以', '所', '將', '必', '要', '向', '說', '看', '聽', '行', '來', '去', '上', '下', '中', '裡', '外', '已', '未', '更', '最']]
+    if not meaningful_words:
+        # 詞庫中找不到關鍵詞時，退回以標點切分的子句
+        clean_text = re.sub(r'[，。！？：「」；、]', ' ', text)
+        meaningful_words = [w for w in clean_text.split() if len(w) > 1]
     
     if not meaningful_words:
         # 如果沒有足夠的詞，選擇最長的詞
@@ -135,15 +139,17 @@ def create_fill_in_the_blank_quiz(verse_data: Dict[str, Any]) -> Tuple[str, str]
 
 # --- 核心邏輯 ---
 
-def generate_quiz_for_user(user: User) -> Tuple[Dict[str, Any], TextMessage]:
+def _generate_quiz_verses(user: User) -> Tuple[str, List[Dict]]:
     """
-    為使用者生成當天的 3 題填充題測驗。
-    返回 quiz_data 字典和第一道題目的 TextMessage。
+    題庫不存在時的舊流程：即時讀取經文並挖空。
+    返回 (readings, selected_verses)。
     """
-    
-    # 1. 獲取當天的讀經範圍
+    # 獲取當天的讀經範圍
     print(f"[DEBUG] Generating quiz for user: plan_type={user['plan_type']}, current_day={user['current_day']}")
-    plan = BiblePlan.get_by_day(user['plan_type'], user['current_day'])
+    if bible_corpus.is_available():
+        plan = bible_corpus.get_plan(user['plan_type'], user['current_day'])
+    else:
+        plan = BiblePlan.get_by_day(user['plan_type'], user['current_day'])
     print(f"[DEBUG] Plan retrieved: {plan}")
     
     if not plan:
@@ -155,7 +161,7 @@ def generate_quiz_for_user(user: User) -> Tuple[Dict[str, Any], TextMessage]:
     if not readings:
         raise ValueError("No reading plan found for today.")
     
-    # 2. 獲取範圍內的所有經文
+    # 獲取範圍內的所有經文
     print(f"[DEBUG] Fetching verses for readings: {readings}")
     all_verses = get_verses_for_reading(readings)
     print(f"[DEBUG] Total verses fetched: {len(all_verses)}")
@@ -163,7 +169,7 @@ def generate_quiz_for_user(user: User) -> Tuple[Dict[str, Any], TextMessage]:
     if not all_verses:
         raise ValueError("No verses found for today's reading plan.")
         
-    # 3. 從中隨機選取 3 節經文作為題目來源
+    # 從中隨機選取 3 節經文作為題目來源
     # 確保選取的經文是獨一無二的，且能生成有效的題目
     selected_verses = []
     attempts = 0
@@ -173,63 +179,209 @@ def generate_quiz_for_user(user: User) -> Tuple[Dict[str, Any], TextMessage]:
         if ref not in [f"{v['book_abbr']}{v['chapter']}:{v['verse']}" for v in selected_verses]:
             quiz_text, answer = create_fill_in_the_blank_quiz(verse)
             if answer != "無答案":
+                verse['ref'] = ref
                 verse['quiz_text'] = quiz_text
                 verse['answer'] = answer
                 selected_verses.append(verse)
         attempts += 1
-        
-    if len(selected_verses) < 3:
+
+    return readings, selected_verses
+
+def verse_question_id(ref: str, text: str, answer: str) -> str:
+    """經文挖空題的 ID，例如 "創1:1@3+2"（經文位置 + 答案起點與長度）"""
+    return f"{ref}@{text.find(answer)}+{len(answer)}"
+
+def resolve_question(qid: str) -> Optional[Dict[str, str]]:
+    """
+    將題目 ID 還原為題目內容。
+    題庫題目 ("Canonical_12#3") 由題庫快取取得；經文題目 ("創1:1@3+2") 由經文語料取得。
+    返回 {ref, quiz_text, full_verse, answer, choices}，無法還原時返回 None。
+    choices 為題庫預先產生的干擾選項，經文題目則為 None（出選擇題時再即時挑選）。
+    """
+    if '#' in qid:
+        item = get_item(qid)
+        if not item:
+            return None
+        ref, text, pos, length = item['ref'], item['text'], item['pos'], len(item['answer'])
+        choices = item.get('choices')
+    else:
+        ref, _, span = qid.partition('@')
+        pos_str, _, length_str = span.partition('+')
+        parsed = parse_reference(ref)
+        if not parsed or not parsed.is_single_verse or not pos_str.isdigit() or not length_str.isdigit():
+            return None
+        pos, length = int(pos_str), int(length_str)
+        if bible_corpus.is_available():
+            verses = bible_corpus.get_verses([bible_corpus.compile_reference(parsed)])
+        else:
+            verses = [v for v in BibleText.get_verses_by_reference(parsed.book_abbr, parsed.start_chapter)
+                      if v['verse'] == parsed.start_verse]
+        if not verses:
+            return None
+        text = verses[0]['text']
+        choices = None
+
+    return {
+        "ref": ref,
+        "quiz_text": text[:pos] + "[___]" + text[pos + length:],
+        "full_verse": text,
+        "answer": text[pos:pos + length],
+        "choices": choices,
+    }
+
+def get_quiz(user) -> Dict[str, Any]:
+    """
+    取得使用者的測驗狀態 {ids, i, att}。
+    舊版 JSON 字串 quiz_data 會被轉換為新格式（題目改以經文 ID 表示）。
+    """
+    quiz = user.get(QUIZ_FIELD)
+    if quiz and quiz.get('ids'):
+        return quiz
+
+    legacy = user.get('quiz_data')
+    if not isinstance(legacy, str) or legacy in ('', '{}'):
+        return {}
+    legacy = json.loads(legacy)
+    questions = legacy.get("questions") or []
+    return {
+        "ids": [verse_question_id(q["ref"], q["full_verse"], q["answer"]) for q in questions],
+        "i": legacy.get("current_question_index", 0),
+        "att": [q.get("attempts", 0) for q in questions],
+    }
+
+def format_question_message(quiz: Dict[str, Any], question: Dict[str, str], prefix: str = "") -> str:
+    """第 N 題的題目訊息"""
+    hint = "👇 請點選下方的答案：" if quiz.get("mode") == QUIZ_MODE_CHOICE else "💡 請輸入您認為正確的答案："
+    review_tag = "（🔁 複習題）" if quiz['i'] >= len(quiz['ids']) - quiz.get("rv", 0) else ""
+    return (
+        f"{prefix}📝 第 {quiz['i'] + 1} 題 (共 {len(quiz['ids'])} 題){review_tag}\n📖 經文：{question['ref']}\n\n"
+        f"{question['quiz_text']}\n\n"
+        f"{hint}"
+    )
+
+def get_choices(qid: str, question: Dict[str, str]) -> List[str]:
+    """
+    選擇題的選項（正確答案 + 干擾選項，已洗牌）。
+    以題目 ID 作為亂數種子，同一題每次顯示的選項順序相同。
+    """
+    rng = random.Random(qid)
+    distractors = question.get("choices")
+    if not distractors:
+        ref = parse_reference(question["ref"])
+        distractors = get_distractors(ref.book_abbr if ref else "", question["answer"],
+                                      question["full_verse"], rng=rng)
+    choices = [question["answer"]] + list(distractors[:3])
+    rng.shuffle(choices)
+    return choices
+
+def build_question_message(quiz: Dict[str, Any], question: Dict[str, str], prefix: str = "") -> TextMessage:
+    """第 N 題的 TextMessage；選擇題模式附上 Quick Reply 選項按鈕"""
+    text = format_question_message(quiz, question, prefix)
+    if quiz.get("mode") != QUIZ_MODE_CHOICE:
+        return TextMessage(text=text)
+
+    choices = get_choices(quiz["ids"][quiz["i"]], question)
+    return TextMessage(
+        text=text,
+        quick_reply=QuickReply(
+            items=[QuickReplyItem(action=MessageAction(label=choice[:20], text=choice)) for choice in choices]
+        )
+    )
+
+def generate_quiz_for_user(user: User) -> Tuple[Dict[str, Any], TextMessage]:
+    """
+    為使用者生成當天的 3 題填充題測驗。
+    返回測驗狀態 {ids, i, att[, mode]} 和第一道題目的 TextMessage。
+    """
+    
+    # 1. 優先使用預先產生的題庫（只讀一份文件，不需讀取經文）
+    question_ids = []
+    bank = get_bank(user['plan_type'], user['current_day'])
+    if bank and bank.get('items'):
+        question_ids = [item_id(user['plan_type'], user['current_day'], index)
+                        for index in sample_indices(bank, 3)]
+        print(f"[DEBUG] Quiz sampled from bank: {bank_key(user['plan_type'], user['current_day'])}")
+    else:
+        _, selected_verses = _generate_quiz_verses(user)
+        question_ids = [verse_question_id(v['ref'], v['text'], v['answer']) for v in selected_verses]
+
+    if len(question_ids) < 3:
         # 如果無法生成 3 題，則用已生成的題目填充，或簡化處理
         # 這裡假設至少能生成 1 題
-        if not selected_verses:
+        if not question_ids:
             raise ValueError("Could not generate any valid quiz question.")
         
         # 用第一道題重複填充到 3 題
-        while len(selected_verses) < 3:
-            selected_verses.append(selected_verses[0])
-
-    # 4. 構建測驗數據結構
-    quiz_data = {
-        "readings": readings,
-        "current_question_index": 0,
-        "questions": []
-    }
-    
-    for verse in selected_verses:
-        quiz_data["questions"].append({
-            "ref": f"{verse['book_abbr']}{verse['chapter']}:{verse['verse']}",
-            "quiz_text": verse['quiz_text'],
-            "full_verse": verse['text'],
-            "answer": verse['answer'],
-            "attempts": 0
-        })
+        while len(question_ids) < 3:
+            question_ids.append(question_ids[0])
+
+    # 2. 混入已到期的複習題（取代最後幾題；佇列就在已讀取的使用者文件中，不需額外讀取）
+    review_ids = [qid for qid in review_queue.due_items(user) if qid not in question_ids]
+    if review_ids:
+        question_ids = question_ids[:len(question_ids) - len(review_ids)] + review_ids
+        print(f"[DEBUG] Review questions mixed in: {review_ids}")
+
+    # 3. 構建測驗狀態與第一道題目的訊息
+    if review_ids:
+        return _new_quiz(user, question_ids, rv=len(review_ids))
+    return _new_quiz(user, question_ids)
+
+def generate_makeup_quiz(user: User, reading_dates: List[str]) -> Tuple[Dict[str, Any], TextMessage]:
+    """
+    補讀的合併測驗：從補讀的每一天題庫各抽一題（最多 MAKEUP_QUIZ_QUESTIONS 題）。
+    補讀的日期記在測驗狀態的 mk 欄位，測驗完成時一併計分。
+    """
+    day_numbers = list(range(user['current_day'], user['current_day'] + len(reading_dates)))
+    if len(day_numbers) > MAKEUP_QUIZ_QUESTIONS:
+        day_numbers = sorted(random.sample(day_numbers, MAKEUP_QUIZ_QUESTIONS))
+
+    question_ids = []
+    for day_number in day_numbers:
+        bank = get_bank(user['plan_type'], day_number)
+        if bank and bank.get('items'):
+            question_ids.extend(item_id(user['plan_type'], day_number, index) for index in sample_indices(bank, 1))
+
+    if not question_ids:
+        raise ValueError("Could not generate any valid quiz question.")
+    return _new_quiz(user, question_ids, mk=list(reading_dates))
+
+def _new_quiz(user: User, question_ids: List[str], **extra) -> Tuple[Dict[str, Any], TextMessage]:
+    """構建精簡的測驗狀態（只保存題目 ID、目前題號與作答次數）並準備第一道題目的訊息"""
+    quiz = {"ids": question_ids, "i": 0, "att": [0] * len(question_ids), **extra}
+    if user.get('quiz_mode') == QUIZ_MODE_CHOICE:
+        quiz["mode"] = QUIZ_MODE_CHOICE
         
-    # 5. 準備第一道題目的訊息
-    first_question = quiz_data["questions"][0]
-    message_text = (
-        f"📝 第 1 題 (共 3 題)\n📖 經文：{first_question['ref']}\n\n"
-        f"{first_question['quiz_text']}\n\n"
-        "💡 請輸入您認為正確的答案："
-    )
-    first_question_message = TextMessage(text=message_text)
+    first_question = resolve_question(question_ids[0])
+    if not first_question:
+        raise ValueError("Could not generate any valid quiz question.")
+    first_question_message = build_question_message(quiz, first_question)
     
-    return quiz_data, first_question_message
+    return quiz, first_question_message
 
 def process_quiz_answer(user: dict, answer: str) -> tuple:
     """
     處理使用者提交的測驗答案。
     返回 (reply_messages, updated_user, quiz_result) 元組。
-    quiz_result: "perfect" (全對), "partial" (部分錯誤), "in_progress" (還在進行中)
+    quiz_result: "perfect" (全對), "partial" (部分錯誤), "in_progress" (還在進行中), "error" (狀態錯誤)
+
+    測驗進行中的狀態變化（題號、作答次數）會以欄位層級直接寫入；
+    測驗完成時只設定 quiz_state，由呼叫端計分後一併儲存。
     """
     reply_messages = []
     quiz_result = "in_progress"  # 預設狀態
     
     try:
-        quiz_data = json.loads(user['quiz_data'])
-        current_index = quiz_data["current_question_index"]
-        question = quiz_data["questions"][current_index]
-    except (json.JSONDecodeError, IndexError, KeyError):
-        return [TextMessage(text="測驗狀態錯誤，請重新開始測驗。")], user
+        quiz = get_quiz(user)
+        current_index = quiz["i"]
+        question = resolve_question(quiz["ids"][current_index])
+        if not question:
+            raise KeyError(quiz["ids"][current_index])
+    except (json.JSONDecodeError, IndexError, KeyError, TypeError):
+        return [TextMessage(text="測驗狀態錯誤，請重新開始測驗。")], user, "error"
+
+    # 舊版 quiz_data 轉換後整份寫入一次，之後只更新個別欄位
+    migrating = not (user.get(QUIZ_FIELD) or {}).get('ids')
+    updates = {}
 
     correct_answer = question["answer"]
     user_answer = answer.strip()
@@ -239,21 +391,10 @@ def process_quiz_answer(user: dict, answer: str) -> tuple:
     print(f"  User answer (raw): '{user_answer}' (length: {len(user_answer)})")
     print(f"  Correct answer (raw): '{correct_answer}' (length: {len(correct_answer)})")
     
-    # 移除所有標點符號和空白字元，只比對文字內容
-    def clean_answer(text):
-        # 移除所有標點符號、空栽、特殊字元
-        cleaned = re.sub(r'[\s，。！？：「」；、,\.!\?:;"\'\(\)\[\]\{\}]', '', text)
-        return cleaned.lower()
-    
-    user_answer_clean = clean_answer(user_answer)
-    correct_answer_clean = clean_answer(correct_answer)
-    
-    print(f"  User answer (clean): '{user_answer_clean}' (length: {len(user_answer_clean)})")
-    print(f"  Correct answer (clean): '{correct_answer_clean}' (length: {len(correct_answer_clean)})")
-    
-    # 答案比對
-    is_correct = user_answer_clean == correct_answer_clean
-    print(f"[DEBUG] Is correct: {is_correct}")
+    # 正規化後比對（標點、全形、異體字折疊）；選擇題的選項常只差一字，只有填空題容許小錯字
+    match = match_answer(user_answer, correct_answer, allow_typos=quiz.get("mode") != QUIZ_MODE_CHOICE)
+    is_correct = match is not None
+    print(f"[DEBUG] Answer match: {match}")
     
     if is_correct:
         # 答對：給予高度肯定與情緒價值
@@ -263,33 +404,36 @@ def process_quiz_answer(user: dict, answer: str) -> tuple:
             "阿們！答案完全正確！🙏 願神的話語常在您心裡！",
             "恭喜您！這題難不倒您！🌟 繼續保持這份對聖經的熱情！"
         ]
-        reply_messages.append(TextMessage(text=random.choice(affirmations)))
+        affirmation = random.choice(affirmations)
+        if match == MATCH_CLOSE:
+            affirmation += f"\n\n✍️ 正確寫法是：{correct_answer}"
+        reply_messages.append(TextMessage(text=affirmation))
         
         # 進入下一題
-        quiz_data["current_question_index"] += 1
-        user['quiz_data'] = json.dumps(quiz_data)
+        quiz["i"] += 1
+        updates[f"{QUIZ_FIELD}.i"] = quiz["i"]
         
-        if quiz_data["current_question_index"] < len(quiz_data["questions"]):
+        if quiz["i"] < len(quiz["ids"]):
             # 還有下一題
-            next_index = quiz_data["current_question_index"]
-            next_question = quiz_data["questions"][next_index]
-            message_text = (
-                f"📝 第 {next_index + 1} 題 (共 {len(quiz_data['questions'])} 題)\n📖 經文：{next_question['ref']}\n\n"
-                f"{next_question['quiz_text']}\n\n"
-                "💡 請輸入您認為正確的答案："
-            )
-            reply_messages.append(TextMessage(text=message_text))
+            next_question = resolve_question(quiz["ids"][quiz["i"]])
+            reply_messages.append(build_question_message(quiz, next_question))
         else:
-            # 測驗完成（全對）
+            # 測驗完成：每題都沒有答錯才算全對
             user['quiz_state'] = "QUIZ_COMPLETED"
-            quiz_result = "perfect"  # 所有題目都答對
-            reply_messages.append(TextMessage(text="🎉 所有題目都答對了！\n\n👏 您真是太棒了！神的話語已經深深刻在您心裡！"))
+            if not any(quiz["att"]):
+                quiz_result = "perfect"  # 所有題目都答對
+                reply_messages.append(TextMessage(text="🎉 所有題目都答對了！\n\n👏 您真是太棒了！神的話語已經深深刻在您心裡！"))
+            else:
+                quiz_result = "partial"  # 有題目答錯
+                reply_messages.append(TextMessage(text="🌟 今天的測驗結束了！\n\n🙏 無論結果如何，您願意花時間讀經和學習，就是最棒的！\n\n✨ 願神祝福您，明天繼續加油！"))
             
     else:
-        # 答錯
-        question["attempts"] += 1
+        # 答錯（選擇題只有一次機會，答錯直接公布答案）
+        quiz["att"][current_index] += 2 if quiz.get("mode") == QUIZ_MODE_CHOICE else 1
+        attempts = quiz["att"][current_index]
+        updates[f"{QUIZ_FIELD}.att"] = quiz["att"]
         
-        if question["attempts"] == 1:
+        if attempts == 1:
             # 第一次答錯：回應填充題的經文，再次詢問答案
             message_text = (
                 f"🤔 再想想看嗎！\n\n"
@@ -298,10 +442,8 @@ def process_quiz_answer(user: dict, answer: str) -> tuple:
                 "💡 請再次輸入您的答案："
             )
             reply_messages.append(TextMessage(text=message_text))
-            # 更新 quiz_data，確保 attempts 被儲存
-            user['quiz_data'] = json.dumps(quiz_data)
             
-        elif question["attempts"] == 2:
+        elif attempts == 2:
             # 第二次答錯：出示答案，並給予鼓勵
             message_text = (
                 f"😊 沒關係，再接再勵！\n\n"
@@ -312,27 +454,67 @@ def process_quiz_answer(user: dict, answer: str) -> tuple:
             reply_messages.append(TextMessage(text=message_text))
             
             # 自動進入下一題
-            quiz_data["current_question_index"] += 1
-            # 立即更新 quiz_data，確保狀態同步
-            user['quiz_data'] = json.dumps(quiz_data)
+            quiz["i"] += 1
+            updates[f"{QUIZ_FIELD}.i"] = quiz["i"]
             
-            if quiz_data["current_question_index"] < len(quiz_data["questions"]):
+            if quiz["i"] < len(quiz["ids"]):
                 # 還有下一題
-                next_index = quiz_data["current_question_index"]
-                next_question = quiz_data["questions"][next_index]
-                message_text = (
-                    f"\n📝 第 {next_index + 1} 題 (共 {len(quiz_data['questions'])} 題)\n📖 經文：{next_question['ref']}\n\n"
-                    f"{next_question['quiz_text']}\n\n"
-                    "💡 請輸入您認為正確的答案："
-                )
-                reply_messages.append(TextMessage(text=message_text))
+                next_question = resolve_question(quiz["ids"][quiz["i"]])
+                reply_messages.append(build_question_message(quiz, next_question, prefix="\n"))
             else:
                 # 測驗完成（部分錯誤）
                 user['quiz_state'] = "QUIZ_COMPLETED"
                 quiz_result = "partial"  # 有題目答錯
                 reply_messages.append(TextMessage(text="🌟 今天的測驗結束了！\n\n🙏 無論結果如何，您願意花時間讀經和學習，就是最棒的！\n\n✨ 願神祝福您，明天繼續加油！"))
+
+    if quiz_result == "in_progress":
+        if migrating:
+            updates = {QUIZ_FIELD: quiz, 'quiz_data': firestore.DELETE_FIELD}
+        # 只寫入有變動的欄位（題號或作答次數），不重寫整份使用者文件
+        user.update_fields(updates)
+    else:
+        user[QUIZ_FIELD] = quiz
+        if migrating:
+            user['quiz_data'] = firestore.DELETE_FIELD
+        # 答錯的題目進入複習佇列、複習題重新排程（由呼叫端計分後一併儲存）
+        stats = review_queue.record_results(user, _review_results(quiz))
+        print(f"[DEBUG] Review queue updated: {stats}")
         
     return reply_messages, user, quiz_result
+
+def _review_results(quiz: Dict[str, Any]) -> Dict[str, int]:
+    """
+    整理測驗結果供複習佇列使用：{經文題目 ID: 作答次數}
+    題庫題目會轉為經文題目 ID，之後複習時不需再讀取當天的題庫。
+    """
+    results: Dict[str, int] = {}
+    for qid, attempts in zip(quiz["ids"], quiz["att"]):
+        if '#' in qid:
+            if not attempts:
+                continue  # 一次就答對的新題目不需複習
+            question = resolve_question(qid)
+            if not question:
+                continue
+            qid = verse_question_id(question["ref"], question["full_verse"], question["answer"])
+        results[qid] = max(attempts, results.get(qid, 0))
+    return results
+
+def reset_quiz(user) -> None:
+    """清除使用者的測驗狀態（只寫入測驗相關欄位）"""
+    updates = {'quiz_state': "IDLE", QUIZ_FIELD: {}}
+    if 'quiz_data' in user.to_dict():
+        updates['quiz_data'] = firestore.DELETE_FIELD
+    user.update_fields(updates)
+    
+def set_quiz_mode(user, mode: str) -> str:
+    """
+    切換測驗模式（下一次測驗生效）。
+    返回回覆訊息文字。
+    """
+    user.update_fields({'quiz_mode': mode})
+    if mode == QUIZ_MODE_CHOICE:
+        return "🔘 已切換為選擇題模式\n\n測驗時直接點選下方的答案按鈕即可作答！\n\n想改回填空題，請發送「填空題模式」"
+    return "✏️ 已切換為填空題模式\n\n測驗時請輸入您認為正確的答案。\n\n想改用選擇題，請發送「選擇題模式」"
     
 def get_daily_reading_text(readings: str) -> str:
     """
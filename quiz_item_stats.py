@@ -0,0 +1,208 @@
+"""
+題庫題目品質統計模組 (Quiz Item Stats)
+
+每次測驗完成時，為題庫題目累計作答次數（quiz_item_stats/{plan_type}_{day_number}_{shard}）：
+    items.{題目位置}.n     作答完成次數
+    items.{題目位置}.ok    第一次就答對的次數
+    items.{題目位置}.miss  答錯兩次、公布答案的次數
+同一天的題庫由所有使用者共用，因此計數分散到 NUM_SHARDS 份文件，避免單一文件寫入過熱；
+寫入與使用者資料同一批次，不增加額外的往返。
+
+離線工作彙總各分片，將幾乎沒人答得出來的題目標記為 retired，並依答對率調整抽題權重
+（題庫文件中的 weight），開始測驗時仍只讀一份題庫文件。
+
+執行方式：
+    python3.11 quiz_item_stats.py              # 彙總統計並更新題庫
+    python3.11 quiz_item_stats.py --dry-run    # 只顯示統計與最差的題目
+    python3.11 quiz_item_stats.py --reset      # 清除統計（重新產生題庫後使用，題目位置已不同）
+"""
+import random
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from google.cloud import firestore
+from database import db
+from quiz_bank import QUIZ_BANK_COLLECTION, clear_cache
+
+QUIZ_ITEM_STATS_COLLECTION = "quiz_item_stats"
+
+NUM_SHARDS = 10             # 每天題庫的計數分片數
+
+MIN_SAMPLES = 20            # 作答次數達此數才評估題目
+RETIRE_MISS_RATE = 0.6      # 公布答案比例達此值即停用
+TARGET_OK_RATE = 0.7        # 第一次答對率達此值者維持完整權重
+MIN_WEIGHT = 0.2
+MIN_ACTIVE_ITEMS = 3        # 每天至少保留的可用題目數
+
+
+def record_quiz(quiz: Dict, writer=None) -> int:
+    """
+    累計一次完成測驗中各題庫題目的作答結果
+
+    Args:
+        quiz: 測驗狀態 {ids, att, ...}
+        writer: 可選的 WriteBatch / Transaction，傳入時由呼叫端 commit
+
+    Returns:
+        int: 計入的題目數（複習題等非題庫題目不計）
+    """
+    updates: Dict[str, Dict[str, Dict]] = defaultdict(dict)
+    for qid, attempts in zip(quiz.get("ids") or [], quiz.get("att") or []):
+        key, _, index = qid.rpartition('#')
+        if not key or not index.isdigit():
+            continue
+        counters = {"n": firestore.Increment(1)}
+        if attempts == 0:
+            counters["ok"] = firestore.Increment(1)
+        elif attempts >= 2:
+            counters["miss"] = firestore.Increment(1)
+        updates[key][index] = counters
+
+    batch = writer or db.batch()
+    for key, items in updates.items():
+        doc_ref = db.collection(QUIZ_ITEM_STATS_COLLECTION).document(f"{key}_{random.randrange(NUM_SHARDS)}")
+        batch.set(doc_ref, {"bank": key, "items": items}, merge=True)
+
+    if writer is None and updates:
+        batch.commit()
+
+    return sum(len(items) for items in updates.values())
+
+
+# === 離線彙總 ===
+
+def aggregate_stats() -> Dict[str, Dict[int, Dict[str, int]]]:
+    """
+    彙總所有分片
+
+    Returns:
+        Dict: {題庫 ID: {題目位置: {n, ok, miss}}}
+    """
+    totals: Dict[str, Dict[int, Dict[str, int]]] = defaultdict(lambda: defaultdict(lambda: {"n": 0, "ok": 0, "miss": 0}))
+    for doc in db.collection(QUIZ_ITEM_STATS_COLLECTION).stream():
+        data = doc.to_dict()
+        for index, counters in (data.get("items") or {}).items():
+            item_totals = totals[data["bank"]][int(index)]
+            for field in item_totals:
+                item_totals[field] += counters.get(field, 0)
+    return totals
+
+
+def assess_items(items: List[Dict], stats: Dict[int, Dict[str, int]]) -> Tuple[List[Dict], int]:
+    """
+    依統計為題目設定 retired / weight
+
+    Args:
+        items: 題庫項目
+        stats: 該題庫的統計 {題目位置: {n, ok, miss}}
+
+    Returns:
+        Tuple[List[Dict], int]: (更新後的題庫項目, 停用題數)
+    """
+    items = [dict(item) for item in items]
+    for item in items:
+        item.pop('retired', None)
+        item.pop('weight', None)
+
+    # 依公布答案比例由高到低停用，至少保留 MIN_ACTIVE_ITEMS 題
+    rated = sorted(((counters["miss"] / counters["n"], index) for index, counters in stats.items()
+                    if index < len(items) and counters["n"] >= MIN_SAMPLES), reverse=True)
+    retired = 0
+    for miss_rate, index in rated:
+        if miss_rate < RETIRE_MISS_RATE or len(items) - retired <= MIN_ACTIVE_ITEMS:
+            break
+        items[index]['retired'] = True
+        retired += 1
+
+    for _, index in rated:
+        if items[index].get('retired'):
+            continue
+        ok_rate = stats[index]["ok"] / stats[index]["n"]
+        if ok_rate < TARGET_OK_RATE:
+            items[index]['weight'] = round(max(MIN_WEIGHT, ok_rate / TARGET_OK_RATE), 2)
+
+    return items, retired
+
+
+def apply_to_banks(dry_run: bool = False) -> Dict[str, int]:
+    """
+    彙總統計並寫回題庫的 retired / weight
+
+    Returns:
+        Dict[str, int]: {banks, retired, reweighted}
+    """
+    totals = aggregate_stats()
+    result = {"banks": 0, "retired": 0, "reweighted": 0}
+    worst = []
+
+    bank_ref = db.collection(QUIZ_BANK_COLLECTION)
+    batch = db.batch()
+    batch_count = 0
+
+    for key, stats in totals.items():
+        doc = bank_ref.document(key).get()
+        if not doc.exists:
+            continue
+        bank_items = doc.to_dict().get('items') or []
+        items, retired = assess_items(bank_items, stats)
+        result["banks"] += 1
+        result["retired"] += retired
+        result["reweighted"] += sum(1 for item in items if 'weight' in item)
+
+        for index, counters in stats.items():
+            if index < len(items) and counters["n"] >= MIN_SAMPLES:
+                worst.append((counters["miss"] / counters["n"], key, index, items[index]))
+
+        if dry_run:
+            continue
+        batch.update(bank_ref.document(key), {'items': items, 'assessed_at': firestore.SERVER_TIMESTAMP})
+        batch_count += 1
+        if batch_count >= 500:
+            batch.commit()
+            print(f"Committed {batch_count} quiz banks to Firestore.")
+            batch = db.batch()
+            batch_count = 0
+
+    if batch_count > 0:
+        batch.commit()
+        print(f"Committed final {batch_count} quiz banks to Firestore.")
+
+    worst.sort(key=lambda entry: entry[0], reverse=True)
+    for miss_rate, key, index, item in worst[:20]:
+        print(f"  {miss_rate:5.0%}  {key}#{index}  {item['ref']}  答案「{item['answer']}」")
+
+    clear_cache()
+    return result
+
+
+def reset_stats() -> int:
+    """刪除所有統計分片"""
+    batch = db.batch()
+    batch_count = 0
+    total = 0
+    for doc in db.collection(QUIZ_ITEM_STATS_COLLECTION).stream():
+        batch.delete(doc.reference)
+        batch_count += 1
+        total += 1
+        if batch_count >= 500:
+            batch.commit()
+            batch = db.batch()
+            batch_count = 0
+    if batch_count > 0:
+        batch.commit()
+    return total
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    if '--reset' in sys.argv:
+        print(f"✓ 已刪除 {reset_stats()} 份統計分片")
+    else:
+        dry_run = '--dry-run' in sys.argv
+        print("彙總題庫作答統計（公布答案比例最高的題目）：")
+        result = apply_to_banks(dry_run=dry_run)
+        print(f"✓ {result['banks']} 天題庫：停用 {result['retired']} 題、調整權重 {result['reweighted']} 題")
+        if dry_run:
+            print("⚠️ --dry-run：未寫入 Firestore")
+    print("=" * 50)
@@ -0,0 +1,280 @@
+"""
+讀經紀錄位元圖模組 (Reading History)
+
+每位使用者在 user 文件中保存 reading_history = {"2026": bytes(46), ...}，
+每一年一個 366 位元的位元圖，第 n 位代表該年第 n+1 天是否讀經。
+連續天數、本週/本月天數、日曆熱力圖都只需位元運算與 popcount，不需額外查詢。
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Union
+
+HISTORY_FIELD = 'reading_history'
+YEAR_BYTES = 46  # 366 位元
+
+# 位元圖開始記錄的日期（上線日）；此日之前的讀經沒有逐日紀錄
+HISTORY_TRACKING_START = date(2026, 10, 19)
+
+DateLike = Union[date, datetime, str]
+
+
+def _to_date(value: DateLike) -> date:
+    """接受 date、datetime 或 "YYYY-MM-DD" 字串"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _day_index(day: date) -> int:
+    """該日在年度位元圖中的位置（0 起算）"""
+    return day.timetuple().tm_yday - 1
+
+
+def _days_in_year(year: int) -> int:
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+
+def _year_bits(history: Optional[Dict], year: int) -> int:
+    """取出某年的位元圖（整數形式）"""
+    raw = (history or {}).get(str(year))
+    if not raw:
+        return 0
+    return int.from_bytes(bytes(raw), 'little')
+
+
+def _range_mask(start: int, end: int) -> int:
+    """第 start 到 end 位（含）全為 1 的遮罩"""
+    if end < start:
+        return 0
+    return ((1 << (end - start + 1)) - 1) << start
+
+
+def _count_range(history: Optional[Dict], start_day: date, end_day: date) -> int:
+    """計算日期區間（含）內的讀經天數，可跨年"""
+    total = 0
+    for year in range(start_day.year, end_day.year + 1):
+        first = _day_index(start_day) if year == start_day.year else 0
+        last = _day_index(end_day) if year == end_day.year else _days_in_year(year) - 1
+        total += (_year_bits(history, year) & _range_mask(first, last)).bit_count()
+    return total
+
+
+# === 寫入 ===
+
+def mark_read(user, reading_date: DateLike) -> bool:
+    """
+    在使用者的位元圖上標記某天已讀經（只修改物件，由呼叫端儲存）
+
+    Args:
+        user: 使用者物件
+        reading_date: 讀經日期
+
+    Returns:
+        bool: 是否為新標記（False 表示該日原本已標記）
+    """
+    day = _to_date(reading_date)
+    history = dict(user.get(HISTORY_FIELD) or {})
+    bits = _year_bits(history, day.year)
+    bit = 1 << _day_index(day)
+
+    if bits & bit:
+        return False
+
+    history[str(day.year)] = (bits | bit).to_bytes(YEAR_BYTES, 'little')
+    user[HISTORY_FIELD] = history
+    return True
+
+
+# === 查詢 ===
+
+def is_read(history: Optional[Dict], reading_date: DateLike) -> bool:
+    """某天是否已讀經"""
+    day = _to_date(reading_date)
+    return bool(_year_bits(history, day.year) >> _day_index(day) & 1)
+
+
+def streak_ending_at(history: Optional[Dict], end_date: DateLike) -> int:
+    """
+    計算到某天為止（含）的連續讀經天數，可跨年
+
+    Args:
+        history: reading_history 欄位
+        end_date: 結束日期
+
+    Returns:
+        int: 連續天數（end_date 未讀經則為 0）
+    """
+    day = _to_date(end_date)
+    streak = 0
+    year, index = day.year, _day_index(day)
+
+    while True:
+        bits = _year_bits(history, year)
+        # 反轉後最高的 1 即為 index 以前最近一個未讀日
+        gaps = ~bits & _range_mask(0, index)
+        if gaps:
+            return streak + index - (gaps.bit_length() - 1)
+        streak += index + 1
+        year -= 1
+        index = _days_in_year(year) - 1
+        if str(year) not in (history or {}):
+            return streak
+
+
+def current_streak(history: Optional[Dict], today: Optional[DateLike] = None) -> int:
+    """
+    目前的連續天數：今天已讀則算到今天，否則算到昨天（今天仍可延續）
+    """
+    today = _to_date(today or date.today())
+    if is_read(history, today):
+        return streak_ending_at(history, today)
+    return streak_ending_at(history, today - timedelta(days=1))
+
+
+def longest_streak(history: Optional[Dict]) -> int:
+    """歷史最長連續天數（跨年的連續會合併計算）"""
+    longest = 0
+    carry = 0  # 上一年年底延續到今年的天數
+    previous_year = None
+
+    for year in sorted(int(y) for y in (history or {})):
+        bits = _year_bits(history, year)
+        size = _days_in_year(year)
+        if previous_year != year - 1:
+            carry = 0
+
+        # 年初連續段與去年年底合併
+        leading = min(((bits + 1) & ~bits).bit_length() - 1, size)
+        longest = max(longest, carry + leading)
+
+        # 年內最長連續段：x &= x >> 1 每次縮短所有連續段一位
+        run, x = 0, bits
+        while x:
+            x &= x >> 1
+            run += 1
+        longest = max(longest, run)
+
+        # 年底連續段
+        if leading == size:
+            carry += size
+        else:
+            gaps = ~bits & _range_mask(0, size - 1)
+            carry = size - gaps.bit_length()
+        previous_year = year
+
+    return longest
+
+
+def missed_days(history: Optional[Dict], since: DateLike, today: Optional[DateLike] = None,
+                limit: int = 7, read_through: Iterable[Optional[DateLike]] = ()) -> List[date]:
+    """
+    找出可補讀的日期：從昨天往前到 since（含）之間未讀經的日子
+
+    HISTORY_TRACKING_START 以後依位元圖判斷；之前的日子沒有逐日紀錄，
+    最後讀經日（含）以前一律視為已讀，避免重複計分
+
+    Args:
+        history: reading_history 欄位
+        since: 最早可補讀的日期（例如加入日期）
+        today: 今天日期
+        limit: 最多往前找幾天
+        read_through: 已知讀過的日期（例如 last_read_date、last_streak_date），只用於位元圖上線前的日子
+
+    Returns:
+        List[date]: 未讀經的日期（由近到遠）
+    """
+    today = _to_date(today or date.today())
+    earliest = max(_to_date(since), today - timedelta(days=limit))
+    legacy_earliest = earliest
+    for day in read_through:
+        if day:
+            legacy_earliest = max(legacy_earliest, _to_date(day) + timedelta(days=1))
+    day = today - timedelta(days=1)
+    missed = []
+    while day >= earliest:
+        if day < HISTORY_TRACKING_START and day < legacy_earliest:
+            break
+        if not is_read(history, day):
+            missed.append(day)
+        day -= timedelta(days=1)
+    return missed
+
+
+def days_in_week(history: Optional[Dict], day: Optional[DateLike] = None) -> int:
+    """本週（週一開始）讀經天數"""
+    day = _to_date(day or date.today())
+    week_start = day - timedelta(days=day.weekday())
+    return _count_range(history, week_start, week_start + timedelta(days=6))
+
+
+def days_in_month(history: Optional[Dict], day: Optional[DateLike] = None) -> int:
+    """本月讀經天數"""
+    day = _to_date(day or date.today())
+    month_start = day.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    return _count_range(history, month_start, next_month - timedelta(days=1))
+
+
+def days_in_year(history: Optional[Dict], year: int) -> int:
+    """某年讀經天數"""
+    return _year_bits(history, year).bit_count()
+
+
+def get_heatmap(history: Optional[Dict], year: int) -> Dict:
+    """
+    產生日曆熱力圖資料
+
+    Args:
+        history: reading_history 欄位
+        year: 年份
+
+    Returns:
+        Dict: {year, first_weekday (0=週一), days: [0/1, ...], total, longest_streak}
+    """
+    bits = _year_bits(history, year)
+    size = _days_in_year(year)
+    year_only = {str(year): (history or {}).get(str(year))} if bits else {}
+    return {
+        'year': year,
+        'first_weekday': date(year, 1, 1).weekday(),
+        'days': [(bits >> i) & 1 for i in range(size)],
+        'total': bits.bit_count(),
+        'longest_streak': longest_streak(year_only),
+    }
+
+
+def format_month_calendar(history: Optional[Dict], day: Optional[DateLike] = None) -> str:
+    """
+    以文字格式化當月日曆（■ 已讀、□ 未讀、· 尚未到）
+
+    Args:
+        history: reading_history 欄位
+        day: 當月任一天，預設為今天
+
+    Returns:
+        str: 日曆文字
+    """
+    today = _to_date(day or date.today())
+    month_start = today.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    bits = _year_bits(history, today.year)
+
+    lines = [f"📅 {today.year} 年 {today.month} 月讀經日曆", "一 二 三 四 五 六 日"]
+    cells: List[str] = ["  "] * month_start.weekday()
+    current = month_start
+    while current < next_month:
+        if current > today:
+            cells.append("· ")
+        elif bits >> _day_index(current) & 1:
+            cells.append("■ ")
+        else:
+            cells.append("□ ")
+        current += timedelta(days=1)
+
+    for i in range(0, len(cells), 7):
+        lines.append("".join(cells[i:i + 7]).rstrip())
+
+    lines.append("")
+    lines.append(f"本月已讀 {days_in_month(history, today)} 天｜連續 {current_streak(history, today)} 天")
+    return "\n".join(lines)
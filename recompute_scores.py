@@ -0,0 +1,471 @@
+"""
+積分重新計算腳本：以 score_events 帳本重播，重建所有使用者的積分、連續天數與徽章
+調整 STREAK_BONUS / BADGES 等規則後，只要重新執行本腳本即可回溯套用，不需另寫遷移腳本
+
+執行方式：
+    python3.11 recompute_scores.py            # 試算，只列出差異
+    python3.11 recompute_scores.py --apply    # 將差異批次寫回 users
+    python3.11 recompute_scores.py --seed     # 為沒有期初事件的使用者建立期初事件（帳本啟用後才執行也可以）
+"""
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from database import db, USERS_COLLECTION
+import score_ledger
+from scoring import (
+    BADGES, BADGE_ENGINE, STREAK_BONUS, BASE_READING_SCORE, QUIZ_PERFECT_SCORE, QUIZ_PARTIAL_SCORE,
+    MAKEUP_1DAY_SCORE, MAKEUP_OLD_SCORE
+)
+
+# 重播順序：同一天內先期初、再讀經/補讀、最後調整
+KIND_CODES = {
+    score_ledger.EVENT_OPENING: 0,
+    score_ledger.EVENT_READING: 1,
+    score_ledger.EVENT_MAKEUP: 2,
+    score_ledger.EVENT_ADJUST: 3,
+    score_ledger.EVENT_BADGE: 4,
+}
+QUIZ_CODES = {"none": 0, "perfect": 1, "partial": 2}
+
+# 重算後寫回的欄位
+RECOMPUTED_FIELDS = [
+    'total_score', 'current_streak', 'longest_streak', 'last_streak_date',
+    'total_reading_days', 'quiz_perfect_count', 'quiz_total_count',
+    'badges', 'milestone_achieved'
+]
+
+
+# === 載入帳本 ===
+
+def load_columns(events: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    將帳本事件轉為欄式 NumPy 陣列
+
+    Args:
+        events: 帳本事件列表
+
+    Returns:
+        Dict[str, np.ndarray]: 各欄位陣列
+    """
+    n = len(events)
+    cols = {
+        'user': np.empty(n, dtype=object),
+        'day': np.zeros(n, dtype=np.int64),
+        'kind': np.zeros(n, dtype=np.int8),
+        'points': np.zeros(n, dtype=np.int64),
+        'quiz': np.zeros(n, dtype=np.int8),
+        'days_ago': np.zeros(n, dtype=np.int32),
+        # 期初事件攜帶的起始值
+        'open_streak': np.zeros(n, dtype=np.int64),
+        'open_longest': np.zeros(n, dtype=np.int64),
+        'open_reading_days': np.zeros(n, dtype=np.int64),
+        'open_perfect': np.zeros(n, dtype=np.int64),
+        'open_quiz_total': np.zeros(n, dtype=np.int64),
+        'open_current_day': np.ones(n, dtype=np.int64),
+    }
+    openings = {}
+
+    for i, event in enumerate(events):
+        cols['user'][i] = event['user_id']
+        event_date = event.get('date')
+        cols['day'][i] = date.fromisoformat(event_date).toordinal() if event_date else 0
+        cols['kind'][i] = KIND_CODES.get(event.get('kind'), KIND_CODES[score_ledger.EVENT_BADGE])
+        cols['points'][i] = event.get('points', 0)
+        cols['quiz'][i] = QUIZ_CODES.get(event.get('quiz', 'none'), 0)
+        cols['days_ago'][i] = event.get('days_ago', 0)
+
+        if event.get('kind') == score_ledger.EVENT_OPENING:
+            cols['open_streak'][i] = event.get('streak', 0)
+            cols['open_longest'][i] = event.get('longest_streak', 0)
+            cols['open_reading_days'][i] = event.get('reading_days', 0)
+            cols['open_perfect'][i] = event.get('perfect', 0)
+            cols['open_quiz_total'][i] = event.get('quiz_total', 0)
+            cols['open_current_day'][i] = event.get('current_day', 1)
+            openings[event['user_id']] = event.get('milestones', {})
+
+    cols['openings'] = openings
+    return cols
+
+
+# === 向量化輔助函數 ===
+
+def _group_cumsum(values: np.ndarray, first: np.ndarray) -> np.ndarray:
+    """依使用者分組的累加（values 已依使用者排序，first 標記每組第一列）"""
+    total = np.cumsum(values)
+    start = np.flatnonzero(first)
+    group = np.cumsum(first) - 1
+    offset = (total - values)[start]
+    return total - offset[group]
+
+
+def _forward_fill(values: np.ndarray, has: np.ndarray) -> np.ndarray:
+    """以同組前一筆有效值填補（has 在每組第一列必須為 True）"""
+    idx = np.where(has, np.arange(len(values)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    return values[idx]
+
+
+def _streak_bonus(streak: np.ndarray) -> np.ndarray:
+    """以 STREAK_BONUS 的區間下限查表"""
+    ranges = sorted(STREAK_BONUS.items())
+    lows = np.array([low for (low, _), _ in ranges])
+    bonuses = np.array([bonus for _, bonus in ranges])
+    pos = np.searchsorted(lows, streak, side='right') - 1
+    return np.where(pos >= 0, bonuses[np.clip(pos, 0, None)], 0)
+
+
+# === 重播引擎 ===
+
+def replay(cols: Dict[str, np.ndarray]) -> Dict[str, Dict]:
+    """
+    以目前的計分規則重播整個帳本
+
+    Args:
+        cols: load_columns 的結果
+
+    Returns:
+        Dict[str, Dict]: {user_id: 重算後的欄位}
+    """
+    if len(cols['user']) == 0:
+        return {}
+
+    labels, u = np.unique(cols['user'].astype(str), return_inverse=True)
+    order = np.lexsort((cols['kind'], cols['day'], u))
+    u = u[order]
+    day = cols['day'][order]
+    kind = cols['kind'][order]
+    points = cols['points'][order]
+    quiz = cols['quiz'][order]
+    days_ago = cols['days_ago'][order]
+    opening = {k: cols[k][order] for k in cols if k.startswith('open_')}
+
+    n = len(u)
+    first = np.r_[True, u[1:] != u[:-1]]
+    is_open = kind == KIND_CODES[score_ledger.EVENT_OPENING]
+    is_read = kind == KIND_CODES[score_ledger.EVENT_READING]
+    is_makeup = kind == KIND_CODES[score_ledger.EVENT_MAKEUP]
+    is_adjust = kind == KIND_CODES[score_ledger.EVENT_ADJUST]
+    is_scored = is_read | is_makeup
+
+    # 1. 連續天數：只有期初與當日讀經會影響
+    s_idx = np.flatnonzero(is_open | is_read)
+    su, sd, s_open = u[s_idx], day[s_idx], is_open[s_idx]
+    same_user = np.r_[False, su[1:] == su[:-1]]
+    gap = np.r_[0, np.diff(sd)]
+    cont = same_user & (gap == 1)
+    dup = same_user & (gap == 0) & ~s_open
+    inc = np.where(s_open, opening['open_streak'][s_idx], np.where(dup, 0, 1))
+    start = ~(cont | dup)
+    run = np.cumsum(start) - 1
+    running = np.cumsum(inc)
+    streak = running - (running - inc)[start][run]
+    prev_streak = np.r_[0, streak[:-1]]
+    restart = start & same_user & (prev_streak > 0) & ~s_open
+
+    streak_full = np.zeros(n, dtype=np.int64)
+    streak_full[s_idx] = streak
+    has_streak = np.zeros(n, dtype=bool)
+    has_streak[s_idx] = True
+    current_streak = _forward_fill(streak_full, has_streak | first)
+
+    # 2. 每筆事件的分數
+    quiz_points = np.select([quiz == QUIZ_CODES['perfect'], quiz == QUIZ_CODES['partial']],
+                            [QUIZ_PERFECT_SCORE, QUIZ_PARTIAL_SCORE], 0)
+    makeup_base = np.where(days_ago == 1, MAKEUP_1DAY_SCORE, MAKEUP_OLD_SCORE)
+    row_points = np.select(
+        [is_read, is_makeup, is_adjust | is_open],
+        [BASE_READING_SCORE + quiz_points + _streak_bonus(current_streak),
+         makeup_base + quiz_points,
+         points],
+        0
+    )
+
+    # 3. 徽章檢查欄位在每筆讀經/補讀當下的值
+    read_count = _group_cumsum(is_scored.astype(np.int64), first)
+    series = {
+        'current_streak': current_streak,
+        'total_reading_days': _group_cumsum(np.where(is_open, opening['open_reading_days'], is_scored), first),
+        'quiz_perfect_count': _group_cumsum(
+            np.where(is_open, opening['open_perfect'], is_scored & (quiz == QUIZ_CODES['perfect'])), first),
+        'quiz_total_count': _group_cumsum(
+            np.where(is_open, opening['open_quiz_total'], is_scored & (quiz > 0)), first),
+        'current_day': _forward_fill(opening['open_current_day'], is_open | first) + read_count - 1,
+    }
+
+    # 4. 徽章：每位使用者第一次達標的那筆事件
+    #    計畫限定的規則無法從帳本得知計畫類型，交由線上評估處理
+    month_day = None
+    if any(rule.season for rule in BADGE_ENGINE.rules):
+        month_day = np.array([date.fromordinal(int(d)).strftime('%m-%d') if d > 0 else '' for d in day])
+    awards = []  # (badge_id, 事件列索引)
+
+    def _first_per_user(rows: np.ndarray) -> np.ndarray:
+        _, first_hit = np.unique(u[rows], return_index=True)
+        return rows[first_hit]
+
+    def _in_season(rule) -> np.ndarray:
+        if not rule.season:
+            return np.ones(n, dtype=bool)
+        start, end = rule.season
+        if start <= end:
+            return (month_day >= start) & (month_day <= end)
+        return (month_day >= start) | (month_day <= end)
+
+    restart_mask = np.zeros(n, dtype=bool)
+    restart_mask[s_idx[restart]] = True
+    event_masks = {'restart': restart_mask}
+    for event, rules in BADGE_ENGINE.event_index.items():
+        for rule in rules:
+            if event in event_masks and not rule.plan_type:
+                rows = np.flatnonzero(event_masks[event] & _in_season(rule))
+                awards.extend((rule.badge_id, row) for row in _first_per_user(rows))
+    for field, (_, rules) in BADGE_ENGINE.threshold_index.items():
+        if field not in series:
+            continue
+        for rule in rules:
+            if rule.plan_type:
+                continue
+            rows = np.flatnonzero(is_scored & (series[field] >= rule.threshold) & _in_season(rule))
+            awards.extend((rule.badge_id, row) for row in _first_per_user(rows))
+
+    # 5. 彙總每位使用者
+    totals = np.bincount(u, weights=row_points, minlength=len(labels)).astype(np.int64)
+    last_row = np.r_[np.flatnonzero(first)[1:], n] - 1
+    longest = np.maximum(
+        np.maximum.reduceat(streak_full, np.flatnonzero(first)),
+        np.maximum.reduceat(opening['open_longest'], np.flatnonzero(first))
+    )
+    last_streak_row = _forward_fill(np.arange(n), has_streak | first)[last_row]
+
+    results = {}
+    for i, user_id in enumerate(labels):
+        row = last_streak_row[i]
+        has_date = has_streak[row] and day[row] > 0
+        results[user_id] = {
+            'total_score': int(totals[i]),
+            'current_streak': int(current_streak[last_row[i]]),
+            'longest_streak': int(longest[i]),
+            'last_streak_date': date.fromordinal(int(day[row])).isoformat() if has_date else None,
+            'total_reading_days': int(series['total_reading_days'][last_row[i]]),
+            'quiz_perfect_count': int(series['quiz_perfect_count'][last_row[i]]),
+            'quiz_total_count': int(series['quiz_total_count'][last_row[i]]),
+            'badges': [],
+            'milestone_achieved': dict(cols['openings'].get(user_id, {})),
+        }
+    for user_id, milestones in cols['openings'].items():
+        results[user_id]['badges'] = [BADGES[b]['emoji'] for b in milestones if b in BADGES]
+
+    for badge_id, row in sorted(awards, key=lambda a: a[1]):
+        user_result = results[labels[u[row]]]
+        if badge_id in user_result['milestone_achieved']:
+            continue
+        user_result['milestone_achieved'][badge_id] = date.fromordinal(int(day[row])).isoformat()
+        user_result['badges'].append(BADGES[badge_id]['emoji'])
+        user_result['total_score'] += BADGES[badge_id]['score_reward']
+
+    return results
+
+
+# === 寫回 ===
+
+def write_back(results: Dict[str, Dict], opened, apply: bool = False) -> int:
+    """
+    比對重算結果與現有資料，批次寫回有差異的使用者
+
+    沒有期初事件的使用者只重播了帳本啟用後的事件，寫回會遺失之前的積分與徽章，一律略過
+
+    Args:
+        results: replay 的結果
+        opened: 有期初事件的使用者 ID
+        apply: False 時只列出差異
+
+    Returns:
+        int: 有差異的使用者數
+    """
+    users_ref = db.collection(USERS_COLLECTION)
+    changed = 0
+    skipped = 0
+    batch = db.batch()
+    pending = 0
+
+    for doc in users_ref.select(RECOMPUTED_FIELDS).stream():
+        if doc.id not in results:
+            continue
+        if doc.id not in opened:
+            skipped += 1
+            continue
+        current = doc.to_dict()
+        target = results[doc.id]
+        diff = {k: v for k, v in target.items() if current.get(k) != v}
+        if not diff:
+            continue
+
+        changed += 1
+        print(f"  {doc.id}: " + ", ".join(f"{k} {current.get(k)} → {v}" for k, v in diff.items()
+                                          if k not in ('badges', 'milestone_achieved')))
+        if apply:
+            batch.update(doc.reference, diff)
+            pending += 1
+            if pending >= score_ledger.BATCH_LIMIT:
+                batch.commit()
+                batch = db.batch()
+                pending = 0
+
+    if apply and pending > 0:
+        batch.commit()
+
+    if skipped:
+        print(f"⚠️ {skipped} 位使用者沒有期初事件，已略過（請先執行 --seed）")
+    return changed
+
+
+def _ledger_totals(events: List[Dict]) -> Dict[str, Dict]:
+    """彙總每位使用者帳本中已記錄的部分（期初事件另外標記）"""
+    totals: Dict[str, Dict] = {}
+    for event in events:
+        user = totals.setdefault(event['user_id'], {
+            'has_opening': False, 'points': 0, 'scored': 0, 'perfect': 0, 'quiz_total': 0,
+            'badges': set(), 'reading_dates': set(), 'first_date': None,
+        })
+        kind = event.get('kind')
+        if kind == score_ledger.EVENT_OPENING:
+            user['has_opening'] = True
+            continue
+        user['points'] += event.get('points', 0)
+        event_date = event.get('date')
+        if event_date and (user['first_date'] is None or event_date < user['first_date']):
+            user['first_date'] = event_date
+        if kind in (score_ledger.EVENT_READING, score_ledger.EVENT_MAKEUP):
+            user['scored'] += 1
+            quiz = event.get('quiz', 'none')
+            user['perfect'] += quiz == 'perfect'
+            user['quiz_total'] += quiz in ('perfect', 'partial')
+            if kind == score_ledger.EVENT_READING and event_date:
+                user['reading_dates'].add(date.fromisoformat(event_date))
+        elif kind == score_ledger.EVENT_BADGE and event.get('badge_id'):
+            user['badges'].add(event['badge_id'])
+    return totals
+
+
+def _opening_streak(current_streak: int, reading_dates: set) -> int:
+    """
+    帳本啟用時的連續天數：目前的連續天數扣除帳本中最後一段連續讀經的天數
+
+    帳本內的讀經若曾中斷，啟用前的連續天數已不影響目前的值，以 0 計
+    """
+    if not reading_dates:
+        return current_streak
+    days = sorted(reading_dates)
+    run = 1
+    while run < len(days) and (days[-run] - days[-run - 1]).days == 1:
+        run += 1
+    if run < len(days):
+        return 0
+    return max(current_streak - run, 0)
+
+
+def seed_opening_events() -> int:
+    """
+    為帳本中沒有期初事件的使用者建立期初事件
+
+    - 帳本中完全沒有事件的使用者：以目前的欄位值為期初餘額
+    - 帳本啟用後才執行 --seed，已有讀經事件的使用者：目前的欄位值已包含這些事件，
+      期初餘額扣除帳本已記錄的分數、天數、測驗次數與徽章，日期設在第一筆事件的前一天
+
+    執行期間仍有人讀經時，新事件可能與欄位值不同步，請在離峰時段執行。
+    """
+    ledger = _ledger_totals(list(score_ledger.stream_all_events()))
+
+    seeded = 0
+    batch = db.batch()
+    pending = 0
+    for doc in db.collection(USERS_COLLECTION).stream():
+        recorded = ledger.get(doc.id)
+        if recorded and recorded['has_opening']:
+            continue
+        data = doc.to_dict()
+        milestones = dict(data.get('milestone_achieved') or {})
+        opening_date = data.get('last_streak_date')
+        opening = {
+            'points': data.get('total_score') or 0,
+            'streak': data.get('current_streak') or 0,
+            'reading_days': data.get('total_reading_days') or 0,
+            'perfect': data.get('quiz_perfect_count') or 0,
+            'quiz_total': data.get('quiz_total_count') or 0,
+            'current_day': data.get('current_day') or 1,
+        }
+        if recorded:
+            opening['points'] -= recorded['points']
+            opening['streak'] = _opening_streak(opening['streak'], recorded['reading_dates'])
+            opening['reading_days'] = max(opening['reading_days'] - recorded['scored'], 0)
+            opening['perfect'] = max(opening['perfect'] - recorded['perfect'], 0)
+            opening['quiz_total'] = max(opening['quiz_total'] - recorded['quiz_total'], 0)
+            opening['current_day'] = max(opening['current_day'] - recorded['scored'], 1)
+            # 帳本中頒發的徽章由重播重新判定
+            for badge_id in recorded['badges']:
+                milestones.pop(badge_id, None)
+            if recorded['first_date']:
+                opening_date = (date.fromisoformat(recorded['first_date']) - timedelta(days=1)).isoformat()
+
+        event = score_ledger.make_event(
+            score_ledger.EVENT_OPENING,
+            opening_date,
+            opening['points'],
+            streak=opening['streak'],
+            longest_streak=data.get('longest_streak') or 0,
+            reading_days=opening['reading_days'],
+            perfect=opening['perfect'],
+            quiz_total=opening['quiz_total'],
+            current_day=opening['current_day'],
+            milestones=milestones,
+        )
+        score_ledger.append_events(doc.id, [event], writer=batch)
+        seeded += 1
+        pending += 1
+        if pending >= score_ledger.BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    if pending > 0:
+        batch.commit()
+    return seeded
+
+
+def main(argv: List[str]):
+    print("=" * 50)
+
+    if '--seed' in argv:
+        print("建立期初事件...")
+        seeded = seed_opening_events()
+        print(f"✓ 已為 {seeded} 位使用者建立期初事件")
+        print("=" * 50)
+        return
+
+    apply = '--apply' in argv
+    print(f"重播積分帳本（{'寫回' if apply else '試算'}模式）...")
+
+    started = datetime.now()
+    events = list(score_ledger.stream_all_events())
+    print(f"✓ 讀取 {len(events)} 筆事件")
+
+    cols = load_columns(events)
+    results = replay(cols)
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"✓ 重算 {len(results)} 位使用者，耗時 {elapsed:.2f} 秒")
+
+    changed = write_back(results, cols['openings'], apply=apply)
+    print(f"{'已更新' if apply else '將更新'}：{changed} 位")
+
+    if apply and changed:
+        import score_histogram
+        score_histogram.rebuild_histograms()
+        print("✓ 已重建積分分布直方圖")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,134 @@
+"""
+間隔複習模組 (Review Queue)
+
+測驗中答錯的題目會進入使用者的複習佇列，依 SM-2 排程在之後的每日測驗中再次出現。
+
+佇列保存在使用者文件的 review_queue 欄位，是依到期日排序的字串列表：
+    "到期日序數|題目 ID|間隔天數|難易係數x100|連續答對次數"
+例如 "739543|創1:1@3+2|1|250|0"。開始測驗時以二分搜尋取出已到期的項目（有界範圍掃描），
+不需查詢作答歷史，也不需額外的 Firestore 讀取；測驗完成時與計分一起儲存。
+"""
+from bisect import bisect_right, insort
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+REVIEW_FIELD = 'review_queue'
+
+MAX_QUEUE_SIZE = 100        # 每位使用者最多保留的複習題數
+REVIEWS_PER_QUIZ = 1        # 每次測驗最多混入的複習題數
+MASTERED_INTERVAL = 60      # 間隔超過此天數視為已熟記，移出佇列
+
+DEFAULT_EF = 250            # SM-2 初始難易係數 2.5（以 x100 整數保存）
+MIN_EF = 130
+
+Entry = Tuple[int, str, int, int, int]  # (到期日序數, 題目 ID, 間隔, 難易係數, 連續答對次數)
+
+
+def _encode(entry: Entry) -> str:
+    due, qid, interval, ef, reps = entry
+    return f"{due:06d}|{qid}|{interval}|{ef}|{reps}"
+
+
+def _decode(raw: str) -> Entry:
+    due, rest = raw.split('|', 1)
+    qid, interval, ef, reps = rest.rsplit('|', 3)
+    return int(due), qid, int(interval), int(ef), int(reps)
+
+
+def quality_from_attempts(attempts: int) -> int:
+    """
+    將作答次數轉為 SM-2 的回憶品質 (0~5)
+
+    第一次就答對為 5，第二次才答對為 3，答錯兩次（公布答案）為 1
+    """
+    return {0: 5, 1: 3}.get(attempts, 1)
+
+
+def schedule(interval: int, ef: int, reps: int, quality: int) -> Tuple[int, int, int]:
+    """
+    SM-2 排程
+
+    Args:
+        interval: 目前間隔天數
+        ef: 難易係數 x100
+        reps: 連續答對次數
+        quality: 回憶品質 (0~5)
+
+    Returns:
+        Tuple[int, int, int]: (新間隔天數, 新難易係數 x100, 新連續答對次數)
+    """
+    if quality < 3:
+        reps, interval = 0, 1
+    else:
+        reps += 1
+        if reps == 1:
+            interval = 1
+        elif reps == 2:
+            interval = 6
+        else:
+            interval = round(interval * ef / 100)
+
+    ef += round(100 * (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)))
+    return interval, max(MIN_EF, ef), reps
+
+
+def due_items(user, today: Optional[date] = None, limit: int = REVIEWS_PER_QUIZ) -> List[str]:
+    """
+    取出已到期的複習題 ID（最早到期者優先）
+
+    Args:
+        user: 使用者物件
+        today: 今天日期
+        limit: 最多取出幾題
+
+    Returns:
+        List[str]: 題目 ID
+    """
+    queue = user.get(REVIEW_FIELD) or []
+    today_ordinal = (today or date.today()).toordinal()
+    # 到期日在字串開頭，以二分搜尋找出所有 <= 今天的項目
+    end = bisect_right(queue, f"{today_ordinal:06d}|\uffff")
+    return [_decode(raw)[1] for raw in queue[:min(end, limit)]]
+
+
+def record_results(user, results: Dict[str, int], today: Optional[date] = None) -> Dict[str, int]:
+    """
+    依測驗結果更新複習佇列（只修改物件，由呼叫端儲存）
+
+    - 已在佇列中的題目：依作答結果重新排程，熟記後移出
+    - 不在佇列中且有答錯的題目：加入佇列，明天複習
+
+    Args:
+        user: 使用者物件
+        results: {題目 ID: 作答次數}
+        today: 今天日期
+
+    Returns:
+        Dict[str, int]: {added, reviewed, mastered}
+    """
+    today_ordinal = (today or date.today()).toordinal()
+    entries = {entry[1]: entry for entry in map(_decode, user.get(REVIEW_FIELD) or [])}
+    stats = {"added": 0, "reviewed": 0, "mastered": 0}
+
+    for qid, attempts in results.items():
+        quality = quality_from_attempts(attempts)
+        if qid in entries:
+            _, _, interval, ef, reps = entries[qid]
+            interval, ef, reps = schedule(interval, ef, reps, quality)
+            stats["reviewed"] += 1
+            if interval > MASTERED_INTERVAL:
+                del entries[qid]
+                stats["mastered"] += 1
+                continue
+            entries[qid] = (today_ordinal + interval, qid, interval, ef, reps)
+        elif quality < 5:
+            interval, ef, reps = schedule(0, DEFAULT_EF, 0, quality)
+            entries[qid] = (today_ordinal + interval, qid, interval, ef, reps)
+            stats["added"] += 1
+
+    queue: List[str] = []
+    for entry in entries.values():
+        insort(queue, _encode(entry))
+    # 超過上限時保留最早到期的題目
+    user[REVIEW_FIELD] = queue[:MAX_QUEUE_SIZE]
+    return stats
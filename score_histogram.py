@@ -0,0 +1,251 @@
+"""
+積分分布直方圖模組 (Score Histogram)
+
+為每個排行榜指標維護分桶人數（score_histograms/{metric}），隨每次分數變動以
+Increment 增量更新。查詢「前 X%」只需讀一份文件並走訪各桶，不必掃描 users。
+可能進入前 100 名的使用者以快取的前 100 名分數計算精確名次，同樣不需每次查詢。
+
+執行方式（重建所有直方圖）：python3.11 score_histogram.py
+"""
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from google.cloud import firestore
+from database import db, USERS_COLLECTION
+
+SCORE_HISTOGRAMS_COLLECTION = "score_histograms"
+
+# 指標設定：對應的使用者欄位、每桶寬度、最大桶（超過者併入最後一桶）
+METRICS = {
+    "weekly": {"field": "week_score", "width": 10, "max_bucket": 200},
+    "total": {"field": "total_score", "width": 100, "max_bucket": 500},
+    "streak": {"field": "current_streak", "width": 5, "max_bucket": 200},
+}
+
+# 估計名次在此範圍內的使用者改用精確排名
+EXACT_RANK_LIMIT = 100
+
+# 直方圖與前 N 名分數快取（秒），避免同一實例頻繁重複讀取
+HISTOGRAM_CACHE_TTL = 60
+_cache: Dict[str, Tuple[Dict, float]] = {}
+_top_cache: Dict[str, Tuple[List[Tuple[str, int]], float]] = {}
+
+
+def bucket_of(metric: str, value) -> Optional[int]:
+    """
+    取得分數所屬的桶，分數為 0 者不列入分布
+
+    Args:
+        metric: 指標名稱
+        value: 分數
+
+    Returns:
+        Optional[int]: 桶編號
+    """
+    value = value or 0
+    if value <= 0:
+        return None
+    config = METRICS[metric]
+    return min(int(value // config["width"]), config["max_bucket"])
+
+
+def snapshot(user) -> Dict[str, int]:
+    """記錄使用者目前各指標的值（計分前呼叫）"""
+    return {metric: user.get(config["field"]) or 0 for metric, config in METRICS.items()}
+
+
+def apply_changes(before: Dict[str, int], user, writer=None) -> int:
+    """
+    依分數變動增量更新直方圖
+
+    Args:
+        before: snapshot() 的結果
+        user: 計分後的使用者物件
+        writer: 可選的 WriteBatch / Transaction，傳入時由呼叫端 commit
+
+    Returns:
+        int: 有變動的指標數
+    """
+    batch = writer or db.batch()
+    changed = 0
+
+    for metric, config in METRICS.items():
+        old_bucket = bucket_of(metric, before.get(metric))
+        new_bucket = bucket_of(metric, user.get(config["field"]))
+        if old_bucket == new_bucket:
+            continue
+
+        counts = {}
+        total_delta = 0
+        if old_bucket is not None:
+            counts[str(old_bucket)] = firestore.Increment(-1)
+            total_delta -= 1
+        if new_bucket is not None:
+            counts[str(new_bucket)] = firestore.Increment(1)
+            total_delta += 1
+
+        update = {"counts": counts}
+        if total_delta:
+            update["total"] = firestore.Increment(total_delta)
+
+        doc_ref = db.collection(SCORE_HISTOGRAMS_COLLECTION).document(metric)
+        batch.set(doc_ref, update, merge=True)
+        changed += 1
+
+    if writer is None and changed:
+        batch.commit()
+
+    return changed
+
+
+def get_histogram(metric: str) -> Dict:
+    """讀取直方圖（含短時間快取）"""
+    now = time.time()
+    cached = _cache.get(metric)
+    if cached and now - cached[1] < HISTOGRAM_CACHE_TTL:
+        return cached[0]
+
+    doc = db.collection(SCORE_HISTOGRAMS_COLLECTION).document(metric).get()
+    data = doc.to_dict() if doc.exists else {}
+    histogram = {
+        "counts": {int(k): v for k, v in (data.get("counts") or {}).items() if v > 0},
+        "total": data.get("total", 0),
+    }
+    _cache[metric] = (histogram, now)
+    return histogram
+
+
+def estimate_position(metric: str, value) -> Optional[Dict]:
+    """
+    以直方圖估計使用者的位置，O(桶數)
+
+    Args:
+        metric: 指標名稱
+        value: 使用者的分數
+
+    Returns:
+        Optional[Dict]: {higher_max, higher_est, total, top_percent}，分數為 0 時返回 None
+    """
+    bucket = bucket_of(metric, value)
+    if bucket is None:
+        return None
+
+    histogram = get_histogram(metric)
+    counts = histogram["counts"]
+    total = max(histogram["total"], 1)
+
+    higher = sum(count for b, count in counts.items() if b > bucket)
+    same = counts.get(bucket, 0)
+
+    # 桶內以線性內插估計比自己高的人數
+    width = METRICS[metric]["width"]
+    if bucket < METRICS[metric]["max_bucket"]:
+        fraction_above = 1 - ((value or 0) - bucket * width) / width
+    else:
+        fraction_above = 0.5
+    higher_est = higher + same * max(0.0, min(1.0, fraction_above))
+
+    top_percent = max(1, math.ceil((higher_est + 1) / total * 100))
+    return {
+        "higher_max": higher + same,
+        "higher_est": higher_est,
+        "total": total,
+        "top_percent": min(top_percent, 100),
+    }
+
+
+def get_top_scores(metric: str) -> List[Tuple[str, int]]:
+    """
+    讀取排行榜前 EXACT_RANK_LIMIT 名的分數（含短時間快取，只投影分數欄位）
+
+    Returns:
+        List[Tuple[str, int]]: [(使用者文件 ID, 分數)]，由高到低
+    """
+    now = time.time()
+    cached = _top_cache.get(metric)
+    if cached and now - cached[1] < HISTOGRAM_CACHE_TTL:
+        return cached[0]
+
+    field = METRICS[metric]["field"]
+    query = (db.collection(USERS_COLLECTION)
+             .where(filter=firestore.FieldFilter('show_in_leaderboard', '==', True))
+             .order_by(field, direction=firestore.Query.DESCENDING)
+             .select([field])
+             .limit(EXACT_RANK_LIMIT))
+    top = [(doc.id, doc.to_dict().get(field) or 0) for doc in query.stream()]
+    _top_cache[metric] = (top, now)
+    return top
+
+
+def exact_rank(user, metric: str) -> Optional[int]:
+    """
+    以快取的前 N 名分數計算名次（比自己高分的人數 + 1），不在前 N 名內時返回 None
+
+    快取中使用者自己的舊分數不列入比較
+    """
+    value = user.get(METRICS[metric]["field"]) or 0
+    top = get_top_scores(metric)
+    others = [score for user_id, score in top if user_id != user._id]
+    higher = sum(1 for score in others if score > value)
+    # 前 N 名都比自己高，無法得知確切名次
+    if len(top) >= EXACT_RANK_LIMIT and higher == len(others):
+        return None
+    return higher + 1
+
+
+def describe_rank(user, metric: str, label: str) -> Optional[str]:
+    """
+    產生排名描述：可能在前 100 名者顯示精確名次，其餘顯示前 X%
+
+    兩者都只讀取快取的直方圖與前 N 名分數，每位使用者的查詢成本相同
+
+    Args:
+        user: 使用者物件
+        metric: 指標名稱 ("weekly", "total", "streak")
+        label: 顯示用標籤（例如「本週」、「總榜」）
+
+    Returns:
+        Optional[str]: 例如「本週第 5 名」或「總榜前 12%」
+    """
+    position = estimate_position(metric, user.get(METRICS[metric]["field"]))
+    if position is None:
+        return None
+
+    if position["higher_max"] < EXACT_RANK_LIMIT:
+        rank = exact_rank(user, metric)
+        if rank:
+            return f"{label}第 {rank} 名"
+
+    return f"{label}前 {position['top_percent']}%"
+
+
+def rebuild_histograms() -> Dict[str, int]:
+    """以全表掃描重建所有直方圖（初始化或校正用）"""
+    counts = {metric: {} for metric in METRICS}
+    fields = [config["field"] for config in METRICS.values()]
+
+    for doc in db.collection(USERS_COLLECTION).select(fields).stream():
+        data = doc.to_dict()
+        for metric, config in METRICS.items():
+            bucket = bucket_of(metric, data.get(config["field"]))
+            if bucket is not None:
+                counts[metric][str(bucket)] = counts[metric].get(str(bucket), 0) + 1
+
+    totals = {}
+    for metric, metric_counts in counts.items():
+        totals[metric] = sum(metric_counts.values())
+        db.collection(SCORE_HISTOGRAMS_COLLECTION).document(metric).set({
+            "counts": metric_counts,
+            "total": totals[metric],
+            "rebuilt_at": firestore.SERVER_TIMESTAMP,
+        })
+    _cache.clear()
+    _top_cache.clear()
+    return totals
+
+
+if __name__ == "__main__":
+    print("重建積分分布直方圖...")
+    for metric, total in rebuild_histograms().items():
+        print(f"✓ {metric}: {total} 位使用者")
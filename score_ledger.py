@@ -0,0 +1,100 @@
+"""
+積分事件帳本模組 (Score Ledger)
+
+每一次計分動作（讀經、補讀、徽章、手動調整）都會以一筆精簡事件附加到
+score_events 集合。帳本只新增、不修改，作為稽核與重新計算
+（recompute_scores.py）的唯一依據。
+"""
+from typing import Dict, List, Optional, Iterator
+from google.cloud import firestore
+from database import db
+
+SCORE_EVENTS_COLLECTION = "score_events"
+
+# 事件種類
+EVENT_OPENING = "opening"    # 帳本啟用前的期初餘額
+EVENT_READING = "reading"    # 當日讀經
+EVENT_MAKEUP = "makeup"      # 補讀
+EVENT_BADGE = "badge"        # 徽章獎勵
+EVENT_ADJUST = "adjust"      # 管理員手動調整
+
+# Firestore 批次寫入上限
+BATCH_LIMIT = 500
+
+
+def make_event(kind: str, reading_date: Optional[str], points: int, **extra) -> Dict:
+    """
+    建立一筆帳本事件
+
+    Args:
+        kind: 事件種類 (reading, makeup, badge, adjust, opening)
+        reading_date: 事件所屬日期 "YYYY-MM-DD"
+        points: 當時規則下獲得的分數
+        **extra: 附加欄位 (quiz, days_ago, badge_id ...)，值為空時不儲存
+
+    Returns:
+        Dict: 事件資料
+    """
+    event = {
+        'date': reading_date,
+        'kind': kind,
+        'points': int(points),
+    }
+    for key, value in extra.items():
+        if value not in (None, '', 0, 'none'):
+            event[key] = value
+    return event
+
+
+def append_events(user_id: str, events: List[Dict], writer=None) -> int:
+    """
+    附加事件到帳本
+
+    Args:
+        user_id: 使用者文件 ID
+        events: make_event 建立的事件列表
+        writer: 可選的 WriteBatch / Transaction，傳入時由呼叫端負責 commit
+
+    Returns:
+        int: 寫入的事件數
+    """
+    if not events:
+        return 0
+
+    events_ref = db.collection(SCORE_EVENTS_COLLECTION)
+    batch = writer or db.batch()
+
+    for event in events:
+        data = dict(event)
+        data['user_id'] = user_id
+        data['created_at'] = firestore.SERVER_TIMESTAMP
+        batch.set(events_ref.document(), data)
+
+    if writer is None:
+        batch.commit()
+
+    return len(events)
+
+
+def get_events_for_user(user_id: str) -> List[Dict]:
+    """
+    取得單一使用者的所有事件（依日期排序）
+
+    Args:
+        user_id: 使用者文件 ID
+
+    Returns:
+        List[Dict]: 事件列表
+    """
+    query = db.collection(SCORE_EVENTS_COLLECTION).where(
+        filter=firestore.FieldFilter('user_id', '==', user_id)
+    )
+    events = [doc.to_dict() for doc in query.stream()]
+    events.sort(key=lambda e: e.get('date') or '')
+    return events
+
+
+def stream_all_events() -> Iterator[Dict]:
+    """逐筆讀取整個帳本（僅供離線重算使用）"""
+    for doc in db.collection(SCORE_EVENTS_COLLECTION).stream():
+        yield doc.to_dict()
@@ -4,7 +4,14 @@
 """
 from datetime import datetime, timedelta, date
 from typing import Dict, List, Tuple, Optional
-from database import UserObject
+from google.cloud import firestore
+from database import UserObject, db, USERS_COLLECTION
+import score_ledger
+import reading_history
+import score_histogram
+import admin_stats
+import group_leaderboard
+from badge_engine import BadgeEngine
 
 # === 計分常數 ===
 
@@ -17,6 +24,9 @@ QUIZ_PARTIAL_SCORE = 3   # 測驗部分錯誤
 MAKEUP_1DAY_SCORE = 8    # 補讀前一天
 MAKEUP_OLD_SCORE = 6     # 補讀超過 2 天前
 
+# 一次最多可補讀的天數（往前找未讀經的日子）
+MAX_MAKEUP_DAYS = 7
+
 # 連續加成
 STREAK_BONUS = {
     (1, 6): 0,
@@ -80,11 +90,20 @@ BADGES = {
         "name": "重新出發",
         "description": "中斷後重新開始讀經",
         "score_reward": 50,
-        "check_field": None,  # 特殊邏輯
-        "check_value": None
+        "check_field": None,
+        "check_value": None,
+        "trigger": "restart"  # 事件型：中斷後重新開始時觸發
     }
 }
 
+BADGE_ENGINE = BadgeEngine(BADGES)
+
+# 讀經計分時可能變動的欄位（current_day 由呼叫端於計分後更新，因此每次一併檢查）
+READING_CHANGED_FIELDS = (
+    'current_streak', 'longest_streak', 'total_reading_days',
+    'quiz_perfect_count', 'quiz_total_count', 'current_day'
+)
+
 # === 星級定義 ===
 
 STAR_LEVELS = [
@@ -196,39 +215,30 @@ def update_streak(user: UserObject, reading_date: str) -> Tuple[int, bool]:
     return new_streak, got_restart_badge
 
 
-def check_new_badges(user: UserObject) -> List[Dict]:
+def check_new_badges(user: UserObject, changed_fields: Optional[List[str]] = None,
+                     events: List[str] = ()) -> List[Dict]:
     """
     檢查使用者是否達成新徽章
     
     Args:
         user: 使用者物件
+        changed_fields: 本次變動的欄位，None 表示檢查全部
+        events: 本次發生的事件（例如 "restart"）
     
     Returns:
         List[Dict]: 新獲得的徽章列表
     """
     new_badges = []
-    current_badges = user.badges or []
-    milestone_achieved = user.milestone_achieved or {}
     
-    for badge_id, badge_info in BADGES.items():
-        # 如果已經獲得過這個徽章，跳過
-        if badge_id in milestone_achieved:
-            continue
-        
-        # 檢查是否達成條件
-        check_field = badge_info.get('check_field')
-        check_value = badge_info.get('check_value')
-        
-        if check_field and check_value:
-            user_value = getattr(user, check_field, 0) or 0
-            if user_value >= check_value:
-                new_badges.append({
-                    'id': badge_id,
-                    'emoji': badge_info['emoji'],
-                    'name': badge_info['name'],
-                    'description': badge_info['description'],
-                    'score_reward': badge_info['score_reward']
-                })
+    for badge_id in BADGE_ENGINE.evaluate(user, changed_fields, events):
+        badge_info = BADGES[badge_id]
+        new_badges.append({
+            'id': badge_id,
+            'emoji': badge_info['emoji'],
+            'name': badge_info['name'],
+            'description': badge_info['description'],
+            'score_reward': badge_info['score_reward']
+        })
     
     return new_badges
 
@@ -303,6 +313,15 @@ def add_reading_score(user: UserObject, reading_date: str, is_makeup: bool = Fal
         'messages': []
     }
     
+    # 本次計分產生的帳本事件
+    events = []
+    
+    # 計分前的各排行指標，用於增量更新分布直方圖與小組彙總
+    histogram_before = score_histogram.snapshot(user)
+    
+    # 本次觸發的徽章事件
+    badge_events = []
+    
     # 1. 更新連續天數（僅非補讀）
     if not is_makeup:
         new_streak, got_restart_badge = update_streak(user, reading_date)
@@ -316,20 +335,22 @@ def add_reading_score(user: UserObject, reading_date: str, is_makeup: bool = Fal
             user.longest_streak = new_streak
         
         # 重新出發徽章
-        if got_restart_badge and 'restart' not in (user.milestone_achieved or {}):
-            reward = award_badge(user, 'restart')
-            result['total_badge_reward'] += reward
-            result['new_badges'].append(BADGES['restart'])
-            result['messages'].append(f"🔄 獲得「{BADGES['restart']['name']}」徽章！+{reward} 分")
+        if got_restart_badge:
+            badge_events.append('restart')
     
     # 2. 計算分數
     score = calculate_score(user, is_makeup, days_ago, quiz_result)
     result['score_earned'] = score
     result['streak_bonus'] = get_streak_bonus(user.current_streak or 0) if not is_makeup else 0
+    events.append(score_ledger.make_event(
+        score_ledger.EVENT_MAKEUP if is_makeup else score_ledger.EVENT_READING,
+        reading_date, score, quiz=quiz_result, days_ago=days_ago if is_makeup else 0
+    ))
     
-    # 3. 更新統計
+    # 3. 更新統計（本週天數直接由讀經位元圖計算）
+    first_read_of_day = reading_history.mark_read(user, reading_date)
     user.total_reading_days = (user.total_reading_days or 0) + 1
-    user.week_reading_days = (user.week_reading_days or 0) + 1
+    user.week_reading_days = reading_history.days_in_week(user.reading_history)
     
     if quiz_result == "perfect":
         user.quiz_perfect_count = (user.quiz_perfect_count or 0) + 1
@@ -342,9 +363,10 @@ def add_reading_score(user: UserObject, reading_date: str, is_makeup: bool = Fal
     user.month_score = (user.month_score or 0) + score
     
     # 5. 檢查新徽章
-    new_badges = check_new_badges(user)
+    new_badges = check_new_badges(user, READING_CHANGED_FIELDS, badge_events)
     for badge in new_badges:
         reward = award_badge(user, badge['id'])
+        events.append(score_ledger.make_event(score_ledger.EVENT_BADGE, reading_date, reward, badge_id=badge['id']))
         result['total_badge_reward'] += reward
         result['new_badges'].append(badge)
         result['messages'].append(f"{badge['emoji']} 獲得「{badge['name']}」徽章！+{reward} 分")
@@ -354,12 +376,136 @@ def add_reading_score(user: UserObject, reading_date: str, is_makeup: bool = Fal
         user.week_score = (user.week_score or 0) + reward
         user.month_score = (user.month_score or 0) + reward
     
-    # 6. 儲存變更
-    user.save()
+    # 6. 儲存變更（使用者資料與帳本事件在同一批次寫入）
+    batch = db.batch()
+    user.save(writer=batch)
+    score_ledger.append_events(user._id, events, writer=batch)
+    score_histogram.apply_changes(histogram_before, user, writer=batch)
+    batch.commit()
+    
+    # 7. 小組彙總（小組可能已解散，不與使用者資料同批寫入）
+    group_id = user.group_id
+    if group_id:
+        try:
+            group_leaderboard.apply_score_change(
+                group_id,
+                points=(user.total_score or 0) - histogram_before['total'],
+                streak_delta=(user.current_streak or 0) - histogram_before['streak'],
+                read_today=first_read_of_day and not is_makeup and reading_date == datetime.now().strftime('%Y-%m-%d'),
+                user_id=user.line_user_id,
+                streak=user.current_streak or 0
+            )
+        except Exception as e:
+            print(f"Error updating group stats for {group_id}: {e}")
     
     return result
 
 
+@firestore.transactional
+def _apply_makeup_scores(transaction, user: UserObject, reading_dates: List[str],
+                         quiz_result: str, extra_fields: Dict) -> Dict:
+    """
+    在交易中重新讀取使用者資料並為多個補讀日計分（交易重試時會重新執行）
+    """
+    doc_ref = db.collection(USERS_COLLECTION).document(user._id)
+    snapshot = doc_ref.get(transaction=transaction)
+    data = snapshot.to_dict() or {}
+    data['_id'] = user._id
+    user._data = data
+
+    result = {
+        'score_earned': 0,
+        'streak_bonus': 0,
+        'new_badges': [],
+        'total_badge_reward': 0,
+        'new_streak': 0,
+        'messages': [],
+        'makeup_days': 0,
+    }
+    events = []
+    histogram_before = score_histogram.snapshot(user)
+    stats_before = admin_stats.snapshot(user)
+    today = date.today()
+
+    # 1. 每個尚未讀經的日子各計一次補讀分數（已讀過的日子略過，重複送出不會重複計分）
+    for reading_date in reading_dates:
+        if not reading_history.mark_read(user, reading_date):
+            continue
+        days_ago = (today - datetime.strptime(reading_date, '%Y-%m-%d').date()).days
+        score = calculate_score(user, is_makeup=True, days_ago=days_ago, quiz_result=quiz_result)
+        events.append(score_ledger.make_event(
+            score_ledger.EVENT_MAKEUP, reading_date, score, quiz=quiz_result, days_ago=days_ago
+        ))
+        result['score_earned'] += score
+        result['makeup_days'] += 1
+
+    days = result['makeup_days']
+    if days:
+        # 2. 更新統計，讀經計畫一次前進 days 天
+        user.total_reading_days = (user.total_reading_days or 0) + days
+        user.week_reading_days = reading_history.days_in_week(user.reading_history)
+        user.current_day = (user.current_day or 1) + days
+        if quiz_result == "perfect":
+            user.quiz_perfect_count = (user.quiz_perfect_count or 0) + 1
+        if quiz_result in ["perfect", "partial"]:
+            user.quiz_total_count = (user.quiz_total_count or 0) + 1
+
+        # 3. 更新積分
+        user.total_score = (user.total_score or 0) + result['score_earned']
+        user.week_score = (user.week_score or 0) + result['score_earned']
+        user.month_score = (user.month_score or 0) + result['score_earned']
+
+        # 4. 檢查新徽章
+        for badge in check_new_badges(user, READING_CHANGED_FIELDS):
+            reward = award_badge(user, badge['id'])
+            events.append(score_ledger.make_event(score_ledger.EVENT_BADGE, reading_dates[0], reward, badge_id=badge['id']))
+            result['total_badge_reward'] += reward
+            result['new_badges'].append(badge)
+            result['messages'].append(f"{badge['emoji']} 獲得「{badge['name']}」徽章！+{reward} 分")
+            user.total_score = (user.total_score or 0) + reward
+            user.week_score = (user.week_score or 0) + reward
+            user.month_score = (user.month_score or 0) + reward
+
+    # 5. 使用者資料、帳本事件與直方圖在同一交易寫入
+    for field, value in extra_fields.items():
+        user[field] = value
+    user.save(writer=transaction)
+    score_ledger.append_events(user._id, events, writer=transaction)
+    score_histogram.apply_changes(histogram_before, user, writer=transaction)
+    admin_stats.apply_changes(stats_before, user, writer=transaction)
+
+    result['points_delta'] = (user.total_score or 0) - histogram_before['total']
+    return result
+
+
+def add_makeup_scores(user: UserObject, reading_dates: List[str], quiz_result: str = "none",
+                      extra_fields: Optional[Dict] = None) -> Dict:
+    """
+    一次回報多天補讀：為每一天計分，並讓讀經計畫前進相同天數，全部在一個交易中寫入
+
+    Args:
+        user: 使用者物件（交易完成後更新為最新資料）
+        reading_dates: 補讀的日期 "YYYY-MM-DD"
+        quiz_result: 合併測驗結果 ("perfect", "partial", "none")
+        extra_fields: 同一次寫入一併設定的其他欄位（例如清除測驗狀態）
+
+    Returns:
+        Dict: 與 add_reading_score 相同格式的結果，另含 makeup_days（實際計分的天數）
+    """
+    result = _apply_makeup_scores(db.transaction(), user, reading_dates, quiz_result, extra_fields or {})
+
+    # 小組彙總（小組可能已解散，不與使用者資料同批寫入）
+    group_id = user.group_id
+    if group_id and result['points_delta']:
+        try:
+            group_leaderboard.apply_score_change(group_id, points=result['points_delta'], streak_delta=0, read_today=False,
+                                                 user_id=user.line_user_id, streak=user.current_streak or 0)
+        except Exception as e:
+            print(f"Error updating group stats for {group_id}: {e}")
+
+    return result
+
+
 def get_user_rank(user: UserObject, leaderboard_type: str = "weekly") -> Optional[int]:
     """
     獲取使用者在排行榜中的排名
@@ -414,7 +560,10 @@ def format_score_message(result: Dict, user: UserObject = None) -> str:
     
     # 基本分數
     base_score = result['score_earned'] - result['streak_bonus']
-    messages.append(f"📊 今日獲得：{result['score_earned']} 分")
+    if result.get('makeup_days'):
+        messages.append(f"📊 補讀 {result['makeup_days']} 天獲得：{result['score_earned']} 分")
+    else:
+        messages.append(f"📊 今日獲得：{result['score_earned']} 分")
     
     # 分數明細
     details = []
@@ -443,16 +592,14 @@ def format_score_message(result: Dict, user: UserObject = None) -> str:
         total_score = user.total_score or 0
         messages.append(f"\n🏆 目前總積分：{total_score} 分")
         
-        # 排行榜排名
+        # 排行榜排名（前 100 名顯示名次，其餘以分布直方圖估計百分比）
         try:
-            weekly_rank = get_user_rank(user, "weekly")
-            total_rank = get_user_rank(user, "total")
-            
-            rank_parts = []
-            if weekly_rank:
-                rank_parts.append(f"本週第 {weekly_rank} 名")
-            if total_rank:
-                rank_parts.append(f"總榜第 {total_rank} 名")
+            rank_parts = [
+                part for part in (
+                    score_histogram.describe_rank(user, "weekly", "本週"),
+                    score_histogram.describe_rank(user, "total", "總榜"),
+                ) if part
+            ]
             
             if rank_parts:
                 messages.append(f"🎯 排行榜：{' | '.join(rank_parts)}")
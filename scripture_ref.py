@@ -0,0 +1,265 @@
+"""
+經文參考解析模組 (Scripture Reference)
+
+全專案共用的經文參考解析器，取代原本散落在 main.parse_readings、
+quiz_generator 與 api_routes.get_verse 中各自不同的正規表示式。
+
+- 書卷以字典樹 (trie) 做最長比對，支援縮寫（創、約一）、全名（創世記）與異體字（啓 → 啟）
+- 文法涵蓋：章（創1）、章範圍（創1-3）、節（約3:16）、節範圍（太5:1-12）、
+  跨章範圍（創1:1-3:24），以及以 ; 分隔的列表（可省略重複的書卷：創1;2）
+- 解析結果以 lru_cache 記憶，整年讀經計畫只需毫秒
+"""
+import re
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# --- 聖經書卷對照表 ---
+BIBLE_BOOK_MAP = {
+    # 舊約 (Old Testament)
+    "創": {"full": "創世記", "code": "GEN", "wd_code": "gen"},
+    "出": {"full": "出埃及記", "code": "EXO", "wd_code": "exo"},
+    "利": {"full": "利未記", "code": "LEV", "wd_code": "lev"},
+    "民": {"full": "民數記", "code": "NUM", "wd_code": "num"},
+    "申": {"full": "申命記", "code": "DEU", "wd_code": "deu"},
+    "書": {"full": "約書亞記", "code": "JOS", "wd_code": "jos"},
+    "士": {"full": "士師記", "code": "JDG", "wd_code": "jdg"},
+    "得": {"full": "路得記", "code": "RUT", "wd_code": "rut"},
+    "撒上": {"full": "撒母耳記上", "code": "1SA", "wd_code": "1sa"},
+    "撒下": {"full": "撒母耳記下", "code": "2SA", "wd_code": "2sa"},
+    "王上": {"full": "列王紀上", "code": "1KI", "wd_code": "1ki"},
+    "王下": {"full": "列王紀下", "code": "2KI", "wd_code": "2ki"},
+    "代上": {"full": "歷代志上", "code": "1CH", "wd_code": "1ch"},
+    "代下": {"full": "歷代志下", "code": "2CH", "wd_code": "2ch"},
+    "拉": {"full": "以斯拉記", "code": "EZR", "wd_code": "ezr"},
+    "尼": {"full": "尼希米記", "code": "NEH", "wd_code": "neh"},
+    "斯": {"full": "以斯帖記", "code": "EST", "wd_code": "est"},
+    "伯": {"full": "約伯記", "code": "JOB", "wd_code": "job"},
+    "詩": {"full": "詩篇", "code": "PSA", "wd_code": "psa"},
+    "箴": {"full": "箴言", "code": "PRO", "wd_code": "pro"},
+    "傳": {"full": "傳道書", "code": "ECC", "wd_code": "ecc"},
+    "歌": {"full": "雅歌", "code": "SNG", "wd_code": "sng"},
+    "賽": {"full": "以賽亞書", "code": "ISA", "wd_code": "isa"},
+    "耶": {"full": "耶利米書", "code": "JER", "wd_code": "jer"},
+    "哀": {"full": "耶利米哀歌", "code": "LAM", "wd_code": "lam"},
+    "結": {"full": "以西結書", "code": "EZK", "wd_code": "ezk"},
+    "但": {"full": "但以理書", "code": "DAN", "wd_code": "dan"},
+    "何": {"full": "何西阿書", "code": "HOS", "wd_code": "hos"},
+    "珥": {"full": "約珥書", "code": "JOL", "wd_code": "jol"},
+    "摩": {"full": "阿摩司書", "code": "AMO", "wd_code": "amo"},
+    "俄": {"full": "俄巴底亞書", "code": "OBA", "wd_code": "oba"},
+    "拿": {"full": "約拿書", "code": "JON", "wd_code": "jon"},
+    "彌": {"full": "彌迦書", "code": "MIC", "wd_code": "mic"},
+    "鴻": {"full": "那鴻書", "code": "NAM", "wd_code": "nam"},
+    "哈": {"full": "哈巴谷書", "code": "HAB", "wd_code": "hab"},
+    "番": {"full": "西番雅書", "code": "ZEP", "wd_code": "zep"},
+    "該": {"full": "哈該書", "code": "HAG", "wd_code": "hag"},
+    "亞": {"full": "撒迦利亞書", "code": "ZEC", "wd_code": "zec"},
+    "瑪": {"full": "瑪拉基書", "code": "MAL", "wd_code": "mal"},
+    # 新約 (New Testament)
+    "太": {"full": "馬太福音", "code": "MAT", "wd_code": "mat"},
+    "可": {"full": "馬可福音", "code": "MRK", "wd_code": "mrk"},
+    "路": {"full": "路加福音", "code": "LUK", "wd_code": "luk"},
+    "約": {"full": "約翰福音", "code": "JHN", "wd_code": "jhn"},
+    "徒": {"full": "使徒行傳", "code": "ACT", "wd_code": "act"},
+    "羅": {"full": "羅馬書", "code": "ROM", "wd_code": "rom"},
+    "林前": {"full": "哥林多前書", "code": "1CO", "wd_code": "1co"},
+    "林後": {"full": "哥林多後書", "code": "2CO", "wd_code": "2co"},
+    "加": {"full": "加拉太書", "code": "GAL", "wd_code": "gal"},
+    "弗": {"full": "以弗所書", "code": "EPH", "wd_code": "eph"},
+    "腓": {"full": "腓立比書", "code": "PHP", "wd_code": "php"},
+    "西": {"full": "歌羅西書", "code": "COL", "wd_code": "col"},
+    "帖前": {"full": "帖撒羅尼迦前書", "code": "1TH", "wd_code": "1th"},
+    "帖後": {"full": "帖撒羅尼迦後書", "code": "2TH", "wd_code": "2th"},
+    "提前": {"full": "提摩太前書", "code": "1TI", "wd_code": "1ti"},
+    "提後": {"full": "提摩太後書", "code": "2TI", "wd_code": "2ti"},
+    "多": {"full": "提多書", "code": "TIT", "wd_code": "tit"},
+    "門": {"full": "腓利門書", "code": "PHM", "wd_code": "phm"},
+    "來": {"full": "希伯來書", "code": "HEB", "wd_code": "heb"},
+    "雅": {"full": "雅各書", "code": "JAS", "wd_code": "jas"},
+    "彼前": {"full": "彼得前書", "code": "1PE", "wd_code": "1pe"},
+    "彼後": {"full": "彼得後書", "code": "2PE", "wd_code": "2pe"},
+    "約一": {"full": "約翰壹書", "code": "1JN", "wd_code": "1jn"},
+    "約二": {"full": "約翰貳書", "code": "2JN", "wd_code": "2jn"},
+    "約三": {"full": "約翰參書", "code": "3JN", "wd_code": "3jn"},
+    "猶": {"full": "猶大書", "code": "JUD", "wd_code": "jud"},
+    "啟": {"full": "啟示錄", "code": "REV", "wd_code": "rev"}
+}
+
+# 異體字與全形符號正規化（語料使用「啟」）
+_FOLD_TABLE = str.maketrans({
+    '啓': '啟',
+    '：': ':',
+    '；': ';',
+    '－': '-',
+    '–': '-',
+    '—': '-',
+    '~': '-',
+    '～': '-',
+    '至': '-',
+    '　': ' ',
+})
+
+# 章節部分的文法（模組載入時編譯一次）
+_CHAPTER_VERSE_PATTERN = re.compile(r'(\d+)(?::(\d+))?(?:-(\d+)(?::(\d+))?)?')
+
+
+class ScriptureRef(NamedTuple):
+    """解析後的經文參考；start_verse/end_verse 為 None 表示整章"""
+    book_abbr: str
+    start_chapter: int
+    start_verse: Optional[int]
+    end_chapter: int
+    end_verse: Optional[int]
+
+    @property
+    def is_single_verse(self) -> bool:
+        return (self.start_verse is not None and self.start_chapter == self.end_chapter
+                and self.start_verse == self.end_verse)
+
+    @property
+    def chapter_display(self) -> str:
+        """章節顯示文字，例如 "1-3"、"5:1-12"、"1:1-3:24" """
+        start = f"{self.start_chapter}" + (f":{self.start_verse}" if self.start_verse else "")
+        if self.start_verse:
+            if self.end_chapter == self.start_chapter:
+                end = "" if self.end_verse == self.start_verse else f"{self.end_verse}"
+            else:
+                end = f"{self.end_chapter}:{self.end_verse}" if self.end_verse else f"{self.end_chapter}"
+        elif self.end_chapter != self.start_chapter or self.end_verse:
+            end = f"{self.end_chapter}" + (f":{self.end_verse}" if self.end_verse else "")
+        else:
+            end = ""
+        return f"{start}-{end}" if end else start
+
+    def __str__(self) -> str:
+        return f"{self.book_abbr}{self.chapter_display}"
+
+
+# --- 書卷字典樹 ---
+
+_TERMINAL = ''
+
+
+def _build_book_trie() -> Dict:
+    """以縮寫與全名建立字典樹，節點的 '' 鍵保存對應的標準縮寫"""
+    trie: Dict = {}
+    for abbr, info in BIBLE_BOOK_MAP.items():
+        for name in (abbr, info['full']):
+            node = trie
+            for char in name:
+                node = node.setdefault(char, {})
+            node[_TERMINAL] = abbr
+    return trie
+
+
+_BOOK_TRIE = _build_book_trie()
+
+
+def fold(text: str) -> str:
+    """異體字與全形符號正規化"""
+    return text.translate(_FOLD_TABLE)
+
+
+def match_book(text: str, start: int = 0) -> Tuple[Optional[str], int]:
+    """
+    從 text[start:] 開頭做書卷最長比對
+
+    Returns:
+        Tuple[Optional[str], int]: (標準縮寫, 比對結束位置)，比對失敗時為 (None, start)
+    """
+    node = _BOOK_TRIE
+    found, end = None, start
+    for i in range(start, len(text)):
+        node = node.get(text[i])
+        if node is None:
+            break
+        if _TERMINAL in node:
+            found, end = node[_TERMINAL], i + 1
+    return found, end
+
+
+# --- 解析 ---
+
+@lru_cache(maxsize=4096)
+def _parse_part(part: str, default_book: Optional[str]) -> Optional[ScriptureRef]:
+    """解析單一範圍（已正規化、無分號）；省略書卷時沿用 default_book"""
+    text = part.replace(' ', '')
+    book, pos = match_book(text)
+    if book is None:
+        book, pos = default_book, 0
+    if book is None:
+        return None
+
+    match = _CHAPTER_VERSE_PATTERN.fullmatch(text, pos)
+    if not match:
+        return None
+
+    c1, v1, x, v2 = match.groups()
+    start_chapter = int(c1)
+    start_verse = int(v1) if v1 else None
+
+    if x is None:
+        # 創1 / 約3:16
+        end_chapter, end_verse = start_chapter, start_verse
+    elif v2 is not None:
+        # 創1:1-3:24 / 創1-3:24
+        end_chapter, end_verse = int(x), int(v2)
+    elif start_verse is not None:
+        # 太5:1-12：同一章的節範圍
+        end_chapter, end_verse = start_chapter, int(x)
+    else:
+        # 創1-3：章範圍
+        end_chapter, end_verse = int(x), None
+
+    # 起訖順序錯誤
+    if end_chapter < start_chapter:
+        return None
+    if end_chapter == start_chapter and start_verse and end_verse and end_verse < start_verse:
+        return None
+
+    return ScriptureRef(book, start_chapter, start_verse, end_chapter, end_verse)
+
+
+def parse_reference(ref: str) -> Optional[ScriptureRef]:
+    """
+    解析單一經文參考
+
+    Args:
+        ref: 例如 "創1-3"、"約3:16"、"啓示錄22:21"
+
+    Returns:
+        Optional[ScriptureRef]: 無法解析時返回 None
+    """
+    return _parse_part(fold(ref).strip(), None)
+
+
+@lru_cache(maxsize=2048)
+def parse_references(text: str) -> Tuple[Tuple[str, Optional[ScriptureRef]], ...]:
+    """
+    解析以 ; 分隔的經文參考列表（書卷可沿用前一段）
+
+    Args:
+        text: 例如 "亞11;亞12;可2;詩37"、"創1;2"
+
+    Returns:
+        Tuple: ((原始片段, ScriptureRef 或 None), ...)，空白片段會被略過
+    """
+    results = []
+    current_book = None
+    for part in fold(text or '').split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        ref = _parse_part(part, current_book)
+        if ref is not None:
+            current_book = ref.book_abbr
+        results.append((part, ref))
+    return tuple(results)
+
+
+def get_book_info(book_abbr: str) -> Optional[Dict]:
+    """書卷資訊 {full, code, wd_code}，接受縮寫、全名或異體字"""
+    book, end = match_book(fold(book_abbr))
+    if book is None or end != len(fold(book_abbr)):
+        return None
+    return BIBLE_BOOK_MAP[book]
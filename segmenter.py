@@ -0,0 +1,180 @@
+"""
+經文分詞模組 (Segmenter)
+
+以和合本經文離線統計的 n-gram 詞庫 (data/cuv_lexicon.tsv) 做正向最大匹配分詞，
+挑出長度適中的關鍵詞作為填充題的挖空答案，取代原本只以標點切出整個子句的作法。
+
+- 詞庫：2~4 字、出現至少 MIN_COUNT 次、內部凝固度 (PMI) 夠高，
+  且不被更長的詞完全涵蓋（例如「耶和」被「耶和華」涵蓋）
+- 字典樹：以「前綴 → 是否為詞」的扁平雜湊表表示，查詢只需逐字延伸
+- 每節經文的分詞結果以經文 ID 快取，同一節經文只分詞一次
+
+執行方式（重建詞庫）：python3.11 segmenter.py
+"""
+import csv
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from bible_corpus import BIBLE_TEXT_CSV, DATA_DIR
+
+LEXICON_TSV = os.path.join(DATA_DIR, 'cuv_lexicon.tsv')
+
+MIN_WORD_LENGTH = 2
+MAX_WORD_LENGTH = 4
+MIN_COUNT = 6            # 詞至少出現的次數
+MIN_COHESION = 3.0       # 2 字詞的最低 PMI，每多一字再加 COHESION_STEP
+COHESION_STEP = 0.5
+DOMINANCE_RATIO = 0.8    # 更長的詞出現次數達此比例時，視為被涵蓋的片段
+
+# 以這些字開頭或結尾的詞多半是虛詞片語，不適合作為挖空答案
+FUNCTION_CHARS = set('的了也就都又卻便乃並而之與和在是不一這那些個說們我你他她它著呢嗎吧啊所將要把被向從到為以於')
+
+_CJK_RUN = re.compile(r'[一-鿿]+|[^一-鿿]')
+
+_prefixes: Optional[Dict[str, bool]] = None
+
+
+# === 離線建置詞庫 ===
+
+def _iter_clauses(path: str = BIBLE_TEXT_CSV):
+    """逐一產生經文中的中文子句（以非中文字元切開）"""
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            for match in _CJK_RUN.finditer(row['text']):
+                if len(match.group()) > 1:
+                    yield match.group()
+
+
+def build_lexicon(path: str = BIBLE_TEXT_CSV) -> Dict[str, int]:
+    """
+    從經文統計 n-gram 詞庫
+
+    Returns:
+        Dict[str, int]: {詞: 出現次數}
+    """
+    counts: Counter = Counter()
+    for clause in _iter_clauses(path):
+        for n in range(1, MAX_WORD_LENGTH + 2):
+            for i in range(len(clause) - n + 1):
+                counts[clause[i:i + n]] += 1
+
+    total = sum(count for gram, count in counts.items() if len(gram) == 1)
+
+    def cohesion(word: str) -> float:
+        return min(math.log(counts[word] * total / (counts[word[:k]] * counts[word[k:]]))
+                   for k in range(1, len(word)))
+
+    candidates = {
+        word: count for word, count in counts.items()
+        if MIN_WORD_LENGTH <= len(word) <= MAX_WORD_LENGTH and count >= MIN_COUNT
+        and cohesion(word) >= MIN_COHESION + COHESION_STEP * (len(word) - MIN_WORD_LENGTH)
+    }
+
+    # 被更長的詞涵蓋的片段（例如「耶和」、「路撒冷」）
+    longest_extension: Dict[str, int] = defaultdict(int)
+    for gram, count in counts.items():
+        if len(gram) > MIN_WORD_LENGTH:
+            for sub in (gram[1:], gram[:-1]):
+                if sub in candidates:
+                    longest_extension[sub] = max(longest_extension[sub], count)
+
+    return {word: count for word, count in candidates.items()
+            if longest_extension[word] < DOMINANCE_RATIO * count}
+
+
+def save_lexicon(lexicon: Dict[str, int], path: str = LEXICON_TSV) -> None:
+    """依出現次數排序寫入 TSV"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for word, count in sorted(lexicon.items(), key=lambda item: (-item[1], item[0])):
+            f.write(f"{word}\t{count}\n")
+
+
+# === 字典樹與分詞 ===
+
+def _load_prefixes() -> Dict[str, bool]:
+    """載入詞庫並建立前綴表：每個詞的所有前綴 → 該前綴本身是否為詞"""
+    global _prefixes
+    if _prefixes is None:
+        if os.path.exists(LEXICON_TSV):
+            with open(LEXICON_TSV, encoding='utf-8') as f:
+                words = [line.split('\t', 1)[0] for line in f if line.strip()]
+        else:
+            words = list(build_lexicon())
+
+        prefixes: Dict[str, bool] = {}
+        for word in words:
+            for i in range(1, len(word)):
+                prefixes.setdefault(word[:i], False)
+            prefixes[word] = True
+        _prefixes = prefixes
+    return _prefixes
+
+
+def segment(text: str) -> List[str]:
+    """
+    正向最大匹配分詞
+
+    Args:
+        text: 經文
+
+    Returns:
+        List[str]: 詞列表（詞庫外的字單獨成詞，標點亦單獨成詞）
+    """
+    prefixes = _load_prefixes()
+    tokens: List[str] = []
+    for match in _CJK_RUN.finditer(text):
+        run = match.group()
+        i = 0
+        while i < len(run):
+            end = i + 1
+            j = i + 1
+            while j <= len(run) and run[i:j] in prefixes:
+                if prefixes[run[i:j]]:
+                    end = j
+                j += 1
+            tokens.append(run[i:end])
+            i = end
+    return tokens
+
+
+def is_key_term(token: str) -> bool:
+    """是否適合作為挖空答案：詞庫中的 2~4 字詞，且不以虛詞開頭或結尾"""
+    return (MIN_WORD_LENGTH <= len(token) <= MAX_WORD_LENGTH
+            and _load_prefixes().get(token, False)
+            and token[0] not in FUNCTION_CHARS and token[-1] not in FUNCTION_CHARS)
+
+
+@lru_cache(maxsize=32768)
+def segment_verse(verse_id: str, text: str) -> Tuple[str, ...]:
+    """以經文 ID 快取的分詞結果（同一節經文只分詞一次）"""
+    return tuple(segment(text))
+
+
+@lru_cache(maxsize=32768)
+def key_terms(verse_id: str, text: str) -> Tuple[str, ...]:
+    """
+    經文中可作為挖空答案的關鍵詞（依出現順序、不重複）
+
+    Args:
+        verse_id: 經文 ID，例如 "創1:1"
+        text: 經文
+
+    Returns:
+        Tuple[str, ...]: 關鍵詞
+    """
+    seen = []
+    for token in segment_verse(verse_id, text):
+        if token not in seen and is_key_term(token):
+            seen.append(token)
+    return tuple(seen)
+
+
+if __name__ == "__main__":
+    print("建立和合本詞庫...")
+    lexicon = build_lexicon()
+    save_lexicon(lexicon)
+    print(f"✓ {len(lexicon)} 個詞，已寫入 {LEXICON_TSV}")
@@ -36,7 +36,7 @@ echo "🗑️  刪除所有舊任務..."
 echo ""
 
 # 刪除所有可能存在的舊任務
-for job in bible-push-morning bible-push-noon bible-push-evening bible-push-night daily-devotional-sender; do
+for job in bible-push-morning bible-push-noon bible-push-evening bible-push-night daily-devotional-sender group-digest-flusher admin-stats-reconciler; do
     echo "檢查並刪除: $job"
     gcloud scheduler jobs delete $job --location=$LOCATION --quiet 2>/dev/null || echo "  ⚠️  $job 不存在或已刪除"
 done
@@ -48,7 +48,7 @@ echo ""
 # ========================================
 # 任務 1: 每天晚上 11 點提醒讀經
 # ========================================
-echo "📝 創建任務 1/2: 每天晚上 11 點提醒讀經..."
+echo "📝 創建任務 1/4: 每天晚上 11 點提醒讀經..."
 
 gcloud scheduler jobs create http bible-push-night \
   --location=$LOCATION \
@@ -65,7 +65,7 @@ echo ""
 # ========================================
 # 任務 2: 每天中午 12:30 發送荒漠甘泉圖片
 # ========================================
-echo "📝 創建任務 2/2: 每天中午 12:30 發送荒漠甘泉圖片..."
+echo "📝 創建任務 2/4: 每天中午 12:30 發送荒漠甘泉圖片..."
 
 gcloud scheduler jobs create http daily-devotional-sender \
   --location=$LOCATION \
@@ -79,6 +79,40 @@ gcloud scheduler jobs create http daily-devotional-sender \
 echo "✅ 任務 2 已創建: daily-devotional-sender (每天 12:30)"
 echo ""
 
+# ========================================
+# 任務 3: 每 15 分鐘發送小組摘要通知（只處理摘要模式的小組）
+# ========================================
+echo "📝 創建任務 3/4: 每 15 分鐘發送小組摘要通知..."
+
+gcloud scheduler jobs create http group-digest-flusher \
+  --location=$LOCATION \
+  --schedule="*/15 * * * *" \
+  --time-zone="Asia/Taipei" \
+  --uri="$SERVICE_URL/trigger/flush-group-digests" \
+  --http-method=POST \
+  --oidc-service-account-email=$SERVICE_ACCOUNT \
+  --oidc-token-audience=$SERVICE_URL
+
+echo "✅ 任務 3 已創建: group-digest-flusher (每 15 分鐘)"
+echo ""
+
+# ========================================
+# 任務 4: 每天凌晨 3 點校正管理後台統計
+# ========================================
+echo "📝 創建任務 4/4: 每天凌晨 3 點校正管理後台統計..."
+
+gcloud scheduler jobs create http admin-stats-reconciler \
+  --location=$LOCATION \
+  --schedule="0 3 * * *" \
+  --time-zone="Asia/Taipei" \
+  --uri="$SERVICE_URL/trigger/reconcile-admin-stats" \
+  --http-method=POST \
+  --oidc-service-account-email=$SERVICE_ACCOUNT \
+  --oidc-token-audience=$SERVICE_URL
+
+echo "✅ 任務 4 已創建: admin-stats-reconciler (每天 03:00)"
+echo ""
+
 echo "🎉 所有任務已創建完成！"
 echo ""
 echo "📋 最終的 Scheduler 任務列表:"
@@ -86,13 +120,15 @@ gcloud scheduler jobs list --location=$LOCATION
 echo ""
 
 echo "💰 預期成本:"
-echo "   Cloud Scheduler: 2 jobs × \$0.04 = \$0.08/月"
+echo "   Cloud Scheduler: 4 jobs × \$0.04 = \$0.16/月"
 echo "   LINE Push API: ~10用戶 × 2次/天 × 30天 = 600次/月"
 echo "   LINE Push API 費用: (600 - 200免費) × \$0.003 = \$1.20/月"
-echo "   總計: ~\$1.28/月"
+echo "   總計: ~\$1.36/月"
 echo ""
 echo "💡 提醒:"
 echo "   1. 請在 LINE 官方後台自行設定 Rich Menu"
 echo "   2. 晚上 11 點會發送讀經提醒"
 echo "   3. 中午 12:30 會發送荒漠甘泉圖片"
-echo "   4. 用戶可以隨時透過 Rich Menu 主動查詢"
+echo "   4. 每 15 分鐘合併發送摘要模式小組的讀經通知"
+echo "   5. 每天凌晨 3 點校正管理後台統計"
+echo "   6. 用戶可以隨時透過 Rich Menu 主動查詢"
@@ -0,0 +1,58 @@
+"""
+測試補讀日期的判斷（不需連線 Firestore）
+
+執行方式：python3.11 test_reading_history.py 或 python3.11 -m pytest test_reading_history.py
+"""
+from datetime import date, timedelta
+
+import reading_history
+from reading_history import HISTORY_TRACKING_START, missed_days
+
+
+class _User(dict):
+    """mark_read 只需要 get 與項目指派"""
+
+
+def _history_with(*days):
+    user = _User()
+    for day in days:
+        reading_history.mark_read(user, day)
+    return user.get(reading_history.HISTORY_FIELD)
+
+
+def test_missed_days_then_read_today_still_lists_missed_days():
+    # 週一到週四沒讀，週五讀經後回報補讀
+    friday = HISTORY_TRACKING_START + timedelta(days=(4 - HISTORY_TRACKING_START.weekday()) % 7 + 7)
+    # 上週五到週日都有讀
+    history = _history_with(*(friday - timedelta(days=n) for n in (7, 6, 5)), friday)
+
+    missed = missed_days(history, HISTORY_TRACKING_START, today=friday,
+                         read_through=(friday.isoformat(), friday.isoformat()))
+
+    assert missed == [friday - timedelta(days=n) for n in range(1, 5)]
+
+
+def test_days_before_tracking_start_use_last_read_date():
+    today = HISTORY_TRACKING_START + timedelta(days=2)
+    last_read = HISTORY_TRACKING_START - timedelta(days=2)
+
+    missed = missed_days(None, date(2020, 1, 1), today=today, read_through=(last_read.isoformat(), None))
+
+    # 上線前只有最後讀經日之後的日子可補讀；上線後依位元圖
+    assert missed == [today - timedelta(days=n) for n in range(1, 4)]
+
+
+def test_missed_days_respects_limit_and_since():
+    today = HISTORY_TRACKING_START + timedelta(days=30)
+
+    assert len(missed_days(None, HISTORY_TRACKING_START, today=today, limit=7)) == 7
+    assert missed_days(None, today - timedelta(days=2), today=today) == [
+        today - timedelta(days=1), today - timedelta(days=2)
+    ]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✓ {name}")